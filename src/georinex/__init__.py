@@ -1,17 +1,59 @@
-from .base import load, rinexnav, rinexobs, batch_convert
-from .utils import gettime, rinexheader, globber, to_datetime
-from .rio import rinexinfo
-from .obs2 import rinexobs2, obsheader2, obstime2
-from .obs3 import rinexobs3, obsheader3, obstime3
-from .nav2 import rinexnav2, navheader2, navtime2
-from .nav3 import rinexnav3, navheader3, navtime3
-from .sp3 import load_sp3
-from .keplerian import keplerian2ecef
+"""
+submodules are imported on first use of their functions, so "import georinex"
+doesn't pay for Xarray, Pandas and the decompressors until they are needed.
+"""
+
+from __future__ import annotations
+import importlib
+import typing as T
 
 __version__ = "1.16.2"
 
-__all__ = [
+# public name: submodule that defines it
+_API = {
+    "load": "base",
+    "load_many": "base",
+    "rinexnav": "base",
+    "rinexobs": "base",
+    "batch_convert": "base",
+    "gettime": "utils",
+    "rinexheader": "utils",
+    "globber": "utils",
+    "to_datetime": "utils",
+    "rinexinfo": "rio",
+    "rinexobs2": "obs2",
+    "obsheader2": "obs2",
+    "obstime2": "obs2",
+    "rinexobs3": "obs3",
+    "obsheader3": "obs3",
+    "obstime3": "obs3",
+    "rinexnav2": "nav2",
+    "navheader2": "nav2",
+    "navtime2": "nav2",
+    "rinexnav3": "nav3",
+    "navheader3": "nav3",
+    "navtime3": "nav3",
+    "load_sp3": "sp3",
+    "load_clk": "clk",
+    "keplerian2ecef": "keplerian",
+    "keplerian2state": "keplerian",
+    "solve_kepler": "keplerian",
+    "propagate": "orbit",
+    "to_arrow": "arrow",
+    "to_parquet": "arrow",
+    "nav_sv": "common",
+    "from_fixed_point": "common",
+    "ephemeris_index": "ephemeris",
+    "select_ephemeris": "ephemeris",
+    "lagrange_windows": "lagrange",
+    "interpolate_sp3": "lagrange",
+    "plan": "dryrun",
+}
+
+# literal, so linters see the TYPE_CHECKING imports below as re-exports
+__all__ = (
     "load",
+    "load_many",
     "rinexnav",
     "rinexobs",
     "batch_convert",
@@ -33,5 +75,53 @@ __all__ = [
     "navheader3",
     "navtime3",
     "load_sp3",
+    "load_clk",
     "keplerian2ecef",
-]
+    "keplerian2state",
+    "solve_kepler",
+    "propagate",
+    "to_arrow",
+    "to_parquet",
+    "nav_sv",
+    "from_fixed_point",
+    "ephemeris_index",
+    "select_ephemeris",
+    "lagrange_windows",
+    "interpolate_sp3",
+    "plan",
+)
+
+if T.TYPE_CHECKING:
+    from .base import load, load_many, rinexnav, rinexobs, batch_convert
+    from .utils import gettime, rinexheader, globber, to_datetime
+    from .rio import rinexinfo
+    from .obs2 import rinexobs2, obsheader2, obstime2
+    from .obs3 import rinexobs3, obsheader3, obstime3
+    from .nav2 import rinexnav2, navheader2, navtime2
+    from .nav3 import rinexnav3, navheader3, navtime3
+    from .sp3 import load_sp3
+    from .clk import load_clk
+    from .keplerian import keplerian2ecef, keplerian2state, solve_kepler
+    from .orbit import propagate
+    from .arrow import to_arrow, to_parquet
+    from .common import nav_sv, from_fixed_point
+    from .ephemeris import ephemeris_index, select_ephemeris
+    from .lagrange import lagrange_windows, interpolate_sp3
+    from .dryrun import plan
+
+
+def __getattr__(name: str) -> T.Any:
+    try:
+        module = _API[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # cache, so __getattr__ is only called once per name
+    globals()[name] = value
+
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *__all__})
@@ -0,0 +1,200 @@
+"""
+Apache Arrow / Parquet export of OBS and NAV data
+
+OBS become one row per observation (time, sv, meas, value, lli, ssi),
+NAV one row per ephemeris (time, sv, fields...).
+SV, measurement and partition columns are dictionary encoded.
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+import logging
+
+import numpy as np
+import xarray
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    logging.info("pyarrow not available")
+    pyarrow = None
+
+from .common import INDICATOR_FILL
+
+PARTITIONS = ["station", "day", "system"]
+
+__all__ = ["to_arrow", "to_parquet"]
+
+
+def to_arrow(ds: xarray.Dataset):
+    """
+    convert OBS or NAV Dataset to pyarrow.Table
+
+    OBS in layout="long" and NAV in layout="records" are converted without copying
+    the value columns.
+    Dense (time, sv) data are converted to rows of the non-NaN elements.
+    """
+    if pyarrow is None:
+        raise ImportError("pyarrow is needed for Arrow / Parquet output")
+
+    rinextype = ds.attrs.get("rinextype")
+    if rinextype == "obs":
+        if ds.attrs.get("layout") == "long":
+            cols = _obs_long(ds)
+        else:
+            cols = _obs_dense(ds)
+    elif rinextype == "nav":
+        if ds.attrs.get("layout") == "records":
+            cols = _nav_records(ds)
+        else:
+            cols = _nav_dense(ds)
+    else:
+        raise ValueError(f"Arrow output is for OBS and NAV data, not {rinextype}")
+
+    station = Path(ds.attrs.get("filename", "unknown")).name[:4]
+    N = len(cols["time"])
+    cols["station"] = _dictionary(np.zeros(N, dtype=np.int32), [station])
+    cols["day"] = _day(cols["time"])
+
+    return pyarrow.table(cols)
+
+
+def to_parquet(ds: xarray.Dataset, outdir: Path, partition_cols: list[str] = PARTITIONS):
+    """
+    write OBS or NAV Dataset as Parquet dataset, partitioned by station, day and system
+    """
+    table = to_arrow(ds)
+    assert pyarrow is not None
+
+    outdir = Path(outdir).expanduser()
+    print("saving Parquet:", outdir)
+    pyarrow.parquet.write_to_dataset(table, outdir, partition_cols=partition_cols)
+
+
+def _obs_long(ds: xarray.Dataset) -> dict[str, T.Any]:
+    assert pyarrow is not None
+    times = ds.time.values.astype("datetime64[ns]")
+    sv_index = ds.sv_index.values
+    svs = ds.sv.values
+
+    return {
+        "time": pyarrow.array(times[ds.time_index.values]),
+        "sv": _dictionary(sv_index, svs),
+        "meas": _dictionary(ds.meas_index.values, ds.meas.values),
+        "value": pyarrow.array(ds.value.values),
+        "lli": _indicator(ds.lli.values),
+        "ssi": _indicator(ds.ssi.values),
+        "system": _system(sv_index, svs),
+    }
+
+
+def _obs_dense(ds: xarray.Dataset) -> dict[str, T.Any]:
+    assert pyarrow is not None
+    meas = [k for k in ds.data_vars if not str(k).endswith(("lli", "ssi"))]
+    svs = ds.sv.values
+    times = ds.time.values.astype("datetime64[ns]")
+
+    it: list[np.ndarray] = []
+    isv: list[np.ndarray] = []
+    im: list[np.ndarray] = []
+    val: list[np.ndarray] = []
+    ind: dict[str, list[np.ndarray]] = {"lli": [], "ssi": []}
+    for i, k in enumerate(meas):
+        v = ds[k].transpose("time", "sv").values
+        t, s = np.nonzero(~np.isnan(v))
+        it.append(t)
+        isv.append(s)
+        im.append(np.full(t.size, i, dtype=np.int32))
+        val.append(v[t, s])
+        for c in ind:
+            if f"{k}{c}" in ds:
+                x = ds[f"{k}{c}"].transpose("time", "sv").values[t, s]
+                if x.dtype.kind == "f":
+                    x = np.where(np.isnan(x), INDICATOR_FILL, x)
+            else:
+                x = np.full(t.size, INDICATOR_FILL)
+            ind[c].append(x.astype(np.int8))
+
+    sv_index = _cat(isv, np.int64)
+
+    return {
+        "time": pyarrow.array(times[_cat(it, np.int64)]),
+        "sv": _dictionary(sv_index, svs),
+        "meas": _dictionary(_cat(im, np.int32), np.asarray(meas, dtype=str)),
+        "value": pyarrow.array(_cat(val, np.float64)),
+        "lli": _indicator(_cat(ind["lli"], np.int8)),
+        "ssi": _indicator(_cat(ind["ssi"], np.int8)),
+        "system": _system(sv_index, svs),
+    }
+
+
+def _nav_dense(ds: xarray.Dataset) -> dict[str, T.Any]:
+    assert pyarrow is not None
+    fields = [k for k in ds.data_vars if set(ds[k].dims) == {"time", "sv"}]
+    data = {k: ds[k].transpose("time", "sv").values for k in fields}
+
+    present = np.zeros((ds.time.size, ds.sv.size), dtype=bool)
+    for v in data.values():
+        present |= ~np.isnan(v)
+    t, s = np.nonzero(present)
+
+    svs = ds.sv.values
+    cols = {
+        "time": pyarrow.array(ds.time.values.astype("datetime64[ns]")[t]),
+        "sv": _dictionary(s, svs),
+        "system": _system(s, svs),
+    }
+    for k, v in data.items():
+        cols[str(k)] = pyarrow.array(v[t, s])
+
+    return cols
+
+
+def _nav_records(ds: xarray.Dataset) -> dict[str, T.Any]:
+    assert pyarrow is not None
+    sv_index = ds.sv_index.values
+    svs = ds.sv.values
+
+    cols = {
+        "time": pyarrow.array(ds.time.values.astype("datetime64[ns]")),
+        "sv": _dictionary(sv_index, svs),
+        "system": _system(sv_index, svs),
+    }
+    for k in ds.data_vars:
+        if ds[k].dims == ("record",) and k != "sv_index":
+            cols[str(k)] = pyarrow.array(ds[k].values)
+
+    return cols
+
+
+def _dictionary(indices: np.ndarray, values: T.Sequence[str] | np.ndarray):
+    assert pyarrow is not None
+    return pyarrow.DictionaryArray.from_arrays(
+        pyarrow.array(np.asarray(indices, dtype=np.int32)),
+        pyarrow.array(np.asarray(values, dtype=str)),
+    )
+
+
+def _system(sv_index: np.ndarray, svs: np.ndarray):
+    systems, isys = np.unique([s[0] for s in svs], return_inverse=True)
+    if sv_index.size == 0:
+        return _dictionary(sv_index, systems)
+
+    return _dictionary(isys.ravel()[sv_index], systems)
+
+
+def _day(times):
+    days = times.to_numpy(zero_copy_only=False).astype("datetime64[D]")
+    u, i = np.unique(days, return_inverse=True)
+    return _dictionary(i.ravel(), np.datetime_as_string(u, unit="D"))
+
+
+def _indicator(x: np.ndarray):
+    assert pyarrow is not None
+    return pyarrow.array(x, mask=x == INDICATOR_FILL)
+
+
+def _cat(arrs: list[np.ndarray], dtype: T.Any) -> np.ndarray:
+    return np.concatenate(arrs).astype(dtype) if arrs else np.empty(0, dtype=dtype)
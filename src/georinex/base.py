@@ -4,14 +4,23 @@ from pathlib import Path
 import xarray
 from datetime import datetime, timedelta
 import logging
+import importlib.util
+import shutil
+import tempfile
+import weakref
+from concurrent.futures import ProcessPoolExecutor
 
-from .rio import rinexinfo
+import numpy as np
+
+from .rio import rinexinfo, STORES
 from .obs2 import rinexobs2
 from .obs3 import rinexobs3
 from .nav2 import rinexnav2
 from .nav3 import rinexnav3
 from .sp3 import load_sp3
-from .utils import _tlim
+from .clk import load_clk
+from .utils import _tlim, gettime, rinexheader
+from .common import to_fixed_point
 
 # for NetCDF compression. too high slows down with little space savings.
 ENC = {"zlib": True, "complevel": 1, "fletcher32": True}
@@ -29,11 +38,34 @@ def load(
     overwrite: bool = False,
     fast: bool = True,
     interval: float | int | timedelta | None = None,
+    fixed_point: bool = False,
+    dtype_policy: str | None = None,
+    layout: str = "dense",
+    split_systems: bool = False,
+    chunks: dict[str, int] | None = None,
+    scratch: Path | None = None,
+    max_memory: int | str | None = None,
 ):
     """
     Reads OBS, NAV in RINEX 2.x and 3.x
 
     Files / StringIO input may be plain ASCII text or compressed (including Hatanaka)
+    NetCDF4 files and Zarr stores written like georinex NetCDF4 output, in OBS / NAV groups,
+    are opened lazily.
+
+    out: directory or .nc file for NetCDF4 output, or .parquet directory for Parquet dataset
+         partitioned by station/day/system
+    fixed_point: OBS observables as int64 milli-units, lossless and compact on disk
+    dtype_policy: "compact" for int8 LLI/SSI and float32 SNR/Doppler OBS variables
+    layout: "long" for OBS as a table of the observations present instead of (time, sv) arrays,
+            "records" for NAV as a table of ephemerides
+    split_systems: OBS as dict of Dataset by system, each with its own measurements and SVs
+    chunks: Dask chunk sizes e.g. {"time": 3600}. NetCDF4 input is otherwise read lazily anyway,
+            RINEX OBS chunks are each parsed when computed.
+    scratch: directory for np.memmap buffers, to read RINEX 2 OBS files larger than RAM
+    max_memory: memory budget like "4GB" for RINEX OBS files. A dry run, see dryrun.plan(),
+                picks chunks or scratch if the dense layout doesn't fit, in a temporary
+                directory removed with the returned Dataset.
     """
     if verbose:
         logging.basicConfig(level=logging.INFO)
@@ -42,9 +74,12 @@ def load(
         rinexfn = Path(rinexfn).expanduser()
     # %% determine if/where to write NetCDF4/HDF5 output
     outfn = None
+    parquet = None
     if out:
         out = Path(out).expanduser()
-        if out.is_dir():
+        if out.suffix == ".parquet":
+            parquet = out
+        elif out.is_dir():
             outfn = out / (
                 rinexfn.name + ".nc"
             )  # not with_suffix to keep unique RINEX 2 filenames
@@ -61,50 +96,234 @@ def load(
 
     info = rinexinfo(rinexfn)
 
-    if info["rinextype"] == "nav":
-        return rinexnav(rinexfn, outfn, use=use, tlim=tlim, overwrite=overwrite)
-    elif info["rinextype"] == "obs":
-        return rinexobs(
+    if parquet is not None:
+        if split_systems:
+            raise ValueError("Parquet output is already partitioned by system")
+
+        dat = load(
             rinexfn,
-            outfn,
             use=use,
             tlim=tlim,
             useindicators=useindicators,
             meas=meas,
             verbose=verbose,
-            overwrite=overwrite,
             fast=fast,
             interval=interval,
+            dtype_policy=dtype_policy,
+            layout=layout,
         )
+        if not isinstance(dat, xarray.Dataset):
+            raise ValueError(f"Parquet output is for one RINEX OBS or NAV, not {rinexfn}")
+
+        # PyArrow is only loaded for Parquet output
+        from .arrow import to_parquet
+
+        to_parquet(dat, parquet)
+        return dat
+
+    if info["rinextype"] == "nav":
+        if chunks:
+            raise ValueError("chunked reading is for OBS and NetCDF4 files")
+        return rinexnav(rinexfn, outfn, use=use, tlim=tlim, overwrite=overwrite, layout=layout)
+    elif info["rinextype"] == "obs":
+        tmp = None
+        if max_memory is not None and isinstance(rinexfn, Path):
+            if layout != "dense" or split_systems or chunks or scratch is not None:
+                raise ValueError("max_memory chooses the read strategy, don't also specify one")
+
+            from .dryrun import plan
+
+            p = plan(
+                rinexfn,
+                use,
+                tlim,
+                useindicators,
+                meas,
+                interval=interval,
+                dtype_policy=dtype_policy,
+                max_memory=max_memory,
+            )
+            logging.info(f"{rinexfn.name}: reading with strategy {p['strategy']}")
+            if p["strategy"] is None:
+                msg = (
+                    f"{rinexfn} needs at least {p['peak_bytes']['dense'] / 1e9} GBytes RAM "
+                    f"in dense layout, no read strategy fits in {p['max_memory'] / 1e9} GBytes"
+                )
+                if p["peak_bytes"]["split_systems"] <= p["max_memory"]:
+                    msg += ". Try split_systems=True for a dict of Dataset by system"
+                raise RuntimeError(msg)
+            elif p["strategy"] == "chunks":
+                chunks = p["chunks"]
+            elif p["strategy"] == "scratch":
+                # the np.memmap buffers back the returned Dataset, removed along with it
+                tmp = scratch = Path(tempfile.mkdtemp(prefix="georinex_"))
+
+        ok = False
+        try:
+            obs = rinexobs(
+                rinexfn,
+                outfn,
+                use=use,
+                tlim=tlim,
+                useindicators=useindicators,
+                meas=meas,
+                verbose=verbose,
+                overwrite=overwrite,
+                fast=fast,
+                interval=interval,
+                fixed_point=fixed_point,
+                dtype_policy=dtype_policy,
+                layout=layout,
+                split_systems=split_systems,
+                chunks=chunks,
+                scratch=scratch,
+            )
+            ok = True
+        finally:
+            if tmp is not None and not ok:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+        if tmp is not None:
+            weakref.finalize(obs, shutil.rmtree, tmp, ignore_errors=True)
+
+        return obs
 
     assert isinstance(rinexfn, Path)
 
     if info["rinextype"] == "sp3":
-        return load_sp3(rinexfn, outfn)
-    elif rinexfn.suffix == ".nc":
+        return load_sp3(rinexfn, outfn, use=use, tlim=tlim)
+    elif info["rinextype"] == "clk":
+        return load_clk(rinexfn, outfn, use=use, tlim=tlim)
+    elif rinexfn.suffix in STORES:
         # outfn not used here, because we already have the converted file!
-        try:
-            nav = rinexnav(rinexfn)
-        except LookupError:
-            nav = None
+        # rinexinfo() found which groups are present, open each once.
+        from .netcdf import open_nc, open_obs
 
-        try:
-            obs = rinexobs(rinexfn)
-        except LookupError:
-            obs = None
-
-        if nav is not None and obs is not None:
-            return {"nav": nav, "obs": rinexobs(rinexfn)}
-        elif nav is not None:
-            return nav
-        elif obs is not None:
-            return obs
-        else:
+        dat = {}
+        if "nav" in info["rinextype"]:
+            dat["nav"] = open_nc(rinexfn, "NAV", use, tlim, chunks=chunks)
+        if "obs" in info["rinextype"]:
+            dat["obs"] = open_obs(rinexfn, "OBS", use, tlim, meas, interval, chunks=chunks)
+
+        if not dat:
             raise ValueError(f"No data of known format found in {rinexfn}")
+
+        return dat if len(dat) > 1 else next(iter(dat.values()))
     else:
         raise ValueError(f"What kind of RINEX file is: {rinexfn}")
 
 
+def load_many(
+    paths: T.Iterable[str | Path],
+    use: set[str] | None = None,
+    tlim: tuple[datetime, datetime] | None = None,
+    useindicators: bool = False,
+    meas: list[str] | None = None,
+    verbose: bool = False,
+    *,
+    fast: bool = True,
+    interval: float | int | timedelta | None = None,
+    dtype_policy: str | None = None,
+    chunks: dict[str, int] | None = None,
+    max_workers: int | None = None,
+) -> xarray.Dataset:
+    """
+    Reads several OBS or NAV files of one station, concatenated along time,
+    or consecutive SP3 files, see sp3.load_sp3().
+
+    Files are sorted by the time span in their headers, and files outside tlim are not parsed.
+    RINEX files are parsed in parallel by up to max_workers processes.
+    NetCDF4 files and Zarr stores stay lazy, as Dask arrays if Dask is installed
+    (chunks default {}).
+    """
+    tlim = _tlim(tlim)
+    if tlim is not None:
+        t_lim = (np.datetime64(tlim[0]), np.datetime64(tlim[1]))
+
+    files = [Path(fn).expanduser() for fn in paths]
+    if files and all(rinexinfo(fn)["rinextype"] == "sp3" for fn in files):
+        return load_sp3(files, None, use=use, tlim=tlim)
+
+    nc = []
+    rinex = []
+    for fn in files:
+        fn = Path(fn).expanduser()
+        if fn.suffix in STORES:
+            nc.append(fn)
+            continue
+
+        t0, t1 = _timespan(fn)
+        if tlim is not None and (t0 > t_lim[1] or (t1 is not None and t1 < t_lim[0])):
+            logging.info(f"{fn.name}: outside time limits, skipped")
+            continue
+        rinex.append((t0, fn))
+
+    kwargs = dict(
+        use=use,
+        tlim=tlim,
+        useindicators=useindicators,
+        meas=meas,
+        verbose=verbose,
+        fast=fast,
+        interval=interval,
+        dtype_policy=dtype_policy,
+    )
+
+    flist = [fn for _, fn in sorted(rinex, key=lambda x: x[0])]
+    if len(flist) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            dats = list(pool.map(_load_one, flist, [kwargs] * len(flist)))
+    else:
+        dats = [_load_one(fn, kwargs) for fn in flist]
+
+    if nc:
+        if chunks is None and importlib.util.find_spec("dask") is not None:
+            chunks = {}
+        for fn in nc:
+            dat = load(fn, use=use, tlim=tlim, meas=meas, interval=interval, chunks=chunks)
+            if not isinstance(dat, xarray.Dataset):
+                raise ValueError(f"{fn} is not one Dataset: has both OBS, NAV or split systems")
+            dats.append(dat)
+
+    dats = [d for d in dats if d.time.size > 0]
+    if not dats:
+        raise ValueError("no data found in time limits")
+
+    dats.sort(key=lambda d: d.time.values[0])
+    dat = xarray.concat(dats, dim="time", join="outer", combine_attrs="override")
+
+    # consecutive files may share boundary epochs
+    _, i = np.unique(dat.time.values, return_index=True)
+    if i.size < dat.time.size:
+        dat = dat.isel(time=i)
+
+    return dat
+
+
+def _load_one(fn: Path, kwargs: dict[str, T.Any]) -> xarray.Dataset:
+    dat = load(fn, **kwargs)
+    if not isinstance(dat, xarray.Dataset):
+        raise ValueError(f"{fn} is not a RINEX OBS or NAV file")
+
+    return dat
+
+
+def _timespan(fn: Path) -> tuple[np.datetime64, np.datetime64 | None]:
+    """
+    OBS header time of first (and optional last) observation, otherwise scan epochs (NAV)
+    """
+    hdr = rinexheader(fn)
+    if "t0" in hdr:
+        t1 = hdr.get("t1")
+        return np.datetime64(hdr["t0"]), None if t1 is None else np.datetime64(t1)
+
+    times = gettime(fn)
+    if times.size == 0:
+        raise ValueError(f"no times found in {fn}")
+
+    return times[0], times[-1]
+
+
 def batch_convert(
     path: Path,
     glob: str,
@@ -116,12 +335,19 @@ def batch_convert(
     verbose: bool = False,
     *,
     fast: bool = True,
+    fixed_point: bool = False,
+    scratch: Path | None = None,
 ):
     path = Path(path).expanduser()
 
     flist = (f for f in path.glob(glob) if f.is_file())
 
     for fn in flist:
+        # np.memmap buffers of each file are removed once it is written
+        tmp = None
+        if scratch is not None:
+            Path(scratch).expanduser().mkdir(parents=True, exist_ok=True)
+            tmp = Path(tempfile.mkdtemp(prefix="georinex_", dir=Path(scratch).expanduser()))
         try:
             load(
                 fn,
@@ -132,9 +358,14 @@ def batch_convert(
                 meas=meas,
                 verbose=verbose,
                 fast=fast,
+                fixed_point=fixed_point,
+                scratch=tmp,
             )
         except ValueError as e:
             logging.error(f"{fn.name}: {e}")
+        finally:
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
 
 
 def rinexnav(
@@ -145,25 +376,30 @@ def rinexnav(
     tlim: tuple[datetime, datetime] | None = None,
     *,
     overwrite: bool = False,
+    chunks: dict[str, int] | None = None,
+    layout: str = "dense",
 ) -> xarray.Dataset:
-    """Read RINEX 2 or 3  NAV files"""
+    """
+    Read RINEX 2 or 3  NAV files
+
+    layout: "dense" (time, sv) arrays or "records" one per ephemeris, see common.nav_records()
+    """
+
+    tlim = _tlim(tlim)
 
     if isinstance(fn, (str, Path)):
         fn = Path(fn).expanduser()
 
-        if fn.suffix == ".nc":
-            try:
-                return xarray.open_dataset(fn, group=group)
-            except OSError as e:
-                raise LookupError(f"Group {group} not found in {fn}    {e}")
+        if fn.suffix in STORES:
+            from .netcdf import open_nc
 
-    tlim = _tlim(tlim)
+            return open_nc(fn, group, use, tlim, chunks=chunks)
 
     info = rinexinfo(fn)
     if int(info["version"]) == 2:
-        nav = rinexnav2(fn, tlim=tlim)
+        nav = rinexnav2(fn, tlim=tlim, layout=layout)
     elif int(info["version"]) == 3:
-        nav = rinexnav3(fn, use=use, tlim=tlim)
+        nav = rinexnav3(fn, use=use, tlim=tlim, layout=layout)
     else:
         raise LookupError(f"unknown RINEX  {info}  {fn}")
 
@@ -194,25 +430,56 @@ def rinexobs(
     overwrite: bool = False,
     fast: bool = True,
     interval: float | int | timedelta | None = None,
+    fixed_point: bool = False,
+    dtype_policy: str | None = None,
+    layout: str = "dense",
+    split_systems: bool = False,
+    chunks: dict[str, int] | None = None,
+    scratch: Path | None = None,
 ):
     """
     Read RINEX 2.x and 3.x OBS files in ASCII or GZIP (or Hatanaka)
+
+    fixed_point: observables as int64 milli-units, see common.to_fixed_point()
+    dtype_policy: "compact" for int8 LLI/SSI and float32 SNR/Doppler, see common.obs_dtype()
+    layout: "dense" (time, sv) arrays or "long" record table, see common.long_dataset()
+    split_systems: dict of Dataset by system, written to NetCDF4 groups like OBS/G
+    chunks: Dask chunk sizes, see netcdf.open_nc() and chunked.rinexobs_chunked()
+    scratch: RINEX 2 data buffers as np.memmap in this directory, see obs2.rinexobs2()
     """
 
+    tlim = _tlim(tlim)
+
     if isinstance(fn, (str, Path)):
         fn = Path(fn).expanduser()
-        # %% NetCDF4
-        if fn.suffix == ".nc":
-            try:
-                return xarray.open_dataset(fn, group=group)
-            except OSError as e:
-                raise LookupError(f"Group {group} not found in {fn}   {e}")
+        # %% NetCDF4 / Zarr, selection is applied before reading data
+        if fn.suffix in STORES:
+            from .netcdf import open_obs
 
-    tlim = _tlim(tlim)
+            return open_obs(fn, group, use, tlim, meas, interval, chunks=chunks)
     # %% version selection
     info = rinexinfo(fn)
 
-    if int(info["version"]) in {1, 2}:
+    if chunks:
+        if layout != "dense" or split_systems:
+            raise ValueError("chunked reading is for the dense layout")
+        if not isinstance(fn, Path):
+            raise TypeError("chunked reading needs a RINEX filename, not a stream")
+        # Dask is only loaded for chunked reading
+        from .chunked import rinexobs_chunked
+
+        obs = rinexobs_chunked(
+            fn,
+            chunks,
+            use,
+            tlim=tlim,
+            useindicators=useindicators,
+            meas=meas,
+            fast=fast,
+            interval=interval,
+            dtype_policy=dtype_policy,
+        )
+    elif int(info["version"]) in {1, 2}:
         obs = rinexobs2(
             fn,
             use,
@@ -222,8 +489,14 @@ def rinexobs(
             verbose=verbose,
             fast=fast,
             interval=interval,
+            dtype_policy=dtype_policy,
+            layout=layout,
+            split_systems=split_systems,
+            scratch=scratch,
         )
     elif int(info["version"]) == 3:
+        if scratch is not None:
+            logging.warning(f"{fn}: scratch is for RINEX 2 OBS, try chunks= for RINEX 3 OBS")
         obs = rinexobs3(
             fn,
             use,
@@ -233,25 +506,41 @@ def rinexobs(
             verbose=verbose,
             fast=fast,
             interval=interval,
+            dtype_policy=dtype_policy,
+            layout=layout,
+            split_systems=split_systems,
         )
     else:
         raise ValueError(f"unknown RINEX {info}  {fn}")
 
+    if isinstance(obs, dict):
+        groups = {f"{group}/{k}": v for k, v in obs.items()}
+    else:
+        groups = {group: obs}
+
+    if fixed_point:
+        groups = {k: to_fixed_point(v) for k, v in groups.items()}
+        if isinstance(obs, dict):
+            obs = {k: groups[f"{group}/{k}"] for k in obs}
+        else:
+            obs = groups[group]
+
     # %% optional output write
     if outfn:
         outfn = Path(outfn).expanduser()
-        wmode = _groupexists(outfn, group, overwrite)
-        enc = {k: ENC for k in obs.data_vars}
+        for i, (g, o) in enumerate(groups.items()):
+            wmode = _groupexists(outfn, g, overwrite and i == 0)
+            enc = {k: ENC for k in o.data_vars}
 
-        # Pandas >= 0.25.0 requires this, regardless of xarray version
-        if obs.time.dtype != "datetime64[ns]":
-            obs["time"] = obs.time.astype("datetime64[ns]")
-        obs.to_netcdf(outfn, group=group, mode=wmode, encoding=enc, format="NETCDF4")
+            # Pandas >= 0.25.0 requires this, regardless of xarray version
+            if o.time.dtype != "datetime64[ns]":
+                o["time"] = o.time.astype("datetime64[ns]")
+            o.to_netcdf(outfn, group=g, mode=wmode, encoding=enc, format="NETCDF4")
 
     return obs
 
 
-def _groupexists(fn: Path, group: str, overwrite: bool) -> str:
+def _groupexists(fn: Path, group: str, overwrite: bool) -> T.Literal["w", "a"]:
     print(f"saving {group}:", fn)
     if overwrite or not fn.is_file():
         return "w"
@@ -0,0 +1,298 @@
+"""
+Dask-backed lazy reading of RINEX OBS files
+
+One scan of the file up front finds the epoch times, the byte offset of each epoch and the union
+of SVs. Each time chunk is then a delayed task that reads and parses only its own epochs, from
+the file itself or, for compressed files, from a copy decompressed once during the scan.
+The task graph holds only offsets, not RINEX text.
+"""
+
+from __future__ import annotations
+import typing as T
+import contextlib
+import io
+import shutil
+import tempfile
+import weakref
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import numpy as np
+import xarray
+
+from .rio import opener, rinexinfo
+from .common import check_time_interval, obs_dtype
+from .netcdf import _time_index
+from . import obs2
+from . import obs3
+
+__all__ = ["rinexobs_chunked"]
+
+
+def rinexobs_chunked(
+    fn: Path,
+    chunks: dict[str, int],
+    use: set[str] | None = None,
+    tlim: tuple[datetime, datetime] | None = None,
+    useindicators: bool = False,
+    meas: list[str] | None = None,
+    *,
+    fast: bool = True,
+    interval: float | int | timedelta | None = None,
+    dtype_policy: str | None = None,
+) -> xarray.Dataset:
+    """
+    RINEX 2 / 3 OBS as Dataset of Dask arrays, chunked along time.
+    Nothing but the epoch scan and the first epoch is parsed until computed.
+
+    chunks: {"time": N} epochs per chunk
+
+    All SVs listed in the selected epochs and all measurements in the header are output,
+    even if all their selected data are blank.
+    """
+    try:
+        import dask
+        import dask.array
+    except ImportError:
+        raise ImportError("dask is needed for chunked reading of RINEX")
+
+    if not isinstance(fn, Path):
+        raise TypeError("chunked reading needs a RINEX filename, not a stream")
+
+    if set(chunks) != {"time"} or int(chunks["time"]) < 1:
+        raise ValueError(f"chunks must be like {{'time': 3600}}, not {chunks}")
+    Nchunk = int(chunks["time"])
+
+    if isinstance(use, str):
+        use = {use}
+    if isinstance(meas, str):
+        meas = [meas]
+
+    version = int(rinexinfo(fn)["version"])
+    if version in {1, 2}:
+        hdr = obs2.obsheader2(fn, useindicators, meas)
+        variables = [k for k in obs2._fields(hdr, useindicators) if k]
+    elif version == 3:
+        hdr = obs3.obsheader3(fn, use, meas)
+        variables = _variables3(hdr["fields"], useindicators)
+    else:
+        raise ValueError(f"unknown RINEX version {version}  {fn}")
+
+    text, header, times, starts, epoch_svs, clock = _scan(fn, version, hdr)
+    # end of each epoch text is the start of the next epoch
+    ends = starts[1:] + [None]
+
+    keep = _time_index(times, tlim, check_time_interval(interval))
+    i = np.arange(times.size)[keep]
+    times = times[i]
+
+    svs = sorted({s for j in i for s in epoch_svs[j] if not use or s[0] in use})
+
+    kwargs = {
+        "use": use,
+        "useindicators": useindicators,
+        "meas": meas,
+        "fast": fast,
+        "dtype_policy": dtype_policy,
+    }
+
+    attrs = _template(text, header, starts, ends, i, kwargs).attrs
+    attrs["filename"] = fn.name
+    time_offset = [clock[j] for j in i if clock[j] is not None]
+    if time_offset:
+        attrs["time_offset"] = time_offset
+    if np.isnan(attrs.get("interval", np.nan)) and times.size > 1:
+        attrs["interval"] = np.median(np.diff(times) / np.timedelta64(1, "s"))
+
+    dtypes = {k: obs_dtype(k, dtype_policy) for k in variables}
+    data: dict[str, list[T.Any]] = {k: [] for k in variables}
+    for j in range(0, i.size, Nchunk):
+        ic = i[j : j + Nchunk]
+        task = dask.delayed(_parse_chunk)(
+            text, header, starts[ic[0]], ends[ic[-1]], times[j : j + Nchunk], svs, dtypes, kwargs
+        )
+        for k, (dtype, _) in dtypes.items():
+            data[k].append(dask.array.from_delayed(task[k], shape=(ic.size, len(svs)), dtype=dtype))
+
+    obs = xarray.Dataset(
+        {
+            k: (("time", "sv"), dask.array.concatenate(v) if v else np.empty((0, len(svs))))
+            for k, v in data.items()
+        },
+        coords={"time": times, "sv": np.asarray(svs, dtype="<U3")},
+        attrs=attrs,
+    )
+    for k, (dtype, fill) in dtypes.items():
+        if dtype.kind == "i":
+            obs[k].attrs["_FillValue"] = fill
+
+    return obs
+
+
+def _variables3(fields: dict[str, list[str]], useindicators: bool) -> list[str]:
+    variables: list[str] = []
+    for sk in fields:
+        for k in fields[sk]:
+            names = [k]
+            if useindicators:
+                if k.startswith(("L1", "L2")):
+                    names.append(k + "lli")
+                names.append(k + "ssi")
+            variables.extend(n for n in names if n not in variables)
+
+    return variables
+
+
+class _Text:
+    """
+    RINEX text that chunks read by byte range: the file itself if it is plain text, otherwise
+    a decompressed copy in a temporary directory, removed once no chunk refers to it
+    """
+
+    def __init__(self, path: Path, tmp: Path | None = None):
+        self.path = path
+        if tmp is not None:
+            weakref.finalize(self, shutil.rmtree, tmp, ignore_errors=True)
+
+    def read(self, header: int, start: int, end: int | None) -> io.StringIO:
+        """the header, bytes [0, header), and the epochs in bytes [start, end)"""
+        with self.path.open("rb") as f:
+            text = f.read(header)
+            f.seek(start)
+            text += f.read(-1 if end is None else end - start)
+
+        return io.StringIO(text.decode("ascii", errors="ignore").replace("\r\n", "\n"))
+
+
+class _Lines:
+    """readline() of text from lines of bytes, counting the bytes read so far"""
+
+    def __init__(self, readline: T.Callable[[], bytes]):
+        self._readline = readline
+        self.pos = 0
+
+    def readline(self) -> str:
+        b = self._readline()
+        self.pos += len(b)
+        return b.decode("ascii", errors="ignore").replace("\r\n", "\n")
+
+
+def _scan(
+    fn: Path, version: int, hdr: dict[T.Hashable, T.Any]
+) -> tuple[_Text, int, np.ndarray, list[int], list[list[str]], list[float | None]]:
+    """
+    one pass over the file, line by line.
+
+    returns: the text to read chunks from, the byte size of its header, and for each epoch:
+             time, byte offset in the text, SVs and receiver clock offset (OBS3)
+    """
+    times = []
+    starts = []
+    svs: list[list[str]] = []
+    clock: list[float | None] = []
+
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(opener(fn))
+        # a plain text file is read again by byte offset, compressed files are decompressed
+        # once, to a copy read by chunks
+        if isinstance(getattr(f, "buffer", None), io.BufferedReader):
+            text = _Text(fn)
+            lines = _Lines(stack.enter_context(fn.open("rb")).readline)
+        else:
+            tmp = Path(tempfile.mkdtemp(prefix="georinex_"))
+            text = _Text(tmp / fn.name, tmp)
+            copy = stack.enter_context(text.path.open("wb"))
+
+            def readline() -> bytes:
+                b = f.readline().encode("ascii", errors="replace")
+                copy.write(b)
+                return b
+
+            lines = _Lines(readline)
+
+        # the obs2 helpers only call readline()
+        g = T.cast(T.TextIO, lines)
+
+        for ln in iter(lines.readline, ""):
+            if "END OF HEADER" in ln:
+                break
+        header = lines.pos
+
+        while True:
+            pos = lines.pos
+            ln = lines.readline()
+            if not ln:
+                break
+
+            if version == 3:
+                if not ln.startswith(">"):
+                    continue
+                try:
+                    time = obs3._timeobs(ln)
+                    sv = [lines.readline()[:3] for _ in range(int(ln[33:35]))]
+                except ValueError:
+                    continue
+                try:
+                    clock.append(float(ln[41:56]))
+                except ValueError:
+                    clock.append(None)
+            else:
+                try:
+                    time = obs2._timeobs(ln)
+                    sv = obs2._getsvind(g, ln)
+                except ValueError:
+                    continue
+                obs2._skip(g, ln, hdr["Nl_sv"], sv)
+                clock.append(None)
+
+            times.append(time)
+            starts.append(pos)
+            svs.append([s.replace(" ", "0") for s in sv])
+
+    return text, header, np.asarray(times, dtype="datetime64[ns]"), starts, svs, clock
+
+
+def _template(
+    text: _Text,
+    header: int,
+    starts: list[int],
+    ends: list[int | None],
+    i: np.ndarray,
+    kwargs: dict[str, T.Any],
+) -> xarray.Dataset:
+    """parse only the first selected epoch, for the attributes"""
+    from .base import rinexobs
+
+    if i.size == 0:
+        return rinexobs(text.read(header, header, header), **kwargs)
+
+    return rinexobs(text.read(header, starts[i[0]], ends[i[0]]), **kwargs)
+
+
+def _parse_chunk(
+    text: _Text,
+    header: int,
+    start: int,
+    end: int | None,
+    times: np.ndarray,
+    svs: list[str],
+    dtypes: dict[str, tuple[np.dtype, T.Any]],
+    kwargs: dict[str, T.Any],
+) -> dict[str, np.ndarray]:
+    """
+    read and parse the header and epochs of one time chunk,
+    aligned to the chunk times and SVs of the whole file
+    """
+    from .base import rinexobs
+
+    obs = rinexobs(text.read(header, start, end), **kwargs)
+
+    data = {}
+    for k, (dtype, fill) in dtypes.items():
+        if k in obs and obs.time.size > 0:
+            v = obs[k].reindex(time=times, sv=svs, fill_value=fill).transpose("time", "sv")
+            data[k] = v.values.astype(dtype, copy=False)
+        else:
+            data[k] = np.full((times.size, len(svs)), fill, dtype=dtype)
+
+    return data
@@ -0,0 +1,172 @@
+"""
+RINEX clock files: satellite (AS) and receiver (AR) clock bias
+
+https://files.igs.org/pub/data/format/rinex_clock300.txt
+https://files.igs.org/pub/data/format/rinex_clock304.txt
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+import xarray
+
+from .rio import opener, rinexinfo
+from .common import decode_array
+from .utils import _tlim
+
+# for NetCDF compression. too high slows down with little space savings.
+ENC = {"zlib": True, "complevel": 1, "fletcher32": True}
+TYPES = ("AS", "AR")
+CHUNK = 2**22  # [characters] read at a time to stop after tlim
+
+__all__ = ["load_clk", "clkheader"]
+
+
+def load_clk(
+    fn: Path,
+    outfn: Path | None = None,
+    use: set[str] | None = None,
+    tlim: tuple[datetime, datetime] | None = None,
+) -> xarray.Dataset:
+    """
+    clock bias [s] and its sigma [s] of satellites and receivers, by (time, sv).
+    Satellites are named like "G01", receivers by their 4 or 9 character station name.
+
+    use: systems, SVs and/or stations e.g. {"G"}, {"G05", "ALGO"}. Selecting systems keeps no
+         receivers unless they are also given.
+    tlim: epochs within [start, stop]; reading stops after stop
+    """
+    if isinstance(use, str):
+        use = {use}
+    tlim = _tlim(tlim)
+
+    with opener(fn) as f:
+        hdr = clkheader(f)
+        # RINEX clock 3.04 station names are 9 characters
+        off = 5 if hdr["version"] >= 3.04 else 0
+        lines = _read_records(f, tlim, off)
+
+    # %% fixed-width records as one structured array, classified by record type
+    rec = _records(lines, off)
+    rec = rec[np.isin(rec["type"], [t.encode() for t in TYPES])]
+
+    names = np.char.strip(rec["name"])
+    if use:
+        want = [u.encode() for u in use]
+        system = rec["name"].astype("S1")
+        keep = np.isin(names, want) | ((rec["type"] == b"AS") & np.isin(system, want))
+        rec = rec[keep]
+        names = names[keep]
+
+    # %% epochs: records are grouped by epoch, each epoch string converted once
+    e = rec["epoch"]
+    first = np.ones(e.size, dtype=bool)
+    first[1:] = e[1:] != e[:-1]
+    run = np.cumsum(first) - 1
+    times = np.asarray([_time(x.decode()) for x in e[first]], dtype="datetime64[ns]")
+    times, it = np.unique(times, return_inverse=True)
+    it = it[run] if it.size else run
+
+    if tlim is not None:
+        inside = (times >= np.datetime64(tlim[0])) & (times <= np.datetime64(tlim[1]))
+        sel = inside[it]
+        rec = rec[sel]
+        names = names[sel]
+        times, it = np.unique(times[it[sel]], return_inverse=True)
+
+    # bias E19.12, sigma E20.12 on the record line
+    nval = np.minimum(rec["n"].astype(int), 2)
+    v = decode_array(np.column_stack((rec["bias"], rec["sigma"])), nval)
+
+    svs, isv = np.unique(names, return_inverse=True)
+    svs = svs.astype(str)
+    bias = np.full((times.size, svs.size), np.nan)
+    sigma = np.full((times.size, svs.size), np.nan)
+    bias[it, isv] = v[:, 0]
+    sigma[it, isv] = v[:, 1]
+
+    ds = xarray.Dataset(
+        {"bias": (("time", "sv"), bias), "sigma": (("time", "sv"), sigma)},
+        coords={"time": times, "sv": svs},
+    )
+
+    ds.attrs["version"] = hdr["version"]
+    ds.attrs["rinextype"] = "clk"
+    if "TIME SYSTEM ID" in hdr:
+        ds.attrs["time_system"] = hdr["TIME SYSTEM ID"].strip()
+    if isinstance(fn, Path):
+        ds.attrs["filename"] = fn.name
+
+    if outfn:
+        outfn = Path(outfn).expanduser()
+        enc = {k: ENC for k in ds.data_vars}
+        ds.to_netcdf(outfn, mode="w", encoding=enc, format="NETCDF4")
+
+    return ds
+
+
+def clkheader(f: T.TextIO | Path) -> dict[T.Hashable, T.Any]:
+    """
+    RINEX clock header as unparsed dict, like navheader2()
+    """
+    if isinstance(f, (str, Path)):
+        with opener(f, header=True) as h:
+            return clkheader(h)
+
+    hdr = rinexinfo(f)
+
+    for ln in f:
+        if "END OF HEADER" in ln:
+            break
+        hdr[ln[60:].strip()] = ln[:60]
+
+    return hdr
+
+
+def _read_records(f: T.TextIO, tlim: tuple[datetime, datetime] | None, off: int) -> list[str]:
+    """
+    lines after the header, in blocks so that reading stops once a block ends after tlim.
+    Records are in time order.
+    """
+    if tlim is None:
+        return f.read().splitlines()
+
+    lines: list[str] = []
+    while True:
+        block = f.readlines(CHUNK)
+        if not block:
+            break
+        lines += "".join(block).splitlines()
+
+        last = next((ln for ln in reversed(block) if ln[:2] in TYPES), None)
+        if last is not None and _time(last[8 + off : 34 + off]) > tlim[1]:
+            break
+
+    return lines
+
+
+def _records(lines: list[str], off: int) -> np.ndarray:
+    """record lines as a structured array of their fixed-width fields"""
+    dtype = np.dtype(
+        {
+            "names": ["type", "name", "epoch", "n", "bias", "sigma"],
+            "formats": ["S2", f"S{4 + off}", "S26", "S3", "S19", "S19"],
+            "offsets": [0, 3, 8 + off, 34 + off, 39 + off, 59 + off],
+            "itemsize": 78 + off,
+        }
+    )
+    W = dtype.itemsize
+    text = "".join(ln[:W].ljust(W) for ln in lines)
+
+    return np.frombuffer(text.encode("ascii", errors="replace"), dtype=dtype)
+
+
+def _time(s: str) -> datetime:
+    """epoch of clock record columns: year month day hour minute second"""
+    year, month, day, hour, minute = (int(x) for x in s[:16].split())
+    sec = float(s[16:])
+
+    return datetime(year, month, day, hour, minute, int(sec), int(round(sec % 1 * 1e6)))
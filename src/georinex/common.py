@@ -2,15 +2,42 @@ from __future__ import annotations
 import typing as T
 from pathlib import Path
 from datetime import timedelta
+import os
+import tempfile
 import numpy as np
 import logging
 
+if T.TYPE_CHECKING:
+    import xarray
+
 try:
     import psutil
 except ImportError:
     psutil = None
 
 
+# RINEX OBS observables are F14.3, so integer milli-units hold them exactly
+FIXED_POINT_SCALE = 1e-3
+FIXED_POINT_FILL = np.iinfo(np.int64).min
+# LLI / SSI are single digits 0..9, so int8 holds them with a negative missing sentinel
+INDICATOR_FILL = -1
+DTYPE_POLICIES = {None, "compact"}
+OBS_LAYOUTS = {"dense", "long"}
+NAV_LAYOUTS = {"dense", "records"}
+# columns of the long-format OBS record table
+LONG_COLUMNS = {
+    "time_index": np.int32,
+    "sv_index": np.int16,
+    "meas_index": np.int16,
+    "value": np.float64,
+    "lli": np.int8,
+    "ssi": np.int8,
+}
+# rows per block when scanning / copying np.memmap spill arrays, bounds RAM use
+SPILL_ROWS = 65536
+SCAN_CHUNK = 2**24  # [characters] of text per block of scan_lines()
+
+
 def check_unique_times(times: np.ndarray) -> bool:
     Nuniq = np.unique(times).size
     Ntimes = times.size
@@ -27,6 +54,169 @@ def rinex_string_to_float(s: str) -> float:
     return float(s.replace("D", "E"))
 
 
+def decode_fields(
+    raws: T.Sequence[str], width: int, nfields: int | np.ndarray, blank: float = np.nan
+) -> np.ndarray:
+    """
+    decode fixed-width Fortran floats, one record per string, in bulk to a record x field array.
+
+    "D" exponents are read as "E". Blank fields are "blank",
+    fields past nfields of a record are NaN, and a record with a malformed field is all NaN,
+    with a logging warning.
+    """
+    nfields = np.broadcast_to(np.asarray(nfields, dtype=int), (len(raws),))
+    N = int(nfields.max()) if nfields.size else 0
+    if N == 0:
+        return np.empty((len(raws), 0))
+
+    L = N * width
+    text = "".join(r[:L].ljust(L) for r in raws).replace("D", "E")
+    a = np.frombuffer(text.encode("ascii", errors="replace"), dtype=f"S{width}").reshape(-1, N)
+
+    return decode_array(a, nfields, blank)
+
+
+def decode_array(
+    a: np.ndarray, nfields: int | np.ndarray | None = None, blank: float = np.nan
+) -> np.ndarray:
+    """
+    decode a record x field array of fixed-width bytes to float, as decode_fields()
+    """
+    a = np.char.strip(a)
+    isblank = a == b""
+    if nfields is None:
+        past = np.zeros(a.shape, dtype=bool)
+    else:
+        past = np.arange(a.shape[1]) >= np.asarray(nfields)[:, None]
+    a[isblank | past] = b"0"
+
+    bad = np.zeros(a.shape[0], dtype=bool)
+    try:
+        v = a.astype(float)
+    except ValueError:
+        v = np.empty(a.shape)
+        for i, r in enumerate(a):
+            try:
+                v[i] = r.astype(float)
+            except ValueError:
+                bad[i] = True
+        i = np.flatnonzero(bad)
+        logging.warning(
+            f"{i.size} records with malformed numbers read as NaN, the first is record {i[0]}: "
+            f"{b' '.join(a[i[0]]).decode(errors='replace')}"
+        )
+
+    v[isblank] = blank
+    v[past | bad[:, None]] = np.nan
+
+    return v
+
+
+def scan_lines(
+    f: T.TextIO, width: int, pattern: dict[int, bytes]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    find lines by bytes in fixed columns, over large blocks of text rather than line by line.
+
+    pattern: column: allowed bytes of matching lines e.g. {0: b">", 1: b" "}
+    returns: line numbers from the current position of the matching lines, and their first
+             width characters as a line x width uint8 array, blank past the end of line
+    """
+    cols = np.arange(width)
+    numbers = [np.empty(0, dtype=int)]
+    heads = [np.empty((0, width), dtype=np.uint8)]
+    Nline = 0
+    carry = ""
+    while True:
+        block = f.read(SCAN_CHUNK)
+        text = carry + block
+        if block:  # whole lines only
+            i = text.rfind("\n") + 1
+            text, carry = text[:i], text[i:]
+        if text:
+            L = len(text)
+            buf = np.frombuffer(
+                text.encode("ascii", errors="replace") + b"\n" * width, dtype=np.uint8
+            )
+            nl = np.flatnonzero(buf[:L] == 10)
+            starts = np.concatenate(([0], nl + 1))
+            starts = starts[starts < L]
+            length = np.append(nl, L)[: starts.size] - starts
+
+            # each column narrows down the lines still matching
+            i = np.arange(starts.size)
+            for c, allowed in pattern.items():
+                ok = np.zeros(256, dtype=bool)
+                ok[np.frombuffer(allowed, dtype=np.uint8)] = True
+                if b" " in allowed:
+                    i = i[ok[buf[starts[i] + c]] | (c >= length[i])]
+                else:
+                    i = i[ok[buf[starts[i] + c]] & (c < length[i])]
+
+            h = buf[starts[i, None] + cols]
+            h[cols >= length[i, None]] = 32
+
+            numbers.append(Nline + i)
+            heads.append(h)
+            Nline += starts.size
+        if not block:
+            break
+
+    return np.concatenate(numbers), np.concatenate(heads)
+
+
+def head_fields(heads: np.ndarray, columns: T.Sequence[tuple[int, int]]) -> np.ndarray:
+    """line x field array of bytes of the [start, stop) columns of scan_lines() heads"""
+    if heads.shape[0] == 0:
+        return np.empty((0, len(columns)), dtype="S1")
+
+    return np.column_stack(
+        [np.ascontiguousarray(heads[:, a:b]).view(f"S{b - a}")[:, 0] for a, b in columns]
+    )
+
+
+def skip_records(line: np.ndarray, span: np.ndarray) -> np.ndarray:
+    """
+    which candidate lines start a record, walking forward from the first over each record.
+    Candidates inside a record are skipped, as reading record by record does.
+
+    line: line numbers of candidates, ascending
+    span: number of lines of the record each candidate starts, 0 if not a record start
+    """
+    start = np.zeros(line.size, dtype=bool)
+    nxt = 0
+    for k, (i, n) in enumerate(zip(line.tolist(), span.tolist())):
+        if n == 0 or i < nxt:
+            continue
+        start[k] = True
+        nxt = i + n
+
+    return start
+
+
+def fields_datetime64(f: np.ndarray) -> np.ndarray:
+    """
+    epoch x (year, month, day, hour, minute, second) numbers to datetime64[ms] in bulk.
+    Epochs with a missing or out of range field are NaT.
+    """
+    ok = np.isfinite(f).all(axis=1)
+    f = np.where(ok[:, None], f, [1970, 1, 1, 0, 0, 0])
+    year, month, day, hour, minute, second = f.T
+
+    ok &= (f[:, :5] == np.floor(f[:, :5])).all(axis=1)
+    ok &= (month >= 1) & (month <= 12)
+    mon = np.where(ok, (year - 1970) * 12 + month - 1, 0).astype(np.int64).astype("datetime64[M]")
+    Ndays = ((mon + 1).astype("datetime64[D]") - mon.astype("datetime64[D]")).astype(int)
+    ok &= (day >= 1) & (day <= Ndays)
+    ok &= (hour >= 0) & (hour < 24) & (minute >= 0) & (minute < 60) & (second >= 0) & (second < 60)
+
+    ms = np.round(((day - 1) * 86400 + hour * 3600 + minute * 60 + second) * 1000)
+    t = mon.astype("datetime64[ms]") + ms.astype(np.int64).astype("timedelta64[ms]")
+    t[~ok] = np.datetime64("NaT")
+
+    return t
+
+
 def check_ram(memneed: int, fn: T.TextIO | Path):
     if psutil is None:
         return
@@ -36,13 +226,35 @@ def check_ram(memneed: int, fn: T.TextIO | Path):
     if memneed > 0.5 * mem.available:  # because of array copy Numpy => Xarray
         errmsg = (
             f"needs {memneed / 1e9} GBytes RAM, but only {mem.available / 1e9} Gbytes available \n"
-            "try fast=False to reduce RAM usage, raise a GitHub Issue to let us help"
+            "try fast=False to reduce RAM usage, or scratch= a directory to spill to disk. "
+            "Raise a GitHub Issue to let us help"
         )
         if isinstance(fn, Path):
             errmsg = f"{fn}" + errmsg
         raise RuntimeError(errmsg)
 
 
+def spill_array(scratch: Path, shape: tuple[int, ...], dtype: np.dtype, fill: T.Any) -> np.ndarray:
+    """
+    array backed by a np.memmap file in scratch directory, initialized to fill.
+    The file is left in scratch for as long as the data are used.
+    """
+    if 0 in shape:
+        return np.full(shape, fill, dtype=dtype)
+
+    scratch = Path(scratch).expanduser()
+    scratch.mkdir(parents=True, exist_ok=True)
+
+    fd, name = tempfile.mkstemp(prefix="georinex_", suffix=".dat", dir=scratch)
+    os.close(fd)
+
+    arr = np.memmap(name, dtype=dtype, mode="w+", shape=shape)
+    for i in range(0, shape[0], SPILL_ROWS):
+        arr[i : i + SPILL_ROWS] = fill
+
+    return arr
+
+
 def determine_time_system(header: dict[T.Hashable, T.Any]) -> str:
     """Determine which time system is used in an observation file."""
     # Current implementation is quite inconsistent in terms what is put into
@@ -87,3 +299,236 @@ def check_time_interval(interval: float | int | timedelta | None) -> timedelta |
         raise TypeError("expect time interval in seconds (float,int) or datetime.timedelta")
 
     return interval
+
+
+def is_indicator(name: T.Hashable) -> bool:
+    """LLI (loss of lock) and SSI (signal strength) variables"""
+    return str(name).endswith(("lli", "ssi"))
+
+
+def to_fixed_point(obs: xarray.Dataset) -> xarray.Dataset:
+    """
+    copy of obs with observables as int64 milli-units, with FIXED_POINT_FILL for missing data.
+    Dask-backed variables stay lazy.
+
+    The scale_factor and _FillValue attributes are used by NetCDF4 readers to decode
+    back to floating point. Integer deltas compress much better with zlib and shuffle.
+
+    Readers decode by multiplying with scale_factor, which is within 1 ulp of the parsed
+    value but not always bit for bit. from_fixed_point() divides instead, which recovers the
+    parsed float64 exactly, as RINEX observables have at most 3 decimals.
+    """
+    import xarray
+
+    obs = obs.copy()
+    for k in obs.data_vars:
+        if is_indicator(k) or obs[k].dtype.kind != "f":
+            continue
+
+        v = obs[k]
+        i = xarray.where(v.isnull(), FIXED_POINT_FILL, np.rint(v / FIXED_POINT_SCALE))
+        i = i.astype(np.int64)
+        i.attrs = {"scale_factor": FIXED_POINT_SCALE, "_FillValue": FIXED_POINT_FILL}
+        obs[k] = i
+
+    return obs
+
+
+def from_fixed_point(obs: xarray.Dataset) -> xarray.Dataset:
+    """
+    float64 copy of to_fixed_point() variables, e.g. of a NetCDF4 file opened with
+    mask_and_scale=False, bit for bit equal to the values parsed from RINEX
+    """
+    import xarray
+
+    obs = obs.copy()
+    milli = round(1 / FIXED_POINT_SCALE)
+    for k in obs.data_vars:
+        v = obs[k]
+        if v.attrs.get("scale_factor") != FIXED_POINT_SCALE or v.dtype.kind != "i":
+            continue
+
+        obs[k] = xarray.where(v == FIXED_POINT_FILL, np.nan, v / milli)
+
+    return obs
+
+
+def obs_dtype(name: T.Hashable, dtype_policy: str | None = None) -> tuple[np.dtype, T.Any]:
+    """
+    dtype and missing-data filler for an OBS variable
+
+    dtype_policy:
+        None: everything float64 with NaN for missing
+        "compact": LLI/SSI as int8 with INDICATOR_FILL, S* (SNR) and D* (Doppler) as float32.
+                   Phase and range stay float64.
+    """
+    if dtype_policy not in DTYPE_POLICIES:
+        raise ValueError(f"dtype_policy must be one of {DTYPE_POLICIES}, not {dtype_policy}")
+
+    if dtype_policy == "compact":
+        if is_indicator(name):
+            return np.dtype(np.int8), INDICATOR_FILL
+        if str(name).startswith(("S", "D")):
+            return np.dtype(np.float32), np.nan
+
+    return np.dtype(np.float64), np.nan
+
+
+def apply_dtype_policy(obs: xarray.Dataset, dtype_policy: str | None = None) -> xarray.Dataset:
+    """cast an already assembled OBS dataset per obs_dtype()"""
+
+    for k in obs.data_vars:
+        dtype, fill = obs_dtype(k, dtype_policy)
+        if obs[k].dtype == dtype:
+            continue
+
+        obs[k] = (obs[k].dims, fill_cast(obs[k].values, dtype, fill), fill_attrs(dtype, fill))
+
+    return obs
+
+
+def fill_cast(v: np.ndarray, dtype: np.dtype, fill: T.Any) -> np.ndarray:
+    """cast float data with NaN to dtype, replacing NaN by fill for integer dtypes"""
+    if dtype.kind == "i":
+        v = np.where(np.isnan(v), fill, v)
+
+    return v.astype(dtype, copy=False)
+
+
+def fill_attrs(dtype: np.dtype, fill: T.Any) -> dict[str, T.Any]:
+    return {"_FillValue": fill} if dtype.kind == "i" else {}
+
+
+def check_layout(layout: str, layouts: T.Container[str] = OBS_LAYOUTS) -> str:
+    if layout not in layouts:
+        raise ValueError(f"layout must be one of {layouts}, not {layout}")
+
+    return layout
+
+
+def long_append(
+    buf: dict[str, list[np.ndarray]], j: int, isv: np.ndarray, imeas: np.ndarray, garr: np.ndarray
+) -> int:
+    """
+    append the observations present in one epoch to the long-format record buffers,
+    returning the number of records appended
+
+    garr: (satellite, measurement * 3) value, LLI, SSI of each measurement, NaN if blank
+    isv: SV table index of each garr row
+    imeas: measurement table index of each garr measurement
+    """
+    val = garr[:, 0::3]
+    r, c = np.nonzero(~np.isnan(val))
+
+    buf["time_index"].append(np.full(r.size, j, dtype=LONG_COLUMNS["time_index"]))
+    buf["sv_index"].append(isv[r].astype(LONG_COLUMNS["sv_index"]))
+    buf["meas_index"].append(imeas[c].astype(LONG_COLUMNS["meas_index"]))
+    buf["value"].append(val[r, c])
+    for k, o in (("lli", 1), ("ssi", 2)):
+        buf[k].append(fill_cast(garr[:, o::3][r, c], np.dtype(LONG_COLUMNS[k]), INDICATOR_FILL))
+
+    return r.size
+
+
+def long_dataset(
+    buf: dict[str, list[np.ndarray]], times: T.Sequence[T.Any], svs: list[str], meas: list[str]
+) -> xarray.Dataset:
+    """
+    assemble long-format record buffers into a Dataset.
+    SV and measurement codes are stored as indices into the "sv" and "meas" coordinates.
+    """
+    import xarray
+
+    # sorted SV table, like the dense layout
+    order = np.argsort(svs, kind="stable")
+    remap = np.empty(order.size, dtype=LONG_COLUMNS["sv_index"])
+    remap[order] = np.arange(order.size)
+
+    data = {}
+    for k, dt in LONG_COLUMNS.items():
+        data[k] = np.concatenate(buf[k]) if buf[k] else np.empty(0, dtype=dt)
+    data["sv_index"] = remap[data["sv_index"]]
+
+    ds = xarray.Dataset(
+        {k: ("record", v) for k, v in data.items()},
+        coords={
+            "time": np.asarray(times, dtype="datetime64[ns]"),
+            "sv": np.asarray(svs, dtype="<U3")[order],
+            "meas": np.asarray(meas, dtype="<U3"),
+        },
+    )
+    for k in ("lli", "ssi"):
+        ds[k].attrs["_FillValue"] = INDICATOR_FILL
+
+    return ds
+
+
+def long_buffer() -> dict[str, list[np.ndarray]]:
+    return {k: [] for k in LONG_COLUMNS}
+
+
+def nav_records(
+    svs: T.Sequence[str] | np.ndarray,
+    times: T.Sequence[T.Any] | np.ndarray,
+    data: dict[str, np.ndarray],
+) -> xarray.Dataset:
+    """
+    NAV as a table with one record per ephemeris, sorted by SV then time (then file order).
+
+    The records of SV sv[j] are record sv_offset[j] to sv_offset[j] + sv_count[j],
+    see nav_sv(). Repeated times of an SV are kept as separate records.
+
+    data: field values of each ephemeris, in the order of svs, times
+    """
+    import xarray
+
+    t = np.asarray(times, dtype="datetime64[ns]")
+    svu, isv = np.unique(np.asarray(svs, dtype="<U3"), return_inverse=True)
+    # lexsort is stable, so repeated times stay in file order
+    order = np.lexsort((t, isv))
+
+    ds = xarray.Dataset(
+        {k: ("record", np.asarray(v)[order]) for k, v in data.items()},
+        coords={"time": ("record", t[order]), "sv": svu},
+    )
+    ds["sv_index"] = ("record", isv[order].astype(LONG_COLUMNS["sv_index"]))
+
+    return records_index(ds)
+
+
+def to_records(nav: xarray.Dataset) -> xarray.Dataset:
+    """dense (time, sv) NAV to layout="records", SV copies like "E04_1" back to their SV"""
+    if nav.attrs.get("layout") == "records":
+        return nav
+
+    fields = [k for k in nav.data_vars if set(nav[k].dims) == {"time", "sv"}]
+    data = {k: nav[k].transpose("time", "sv").values for k in fields}
+
+    present = np.zeros((nav.time.size, nav.sv.size), dtype=bool)
+    for v in data.values():
+        present |= ~np.isnan(v)
+    t, s = np.nonzero(present)
+
+    svs = np.asarray([str(sv)[:3] for sv in nav.sv.values], dtype="<U3")
+    rec = nav_records(svs[s], nav.time.values[t], {str(k): v[t, s] for k, v in data.items()})
+    rec.attrs = {**nav.attrs, **rec.attrs}
+
+    return rec
+
+
+def records_index(ds: xarray.Dataset) -> xarray.Dataset:
+    """(re)compute per-SV offsets of NAV records sorted by SV"""
+    count = np.bincount(ds["sv_index"].values, minlength=ds.sv.size)
+    ds["sv_offset"] = ("sv", np.cumsum(count) - count)
+    ds["sv_count"] = ("sv", count)
+    ds.attrs["layout"] = "records"
+
+    return ds
+
+
+def nav_sv(nav: xarray.Dataset, sv: str) -> xarray.Dataset:
+    """ephemerides of one SV from NAV records, without searching"""
+    j = nav.get_index("sv").get_loc(sv)
+    i = int(nav["sv_offset"][j])
+
+    return nav.isel(record=slice(i, i + int(nav["sv_count"][j])))
@@ -0,0 +1,357 @@
+"""
+dry run of reading a RINEX OBS file: size and parse time estimates, and a read strategy
+that fits a memory budget
+
+Epochs and their SVs are found with the bulk line scanner, like obstime2() / obstime3(),
+keeping only epoch lines and SV lists, never the whole text.
+"""
+
+from __future__ import annotations
+import typing as T
+import io
+import re
+import time
+import itertools
+from pathlib import Path
+from datetime import datetime, timedelta
+import importlib.util
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from .rio import opener, rinexinfo
+from .common import (
+    check_time_interval,
+    decode_array,
+    fields_datetime64,
+    head_fields,
+    is_indicator,
+    obs_dtype,
+    scan_lines,
+    skip_records,
+    LONG_COLUMNS,
+    SPILL_ROWS,
+)
+from .netcdf import _time_index
+from . import chunked
+from . import obs2
+from . import obs3
+
+__all__ = ["plan"]
+
+# epochs parsed to measure the parse rate for the predicted parse time
+SAMPLE_EPOCHS = 20
+UNITS = {
+    "": 1,
+    "B": 1,
+    "KB": 1e3,
+    "MB": 1e6,
+    "GB": 1e9,
+    "TB": 1e12,
+    "KIB": 2**10,
+    "MIB": 2**20,
+    "GIB": 2**30,
+    "TIB": 2**40,
+}
+
+
+def plan(
+    fn: Path,
+    use: set[str] | None = None,
+    tlim: tuple[datetime, datetime] | None = None,
+    useindicators: bool = False,
+    meas: list[str] | None = None,
+    *,
+    interval: float | int | timedelta | None = None,
+    dtype_policy: str | None = None,
+    max_memory: int | str | None = None,
+) -> dict[str, T.Any]:
+    """
+    dry run of load() for a RINEX OBS file, from the header and a scan of the epoch lines.
+
+    max_memory: budget like "4GB" or bytes, default half of available RAM
+
+    returns dict of expected epochs, satellites, observables, output bytes of each layout,
+    predicted parse seconds of a dense read, and the strategy that fits the budget, all
+    returning one Dataset like load():
+        "dense", "chunks" (with "chunks" size) or "scratch".
+    strategy is None if nothing fits. Reading with split_systems=True may still fit,
+    its peak is in "peak_bytes".
+    "resident_bytes" is the text of ZIP, LZW or Hatanaka input, decompressed in RAM while read.
+    """
+    fn = Path(fn).expanduser()
+    info = rinexinfo(fn)
+    if info["rinextype"] != "obs":
+        raise ValueError(f"plan is for RINEX OBS files, not {fn}")
+
+    if isinstance(use, str):
+        use = {use}
+    if isinstance(meas, str):
+        meas = [meas]
+
+    version = int(info["version"])
+    if version in {1, 2}:
+        hdr = obs2.obsheader2(fn, useindicators, meas)
+        names = [k for k in obs2._fields(hdr, useindicators) if k]
+        fields = {s: names for s in (use or "CEGJRS")}
+        times, lines, ep, sv, resident = _epochs2(fn, hdr["Nl_sv"])
+        # 80 column lines: epoch lines with 12 SVs each, then Nl_sv lines per SV
+        text = {s: 81 * hdr["Nl_sv"] for s in fields}
+        text_epoch = 81
+    elif version == 3:
+        hdr = obs3.obsheader3(fn, use, meas)
+        fields = {s: chunked._variables3({s: f}, useindicators) for s, f in hdr["fields"].items()}
+        times, lines, ep, sv, resident = _epochs3(fn, list(fields))
+        # SV and 16 columns per observable
+        text = {s: 4 + 16 * len(f) for s, f in hdr["fields"].items()}
+        text_epoch = 57
+    else:
+        raise ValueError(f"unknown RINEX version {version}  {fn}")
+
+    i = np.arange(times.size)[_time_index(times, tlim, check_time_interval(interval))]
+    Nt = i.size
+
+    keep = np.zeros(times.size, dtype=bool)
+    keep[i] = True
+    system = sv.astype("<U1")
+    ours = np.isin(system, list(fields))
+    sel = keep[ep] & ours
+
+    svs = {s: set(np.unique(sv[sel & (system == s)]).tolist()) for s in fields}
+    svs = {s: v for s, v in svs.items() if v}
+    counts = {s: int(np.count_nonzero(sel & (system == s))) for s in fields}
+    Nrecords = sum(counts.values())
+    Nobs = sum(n * sum(not is_indicator(k) for k in fields[s]) for s, n in counts.items())
+    text_bytes = Nt * text_epoch + sum(n * text[s] for s, n in counts.items())
+
+    observables = sorted({k for s in svs for k in fields[s]})
+    Nsv = sum(len(v) for v in svs.values())
+
+    def itemsize(names: T.Iterable[str]) -> int:
+        return sum(obs_dtype(k, dtype_policy)[0].itemsize for k in names)
+
+    epoch_bytes = Nsv * itemsize(observables)
+    system_bytes = {s: Nt * len(v) * itemsize(fields[s]) for s, v in svs.items()}
+    nbytes = {
+        "dense": Nt * epoch_bytes,
+        "split_systems": sum(system_bytes.values()),
+        "long": Nobs * sum(np.dtype(dt).itemsize for dt in LONG_COLUMNS.values()),
+    }
+    # parsing holds about one more copy of the data, RINEX 2 also 36 SV pages per system
+    peak = {
+        "dense": 2 * nbytes["dense"],
+        "split_systems": nbytes["split_systems"] + max(system_bytes.values(), default=0),
+    }
+    if version in {1, 2}:
+        pages = Nt * 36 * max((itemsize(fields[s]) for s in svs), default=0)
+        peak = {k: v + pages for k, v in peak.items()}
+    peak = {k: v + resident for k, v in peak.items()}
+
+    budget = _budget(max_memory)
+    kwargs = dict(use=use, useindicators=useindicators, meas=meas, dtype_policy=dtype_policy)
+
+    # each chunk holds its text and about two copies of its data, after the scan of the file
+    chunk_epoch = 2 * epoch_bytes + -(-text_bytes // max(Nt, 1))
+    Nchunk = Nt if budget is None else int(min(Nt, budget // max(chunk_epoch, 1)))
+    peak["chunks"] = max(resident, max(Nchunk, 1) * chunk_epoch)
+
+    p: dict[str, T.Any] = {
+        "filename": fn.name,
+        "version": info["version"],
+        "epochs": Nt,
+        "satellites": Nsv,
+        "systems": {s: len(v) for s, v in sorted(svs.items())},
+        "observables": observables,
+        "records": Nrecords,
+        "bytes": nbytes,
+        "text_bytes": text_bytes,
+        "resident_bytes": resident,
+        "peak_bytes": peak,
+        "parse_seconds": _parse_seconds(fn, lines, ep, ours, Nrecords, kwargs),
+        "max_memory": budget,
+        "strategy": None,
+    }
+
+    if budget is None or peak["dense"] <= budget:
+        p["strategy"] = "dense"
+    elif importlib.util.find_spec("dask") is not None and Nchunk > 0 and peak["chunks"] <= budget:
+        p["strategy"] = "chunks"
+        p["chunks"] = {"time": Nchunk}
+    elif (
+        version in {1, 2}
+        and 2 * min(Nt, SPILL_ROWS) * 36 * itemsize(observables) + resident <= budget
+    ):
+        p["strategy"] = "scratch"
+
+    return p
+
+
+def _skip_header(f: T.TextIO) -> int:
+    """
+    read past the header, returning the bytes of text that the opener holds in RAM:
+    all of it for ZIP, LZW and Hatanaka input, none for plain, gzip and bzip2 streams
+    """
+    for ln in f:
+        if "END OF HEADER" in ln:
+            break
+
+    return len(f.getvalue()) if isinstance(f, io.StringIO) else 0
+
+
+def _epochs2(
+    fn: Path, Nl_sv: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    RINEX 2 epoch times and line numbers after the header,
+    and each SV of each epoch as epoch index, SV name
+    """
+    with opener(fn) as f:
+        resident = _skip_header(f)
+        line, heads = scan_lines(f, 68, obs2.EPOCH2)
+
+    # as obstime2()
+    v = decode_array(head_fields(heads, obs2.TIME2 + [(28, 29), (29, 32)]))
+    v[:, 0] += np.where(v[:, 0] < 80, 2000, 1900)
+    frac = decode_array(head_fields(heads, [(16, 26)]))[:, 0] % 1
+    v[:, 5] += np.nan_to_num(frac)
+    times = fields_datetime64(v[:, :6])
+
+    Nsv = np.nan_to_num(v[:, 7]).astype(int)
+    epoch = ~np.isnat(times) & np.isfinite(v[:, 7])
+    span = np.where(epoch, np.maximum(-(-Nsv // 12), 1) + Nsv * Nl_sv, 0)
+    start = skip_records(line, span)
+    line, heads, times, Nsv = line[start], heads[start], times[start], Nsv[start]
+
+    # up to 12 SVs per line, the epoch line and its continuation lines
+    Nline = np.maximum(-(-Nsv // 12), 1)
+    ids = [heads[:, 32:68]]
+    if (Nline > 1).any():
+        more = np.concatenate([line[Nline > n] + n for n in range(1, Nline.max())])
+        with opener(fn) as f:
+            _skip_header(f)
+            cline, cheads = scan_lines(f, 68, {c: b" " for c in range(32)})
+        found = np.isin(cline, more)
+        cont = np.full((line.size, Nline.max() - 1, 36), 32, dtype=np.uint8)
+        k = np.searchsorted(line, cline[found], side="right") - 1
+        cont[k, cline[found] - line[k] - 1] = cheads[found, 32:68]
+        ids.extend(cont[:, n] for n in range(cont.shape[1]))
+
+    ids = np.stack(ids, axis=1).reshape(line.size, 12 * len(ids), 3)
+    ep, j = np.nonzero(np.arange(ids.shape[1]) < Nsv[:, None])
+    ids = ids[ep, j]
+    # a blank system is GPS, as _getSVlist()
+    ids[ids[:, 0] == 32, 0] = ord("G")
+    ids[ids == 32] = ord("0")
+
+    return times, line, ep, _svs(ids), resident
+
+
+def _epochs3(
+    fn: Path, systems: list[str]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    RINEX 3 epoch times and line numbers after the header,
+    and each SV of each epoch as epoch index, SV name
+    """
+    with opener(fn) as f:
+        resident = _skip_header(f)
+        line, heads = scan_lines(f, 35, {0: b">", 1: b" "})
+
+    # as obstime3()
+    v = decode_array(head_fields(heads, [(2, 6), (6, 9), (9, 12), (12, 15), (15, 18), (18, 29)]))
+    times = fields_datetime64(v)
+    Nsv = np.nan_to_num(decode_array(head_fields(heads, [(32, 35)]))[:, 0]).astype(int)
+    ok = ~np.isnat(times)
+    line, times, Nsv = line[ok], times[ok], Nsv[ok]
+
+    # observation lines begin with the SV
+    with opener(fn) as f:
+        _skip_header(f)
+        sline, ids = scan_lines(f, 3, {0: "".join(systems).encode()})
+    k = np.searchsorted(line, sline) - 1
+    inside = (k >= 0) & (sline - line[np.maximum(k, 0)] <= Nsv[np.maximum(k, 0)])
+    ids = ids[inside]
+    ids[ids == 32] = ord("0")
+
+    return times, line, k[inside], _svs(ids), resident
+
+
+def _svs(ids: np.ndarray) -> np.ndarray:
+    """SV x 3 bytes to SV names"""
+    if ids.shape[0] == 0:
+        return np.empty(0, dtype="<U3")
+
+    return np.ascontiguousarray(ids).view("S3")[:, 0].astype("<U3")
+
+
+def _parse_seconds(
+    fn: Path,
+    lines: np.ndarray,
+    ep: np.ndarray,
+    ours: np.ndarray,
+    Nrecords: int,
+    kwargs: dict[str, T.Any],
+) -> float:
+    """
+    parse time of Nrecords SV-epochs, from the time to parse the first epochs of the file
+    and the time to parse its header alone
+
+    lines: line number after the header of each epoch
+    ep, ours: epoch index of each SV-epoch, and if its system is read
+    """
+    from .base import rinexobs
+
+    K = min(SAMPLE_EPOCHS, lines.size)
+    with opener(fn) as f:
+        header = ""
+        for ln in f:
+            header += ln
+            if "END OF HEADER" in ln:
+                break
+        body = "".join(itertools.islice(f, lines[K] if K < lines.size else None))
+
+    rinexobs(io.StringIO(header), **kwargs)  # imports on first use aren't parse time
+
+    tic = time.perf_counter()
+    rinexobs(io.StringIO(header), **kwargs)
+    t0 = time.perf_counter() - tic
+    if K == 0:
+        return t0
+
+    tic = time.perf_counter()
+    rinexobs(io.StringIO(header + body), **kwargs)
+    t1 = time.perf_counter() - tic
+
+    Nsample = np.count_nonzero(ours[ep < K])
+    if Nsample == 0:
+        return t0
+
+    return t0 + max(t1 - t0, 0) * Nrecords / Nsample
+
+
+def parse_bytes(size: int | float | str) -> int:
+    """
+    memory size like "4GB", "512 MiB" or number of bytes
+    """
+    if isinstance(size, (int, float)):
+        return int(size)
+
+    m = re.fullmatch(r"\s*([0-9.]+)\s*([a-zA-Z]*)\s*", size)
+    if m is None or m.group(2).upper() not in UNITS:
+        raise ValueError(f"memory size must be like '4GB' or bytes, not {size}")
+
+    return int(float(m.group(1)) * UNITS[m.group(2).upper()])
+
+
+def _budget(max_memory: int | str | None) -> int | None:
+    if max_memory is not None:
+        return parse_bytes(max_memory)
+
+    if psutil is None:
+        return None
+
+    return int(0.5 * psutil.virtual_memory().available)
@@ -0,0 +1,179 @@
+"""
+selection of the broadcast ephemeris to use for each (time, sv)
+
+The rule is that of a receiver: the nearest Toe (ToC for GLONASS, SBAS) of a healthy
+ephemeris whose fit interval covers the time, and of those with the same Toe the latest
+issue of data.
+"""
+
+from __future__ import annotations
+import typing as T
+
+import numpy as np
+import xarray
+
+from .common import to_records
+
+__all__ = ["ephemeris_index", "select_ephemeris"]
+
+# GPS week 0, week and Toe (seconds of week) of GPS, Galileo, BeiDou, QZSS, IRNSS
+# are calendar weeks in their own time scale, so Toe is found from ToC without week fields
+EPOCH = np.datetime64("1980-01-06", "ns")
+WEEK = np.timedelta64(7, "D").astype("timedelta64[ns]")
+# nominal curve fit interval [hours], where the record has no FitIntvl
+FIT_HOURS = {"G": 4, "J": 2, "E": 4, "C": 1, "I": 2, "R": 0.5, "S": 0.1}
+HEALTH = {"C": "SatH1"}  # otherwise "health"
+ISSUE_OF_DATA = {"G": "IODE", "J": "IODE", "E": "IODnav", "C": "AODE", "I": "IODEC"}
+
+
+def ephemeris_index(nav: xarray.Dataset, *, healthy: bool = True) -> dict[str, T.Any]:
+    """
+    sorted (sv, Toe) index of NAV records, built once for any number of select_ephemeris()
+
+    nav: NAV in layout="records". Dense NAV is converted with common.to_records(),
+         record numbers then refer to to_records(nav).
+    healthy: leave out ephemerides with non-zero health
+    """
+    nav = to_records(nav)
+
+    svs = nav.sv.values
+    isv = nav["sv_index"].values.astype(np.int64)
+    sys = np.asarray([s[0] for s in svs], dtype="<U1")[isv] if isv.size else np.empty(0, "<U1")
+
+    toe = _toe(nav, sys)
+    iod = np.nan_to_num(_field(nav, sys, ISSUE_OF_DATA), nan=-np.inf)
+
+    ok = ~np.isnat(toe)
+    if healthy:
+        health = _field(nav, sys, {s: HEALTH.get(s, "health") for s in FIT_HOURS})
+        ok &= np.isnan(health) | (health == 0)
+
+    r = np.flatnonzero(ok)
+    # record order is the last tie breaker, so a repeated ephemeris resolves to the later one
+    r = r[np.lexsort((r, iod[r], toe[r].view(np.int64), isv[r]))]
+    # one ephemeris per SV and Toe
+    last = np.ones(r.size, dtype=bool)
+    last[:-1] = (isv[r][1:] != isv[r][:-1]) | (toe[r][1:] != toe[r][:-1])
+    r = r[last]
+
+    return {
+        "record": r,
+        "sv": svs,
+        "sv_index": isv[r],
+        "toe": toe[r],
+        "fit": _fit(nav, sys)[r],
+    }
+
+
+def select_ephemeris(
+    index: dict[str, T.Any] | xarray.Dataset,
+    times: T.Any,
+    svs: T.Any,
+    *,
+    fit_interval: bool = True,
+) -> np.ndarray:
+    """
+    record index of the ephemeris for each time, sv; -1 where there is none.
+    times and svs are broadcast against each other, like numpy.
+
+    index: from ephemeris_index(), or NAV, see ephemeris_index()
+    fit_interval: only ephemerides whose fit interval around Toe covers the time
+
+    Example:
+
+    i = select_ephemeris(index, times[:, None], ["G01", "E11"])
+    eph = nav.isel(record=i[i >= 0])
+    """
+    if isinstance(index, xarray.Dataset):
+        index = ephemeris_index(index)
+
+    t, s = np.broadcast_arrays(
+        np.asarray(times, dtype="datetime64[ns]"), np.asarray(svs, dtype=str)
+    )
+    shape = t.shape
+    if index["record"].size == 0:
+        return np.full(shape, -1, dtype=np.int64)
+
+    t = t.ravel()
+    s = s.ravel()
+
+    table = index["sv"]
+    j = np.searchsorted(table, s)
+    known = j < table.size
+    known[known] = table[j[known]] == s[known]
+
+    # %% position of each time among the Toe of its SV
+    key = _key(index["sv_index"], index["toe"])
+    p = np.searchsorted(key, _key(j, t), side="left")
+    lo = np.searchsorted(index["sv_index"], j, side="left")
+    hi = np.searchsorted(index["sv_index"], j, side="right")
+
+    # nearest Toe is one of these, as keys have whole seconds
+    cand = p[:, None] + np.array([-1, 0, 1])
+    valid = (cand >= lo[:, None]) & (cand < hi[:, None]) & (known & ~np.isnat(t))[:, None]
+    cand = np.clip(cand, 0, key.size - 1)
+
+    dist = np.abs(t[:, None] - index["toe"][cand])
+    if fit_interval:
+        valid &= 2 * dist <= index["fit"][cand]
+
+    dist = np.where(valid, dist.view(np.int64), np.iinfo(np.int64).max)
+    # on equal distance, the earlier Toe
+    best = np.argmin(dist, axis=1)
+    pick = cand[np.arange(cand.shape[0]), best]
+
+    out = np.where(valid.any(axis=1), index["record"][pick], -1)
+
+    return out.reshape(shape)
+
+
+def _key(sv_index: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """sort key by SV then time: SV index in the high bits, whole seconds since EPOCH below"""
+    sec = (np.where(np.isnat(times), EPOCH, times) - EPOCH) // np.timedelta64(1, "s")
+
+    return (np.asarray(sv_index, dtype=np.int64) << 32) + sec
+
+
+def _field(nav: xarray.Dataset, sys: np.ndarray, names: dict[str, str]) -> np.ndarray:
+    """value of a per-system field of each record, NaN where the system has none"""
+    v = np.full(sys.size, np.nan)
+    for s, k in names.items():
+        i = sys == s
+        if k in nav and i.any():
+            v[i] = nav[k].values[i]
+
+    return v
+
+
+def _toe(nav: xarray.Dataset, sys: np.ndarray) -> np.ndarray:
+    """
+    Toe of each record as datetime64[ns], found from ToC as Toe is seconds of week.
+    GLONASS, SBAS ephemerides are referenced to ToC.
+    """
+    toc = nav.time.values.astype("datetime64[ns]")
+    toe = toc.copy()
+
+    sow = _field(nav, sys, {s: "Toe" for s in ISSUE_OF_DATA})
+    i = np.isin(sys, list(ISSUE_OF_DATA))
+
+    good = i & ~np.isnan(sow)
+    start = EPOCH + ((toc[good] - EPOCH) // WEEK) * WEEK
+    t = start + np.round(sow[good] * 1e9).astype("timedelta64[ns]")
+    # Toe across a week boundary from ToC
+    t[t - toc[good] > WEEK // 2] -= WEEK
+    t[toc[good] - t > WEEK // 2] += WEEK
+    toe[good] = t
+    toe[i & np.isnan(sow)] = np.datetime64("NaT")
+
+    return toe
+
+
+def _fit(nav: xarray.Dataset, sys: np.ndarray) -> np.ndarray:
+    """fit interval of each record as timedelta64[ns]"""
+    hours = np.array([FIT_HOURS.get(s, 0) for s in sys], dtype=float)
+    if "FitIntvl" in nav:
+        fit = nav["FitIntvl"].values
+        given = np.isin(sys, ["G", "J"]) & (fit > 0)
+        hours[given] = fit[given]
+
+    return np.round(hours * 3600e9).astype("timedelta64[ns]")
@@ -1,12 +1,13 @@
 from __future__ import annotations
-import pandas
 import io
-import xarray
 import typing as T
 from pathlib import Path
 
 from .utils import rinexheader
 
+if T.TYPE_CHECKING:
+    import pandas
+
 
 def get_locations(files: list[Path]) -> pandas.DataFrame:
     """
@@ -14,6 +15,9 @@ def get_locations(files: list[Path]) -> pandas.DataFrame:
 
     Requires pymap3d.ecef2geodetic
     """
+    import pandas
+    import xarray
+
     if isinstance(files, (Path, io.StringIO)):
         files = [files]
 
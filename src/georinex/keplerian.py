@@ -4,15 +4,69 @@ Michael Hirsch, Ph.D.
 """
 
 from __future__ import annotations
-from datetime import datetime, timedelta
-import xarray
+import logging
 import numpy as np
+import xarray
+
+__all__ = ["keplerian2ecef", "keplerian2state", "solve_kepler"]
+
+GM = 3.986004418e14  # [m^3 s^-2]   Mean anomaly at tk
+omega_e = 7.2921151467e-5  # [rad s^-1]  Mean angular velocity of Earth
+omega_bdt = 7.2921150e-5  # [rad s^-1]  CGCS2000 Earth rotation rate for BeiDou
+F = -4.442807633e-10  # [s m^-1/2]  relativistic clock correction constant, IS-GPS-200 20.3.3.3.3.1
+
+GPS_EPOCH = np.datetime64("1980-01-06", "ns")
+BDT_EPOCH = np.datetime64("2006-01-01", "ns")
+WEEK_NS = 7 * 86400 * 10**9
+# week field and week 0 of each system. Galileo and IRNSS weeks in RINEX NAV are
+# continuous GPS weeks (RINEX 3.04 A8, A19), as is the QZSS week.
+WEEKS = {
+    "G": ("GPSWeek", GPS_EPOCH),
+    "J": ("GPSWeek", GPS_EPOCH),
+    "E": ("GALWeek", GPS_EPOCH),
+    "C": ("BDTWeek", BDT_EPOCH),
+    "I": ("BDTWeek", GPS_EPOCH),  # IRNSS week, named like BeiDou by nav3._fields()
+}
+WEEK_FIELDS = [w for w, _ in WEEKS.values()]
+# BeiDou GEO satellites, whose ECEF is rotated from an inclined reference frame
+BDS_GEO = {1, 2, 3, 4, 5, 59, 60, 61, 62, 63}
+
+FIELDS = [
+    "sqrtA",
+    "DeltaN",
+    "Toe",
+    "Eccentricity",
+    "M0",
+    "omega",
+    "Cuc",
+    "Cus",
+    "Cic",
+    "Cis",
+    "Crc",
+    "Crs",
+    "Io",
+    "IDOT",
+    "Omega0",
+    "OmegaDot",
+]
+XYZ = ["X", "Y", "Z", "dX", "dY", "dZ"]
+CLOCK = ["SVclockBias", "SVclockDrift", "SVclockDriftRate", "SVrelFreqBias"]
+# group delay of the single frequency user: GPS L1 C/A, Galileo E1 (I/NAV), BeiDou B1I
+TGD = {"G": "TGD", "J": "TGD", "E": "BGDe5b", "C": "TGD1", "I": "TGD"}
 
 
 def keplerian2ecef(
     sv: xarray.Dataset,
-) -> tuple[xarray.DataArray, xarray.DataArray, xarray.DataArray]:
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
+    ECEF position [m] at the time of each ephemeris of a NAV dataset:
+    one SV nav.sel(sv=...), the whole (time, sv) dataset or layout="records".
+    GPS, Galileo, BeiDou, QZSS and IRNSS are computed together;
+    GLONASS and SBAS positions are those of the ephemeris.
+
+    Output arrays have the dimensions of the Keplerian data variables, NaN where there is
+    no ephemeris.
+
     based on:
     https://ascelibrary.org/doi/pdf/10.1061/9780784411506.ap03
 
@@ -22,74 +76,319 @@ def keplerian2ecef(
     http://web.cecs.pdx.edu/~ssp/Reports/2006/Monaghan.pdf
     """
 
-    if "sv" in sv and sv["sv"] in {"R", "S"}:
-        return sv["X"], sv["Y"], sv["Z"]
+    time, sys, prn, d = _broadcast(sv)
 
-    # sv = sv.dropna(dim='time', how='all')
+    ecef = _orbit(d, sys, prn, time)
+    # %% GLONASS, SBAS broadcast ECEF position
+    i = np.isin(sys, ["R", "S"])
+    for k, v in ecef.items():
+        if k in d:
+            v[i] = d[k][i]
 
-    GM = 3.986004418e14  # [m^3 s^-2]   Mean anomaly at tk
-    omega_e = 7.2921151467e-5  # [rad s^-1]  Mean angular velocity of Earth
+    return ecef["X"], ecef["Y"], ecef["Z"]
 
-    A = sv["sqrtA"].values ** 2
 
-    n0 = np.sqrt(GM / A**3)  # computed mean motion
-    #    T = 2*pi / n0  # Satellite orbital period
+def keplerian2state(sv: xarray.Dataset, *, tgd: bool = True) -> dict[str, np.ndarray]:
+    """
+    ECEF position X, Y, Z [m], velocity dX, dY, dZ [m/s], satellite clock bias ClockBias [s]
+    and drift ClockDrift [s/s] at the time of each ephemeris, in one pass.
+    Accepts the same datasets as keplerian2ecef(), with output arrays of the same shape.
+
+    Clock bias includes the relativistic correction, and for tgd=True subtracts the group delay
+    of the single frequency user (see TGD); dual frequency users need tgd=False.
+    GLONASS and SBAS state and clock are those of the ephemeris.
+    """
+
+    time, sys, prn, d = _broadcast(sv, FIELDS + CLOCK + list(TGD.values()) + WEEK_FIELDS + XYZ)
+
+    state = _orbit(d, sys, prn, time, velocity=True, toc=time, tgd=tgd)
+    # %% GLONASS, SBAS broadcast ECEF state
+    i = np.isin(sys, ["R", "S"])
+    for k in XYZ:
+        if k in d:
+            state[k][i] = d[k][i]
+
+    return state
+
+
+def solve_kepler(
+    M: np.ndarray, e: np.ndarray, *, tol: float = 1e-12, max_iter: int = 10
+) -> np.ndarray:
+    """
+    eccentric anomaly E [rad] from Kepler's equation M = E - e sin(E), by Newton-Raphson
+    over whole arrays. Only elements not yet converged to |dE| < tol [rad] are iterated.
+    NaN input gives NaN.
+
+    M: mean anomaly [rad]
+    e: eccentricity
+    """
+    M, e = np.broadcast_arrays(np.asarray(M, dtype=float), np.asarray(e, dtype=float))
+    shape = M.shape
+    M = M.ravel()
+    e = e.ravel()
+
+    E = M + e * np.sin(M)
+    todo = np.flatnonzero(~np.isnan(E))
+    for _ in range(max_iter):
+        if todo.size == 0:
+            break
+        Ei = E[todo]
+        ei = e[todo]
+        dE = (Ei - ei * np.sin(Ei) - M[todo]) / (1 - ei * np.cos(Ei))
+        E[todo] = Ei - dE
+        todo = todo[~(np.abs(dE) < tol)]
+
+    if todo.size:
+        logging.warning(f"Kepler equation: {todo.size} not converged in {max_iter} iterations")
 
-    n = n0 + sv["DeltaN"].values  # corrected mean motion
+    return E.reshape(shape)
 
-    # from GPS Week 0
-    if sv.svtype[0] == "E":
-        weeks = sv["GALWeek"].values - 1024
-        # TODO: need to add N*4096 for year 2058 and beyond
-    elif sv.svtype[0] == "G":
-        weeks = sv["GPSWeek"].values
+
+def _broadcast(
+    sv: xarray.Dataset, names: list[str] | None = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """time, system, PRN and data variables of NAV, broadcast to a common shape"""
+    if names is None:
+        names = FIELDS + WEEK_FIELDS + XYZ[:3]
+    names = [k for k in dict.fromkeys(names) if k in sv]
+
+    sysv = _systems(sv)
+    arrs = xarray.broadcast(sv["time"], sysv, *[sv[k] for k in names])
+    time = arrs[0].values.astype("datetime64[ns]")
+    sys = arrs[1].values
+    d = {k: a.values.astype(float) for k, a in zip(names, arrs[2:])}
+
+    if "sv" in sv.coords:
+        prn = _prn(sv, arrs[1])
     else:
-        raise ValueError(f"Unknown system type {sv.svtype[0]}")
-    # %% shaping
-    weeks = np.atleast_1d(weeks).astype(float)
-    Toe = np.atleast_1d(sv["Toe"].values).astype(float)
-    e = sv["Eccentricity"].values
+        prn = np.zeros(time.shape, dtype=int)
+
+    return time, sys, prn, d
 
-    T0 = [datetime(1980, 1, 6) + timedelta(weeks=week) for week in weeks]
 
-    tk = np.empty(sv["time"].size, dtype=float)
+def _orbit(
+    d: dict[str, np.ndarray],
+    sys: np.ndarray,
+    prn: np.ndarray,
+    time: np.ndarray,
+    *,
+    velocity: bool = False,
+    toc: np.ndarray | None = None,
+    tgd: bool = True,
+) -> dict[str, np.ndarray]:
+    """
+    ECEF position (and velocity) of Keplerian ephemerides d at time, NaN for other systems.
+    Given the ToC of each ephemeris, also the satellite clock bias and drift of all systems.
+    """
+    names = XYZ[:6 if velocity else 3]
+    out = {k: np.full(time.shape, np.nan) for k in names}
+    dtr = np.zeros(time.shape)
+    dtrDot = np.zeros(time.shape)
+
+    if all(k in d for k in FIELDS):
+        _orbit_kepler(out, dtr, dtrDot, d, sys, prn, time)
+
+    if toc is not None:
+        out.update(_clock(d, sys, (time - toc) / np.timedelta64(1, "s"), tgd))
+        out["ClockBias"] += dtr
+        out["ClockDrift"] += dtrDot
+
+    return out
 
+
+def _orbit_kepler(
+    out: dict[str, np.ndarray],
+    dtr: np.ndarray,
+    dtrDot: np.ndarray,
+    d: dict[str, np.ndarray],
+    sys: np.ndarray,
+    prn: np.ndarray,
+    time: np.ndarray,
+):
+    """fills out and the relativistic clock terms dtr, dtrDot in place for Keplerian systems"""
     # %% time elapsed since reference epoch
-    for i, (t0, t1, t2) in enumerate(zip(T0, sv["time"], Toe)):
-        tsv = t1.values.astype("datetime64[us]").astype(datetime)
-        toe = timedelta(seconds=t2) + t0  # type: ignore
-        tk[i] = (tsv - toe).total_seconds()  # type: ignore
+    tk = np.full(time.shape, np.nan)
+    for s, (w, epoch) in WEEKS.items():
+        i = sys == s
+        if w not in d or not i.any():
+            continue
+        tk[i] = _tk(time[i], d[w][i], d["Toe"][i], epoch)
+
+    kepler = ~np.isnan(tk)
+
+    # GEO of BeiDou
+    geo = (sys == "C") & np.isin(prn, list(BDS_GEO))
+    we = np.where(sys == "C", omega_bdt, omega_e)
+
+    k = {n: v[kepler] for n, v in d.items() if n in FIELDS}
+    res = _kepler(k, tk[kepler], we[kepler], geo[kepler], "dX" in out)
+    for n in out:
+        out[n][kepler] = res[n]
+    dtr[kepler] = res["dtr"]
+    dtrDot[kepler] = res["dtrDot"]
+
+
+def _clock(d: dict[str, np.ndarray], sys: np.ndarray, dt: np.ndarray, tgd: bool):
+    """
+    satellite clock polynomial at dt [s] from ToC, less the group delay for tgd=True.
+    GLONASS -TauN + GammaN dt and SBAS aGf0 + aGf1 dt use SVrelFreqBias as the drift.
+    """
+    nan = np.full(dt.shape, np.nan)
+    a0 = d.get("SVclockBias", nan)
+    glo = np.isin(sys, ["R", "S"])
+    a1 = np.where(glo, d.get("SVrelFreqBias", nan), d.get("SVclockDrift", nan))
+    a2 = np.nan_to_num(d.get("SVclockDriftRate", nan))
+
+    bias = a0 + (a1 + a2 * dt) * dt
+    if tgd:
+        for s, k in TGD.items():
+            i = sys == s
+            if i.any():
+                bias[i] -= d.get(k, nan)[i]
+
+    return {"ClockBias": bias, "ClockDrift": a1 + 2 * a2 * dt}
+
+
+def _kepler(
+    k: dict[str, np.ndarray],
+    tk: np.ndarray,
+    we: np.ndarray,
+    geo: np.ndarray,
+    velocity: bool = False,
+) -> dict[str, np.ndarray]:
+    A = k["sqrtA"] ** 2
+
+    n0 = np.sqrt(GM / A**3)  # computed mean motion
+    #    T = 2*pi / n0  # Satellite orbital period
+
+    n = n0 + k["DeltaN"]  # corrected mean motion
+    e = k["Eccentricity"]
+    Toe = k["Toe"]
     # %% Kepler's eqn of eccentric anomaly
-    Mk = sv["M0"].values + n * tk  # Mean Anomaly
-    Ek = Mk + e * np.sin(Mk)  # Eccentric anomaly
+    Mk = k["M0"] + n * tk  # Mean Anomaly
+    Ek = solve_kepler(Mk, e)  # Eccentric anomaly
+    EkDot = n / (1 - e * np.cos(Ek))
     # %% true anomaly
     nuK = np.arctan2(np.sqrt(1 - e**2) * np.sin(Ek), np.cos(Ek) - e)
     # %% latitude
-    PhiK = nuK + sv["omega"].values  # argument of latitude
-    duk = sv["Cuc"].values * np.cos(2 * PhiK) + sv["Cus"].values * np.sin(
-        2 * PhiK
-    )  # argument of latitude correction
+    PhiK = nuK + k["omega"]  # argument of latitude
+    c2 = np.cos(2 * PhiK)
+    s2 = np.sin(2 * PhiK)
+    duk = k["Cuc"] * c2 + k["Cus"] * s2  # argument of latitude correction
     uk = PhiK + duk  # corred argument of latitude
     # %% inclination (same)
-    dik = sv["Cic"].values * np.cos(2 * PhiK) + sv["Cis"].values * np.sin(
-        2 * PhiK
-    )  # inclination correction
-    ik = sv["Io"].values + sv["IDOT"].values * tk + dik  # corrected inclination
+    dik = k["Cic"] * c2 + k["Cis"] * s2  # inclination correction
+    ik = k["Io"] + k["IDOT"] * tk + dik  # corrected inclination
     # %% radial distance (same)
-    drk = sv["Crc"].values * np.cos(2 * PhiK) + sv["Crs"].values * np.sin(
-        2 * PhiK
-    )  # radial correction
+    drk = k["Crc"] * c2 + k["Crs"] * s2  # radial correction
     rk = A * (1 - e * np.cos(Ek)) + drk  # corrected radial distance
     # %% right ascension  (same)
-    OmegaK = sv["Omega0"].values + (sv["OmegaDot"].values - omega_e) * tk - omega_e * Toe
+    # BeiDou GEO: in inertial frame, rotated to ECEF below
+    OmegaDotK = np.where(geo, k["OmegaDot"], k["OmegaDot"] - we)
+    OmegaK = k["Omega0"] + OmegaDotK * tk - we * Toe
     # %% transform
     Xk1 = rk * np.cos(uk)
     Yk1 = rk * np.sin(uk)
 
-    X = Xk1 * np.cos(OmegaK) - Yk1 * np.sin(OmegaK) * np.cos(ik)
+    cO = np.cos(OmegaK)
+    sO = np.sin(OmegaK)
+    ci = np.cos(ik)
 
-    Y = Xk1 * np.sin(OmegaK) + Yk1 * np.cos(OmegaK) * np.cos(ik)
+    X = Xk1 * cO - Yk1 * sO * ci
+
+    Y = Xk1 * sO + Yk1 * cO * ci
 
     Z = Yk1 * np.sin(ik)
 
-    return X, Y, Z
+    # %% relativistic clock correction and its rate
+    out = {
+        "X": X,
+        "Y": Y,
+        "Z": Z,
+        "dtr": F * e * k["sqrtA"] * np.sin(Ek),
+        "dtrDot": F * e * k["sqrtA"] * np.cos(Ek) * EkDot,
+    }
+
+    if velocity:
+        # %% time derivatives of the above
+        nuKDot = EkDot * np.sqrt(1 - e**2) / (1 - e * np.cos(Ek))
+        ukDot = nuKDot * (1 + 2 * (k["Cus"] * c2 - k["Cuc"] * s2))
+        ikDot = k["IDOT"] + 2 * nuKDot * (k["Cis"] * c2 - k["Cic"] * s2)
+        rkDot = A * e * np.sin(Ek) * EkDot + 2 * nuKDot * (k["Crs"] * c2 - k["Crc"] * s2)
+
+        Xk1Dot = rkDot * np.cos(uk) - Yk1 * ukDot
+        Yk1Dot = rkDot * np.sin(uk) + Xk1 * ukDot
+
+        out["dX"] = Xk1Dot * cO - Yk1Dot * ci * sO + Yk1 * np.sin(ik) * sO * ikDot - OmegaDotK * Y
+        out["dY"] = Xk1Dot * sO + Yk1Dot * ci * cO - Yk1 * np.sin(ik) * cO * ikDot + OmegaDotK * X
+        out["dZ"] = Yk1Dot * np.sin(ik) + Yk1 * ci * ikDot
+
+    if geo.any():
+        _bds_geo(out, geo, we[geo] * tk[geo], we[geo])
+
+    return out
+
+
+def _bds_geo(out: dict[str, np.ndarray], geo: np.ndarray, phi: np.ndarray, we: np.ndarray):
+    """
+    BeiDou ICD 5.2.4.12: Rz(omega_e tk) Rx(-5 deg), in place for the GEO elements
+    """
+    c5 = np.cos(np.radians(-5))
+    s5 = np.sin(np.radians(-5))
+    cp = np.cos(phi)
+    sp = np.sin(phi)
+
+    X = out["X"][geo]
+    y = out["Y"][geo] * c5 + out["Z"][geo] * s5
+    z = -out["Y"][geo] * s5 + out["Z"][geo] * c5
+
+    out["X"][geo] = X * cp + y * sp
+    out["Y"][geo] = -X * sp + y * cp
+    out["Z"][geo] = z
+
+    if "dX" in out:
+        dX = out["dX"][geo]
+        dy = out["dY"][geo] * c5 + out["dZ"][geo] * s5
+        dz = -out["dY"][geo] * s5 + out["dZ"][geo] * c5
+        # rotating frame: d/dt Rz(omega_e tk)
+        out["dX"][geo] = dX * cp + dy * sp + we * out["Y"][geo]
+        out["dY"][geo] = -dX * sp + dy * cp - we * out["X"][geo]
+        out["dZ"][geo] = dz
+
+
+def _tk(time: np.ndarray, week: np.ndarray, toe: np.ndarray, epoch: np.datetime64) -> np.ndarray:
+    """seconds from Toe, in int64 nanoseconds until the final subtraction"""
+    good = ~(np.isnan(week) | np.isnan(toe) | np.isnat(time))
+    tk = np.full(time.shape, np.nan)
+
+    toe_ns = epoch.astype(np.int64) + week[good].astype(np.int64) * WEEK_NS
+    toe_ns += np.round(toe[good] * 1e9).astype(np.int64)
+    tk[good] = (time[good].astype(np.int64) - toe_ns) / 1e9
+
+    return tk
+
+
+def _systems(sv: xarray.Dataset) -> xarray.DataArray:
+    """GNSS system letter of each SV, or of each record of layout="records" """
+    if "sv" not in sv.coords:
+        return xarray.DataArray(sv.attrs["svtype"][0])
+
+    svs = sv["sv"]
+    sys = xarray.DataArray(
+        np.asarray([str(s)[0] for s in np.atleast_1d(svs.values)]).reshape(svs.shape),
+        dims=svs.dims,
+    )
+    if sv.attrs.get("layout") == "records":
+        return sys[sv["sv_index"]]
+
+    return sys
+
+
+def _prn(sv: xarray.Dataset, sysv: xarray.DataArray) -> np.ndarray:
+    svs = np.atleast_1d(sv["sv"].values)
+    prn = np.asarray([int(str(s)[1:3]) for s in svs]).reshape(sv["sv"].shape)
+    prn = xarray.DataArray(prn, dims=sv["sv"].dims)
+    if sv.attrs.get("layout") == "records":
+        prn = prn[sv["sv_index"]]
+
+    return prn.broadcast_like(sysv).transpose(*sysv.dims).values
@@ -0,0 +1,222 @@
+"""
+Lagrange interpolation of SP3 precise orbits and clocks to any times
+
+The SP3 epochs are a common time grid for all SVs, so the Lagrange weights of each window of
+order + 1 consecutive epochs are computed once, as are the windows each SV has complete.
+"""
+
+from __future__ import annotations
+import typing as T
+
+import numpy as np
+import xarray
+
+__all__ = ["lagrange_windows", "interpolate_sp3"]
+
+BLOCK = 2**14  # queries evaluated together, bounds memory of (query, window) arrays
+# SP3 "bad or absent" values
+BAD_CLOCK = 999999.0
+
+
+def lagrange_windows(sp3: xarray.Dataset, order: int = 10) -> dict[str, T.Any]:
+    """
+    sliding windows of order + 1 epochs of SP3 position and clock, for interpolate_sp3()
+
+    A window is usable for an SV if none of its values are absent, and it does not span
+    missing epochs, that is, it is no longer than order nominal SP3 intervals.
+    """
+    N = order + 1
+    t = sp3.time.values.astype("datetime64[ns]")
+    if t.size < N:
+        raise ValueError(f"order {order} interpolation needs at least {N} SP3 epochs")
+
+    sec = (t - t[0]) / np.timedelta64(1, "s")
+
+    position = sp3["position"].values.astype(float)
+    position[(position == 0).all(axis=-1)] = np.nan
+    clock = sp3["clock"].values.astype(float)
+    clock[clock >= BAD_CLOCK] = np.nan
+
+    # %% barycentric weights 1 / prod(t_j - t_k) of each window
+    nodes = np.lib.stride_tricks.sliding_window_view(sec, N)
+    diff = nodes[:, :, None] - nodes[:, None, :]
+    diff[:, np.arange(N), np.arange(N)] = 1
+    weights = 1 / diff.prod(axis=2)
+
+    step = np.median(np.diff(sec))
+    regular = nodes[:, -1] - nodes[:, 0] <= order * step * 1.01
+
+    svs = sp3.sv.values.astype(str)
+
+    return {
+        "time": t,
+        "sec": sec,
+        "sv": svs,
+        "order": order,
+        "weights": weights,
+        # (component, epoch * SV) for contiguous gathers
+        "position": np.ascontiguousarray(position.reshape(-1, 3).T),
+        "clock": clock.reshape(1, -1),
+        "position_ok": _complete(np.isnan(position).any(axis=-1), N) & regular[:, None],
+        "clock_ok": _complete(np.isnan(clock), N) & regular[:, None],
+    }
+
+
+def interpolate_sp3(
+    windows: dict[str, T.Any] | xarray.Dataset,
+    times: T.Any,
+    svs: T.Any,
+    *,
+    velocity: bool = False,
+) -> dict[str, np.ndarray]:
+    """
+    SP3 position [km] and clock [microsecond] at each time, sv, in the units of load_sp3().
+    times and svs are broadcast against each other, like numpy.
+
+    The window is centered on the time where possible, shifted at the ends of the SP3 data and
+    to avoid absent values of the SV. Times outside the SP3 epochs, or with no usable window,
+    are NaN.
+
+    windows: from lagrange_windows(), or the SP3 dataset with order 10
+    velocity: also the time derivatives "velocity" [dm/s] and "dclock" [1e-4 microsecond/s]
+
+    Example:
+
+    w = lagrange_windows(sp3)
+    orb = interpolate_sp3(w, times[:, None], ["G01", "E11"])
+    orb["position"]  # (time, sv, ECEF)
+    """
+    if isinstance(windows, xarray.Dataset):
+        windows = lagrange_windows(windows)
+
+    t, s = np.broadcast_arrays(
+        np.asarray(times, dtype="datetime64[ns]"), np.asarray(svs, dtype=str)
+    )
+    shape = t.shape
+    t = t.ravel()
+    s = s.ravel()
+
+    out = {"position": np.full((t.size, 3), np.nan), "clock": np.full(t.size, np.nan)}
+    if velocity:
+        out["velocity"] = np.full((t.size, 3), np.nan)
+        out["dclock"] = np.full(t.size, np.nan)
+
+    table = windows["sv"]
+    isort = np.argsort(table)
+    j = np.clip(np.searchsorted(table[isort], s), 0, table.size - 1)
+    known = table[isort][j] == s
+    j = isort[j]
+
+    sec = (t - windows["time"][0]) / np.timedelta64(1, "s")
+    nodes = windows["sec"]
+    inside = known & (sec >= nodes[0]) & (sec <= nodes[-1])
+
+    for b in range(0, t.size, BLOCK):
+        q = b + np.flatnonzero(inside[b : b + BLOCK])
+        if q.size == 0:
+            continue
+        _evaluate(windows, out, q, sec[q], j[q], velocity)
+
+    return {k: v.reshape(shape + v.shape[1:]) for k, v in out.items()}
+
+
+def _evaluate(
+    w: dict[str, T.Any],
+    out: dict[str, np.ndarray],
+    q: np.ndarray,
+    sec: np.ndarray,
+    j: np.ndarray,
+    velocity: bool,
+):
+    """interpolate queries q, at seconds sec since the first epoch, of SV index j into out"""
+    nodes = w["sec"]
+    n = w["order"]
+    Nw = nodes.size - n
+    # the epochs p-1, p bracket each time
+    p = np.clip(np.searchsorted(nodes, sec, side="right"), 1, nodes.size - 1)
+
+    for name, rate, scale, ok in (
+        ("position", "velocity", 1e4, w["position_ok"]),  # km/s => dm/s
+        ("clock", "dclock", 1e4, w["clock_ok"]),  # microsecond/s => 1e-4 microsecond/s
+    ):
+        start = _start(ok, p, j, n, Nw)
+        good = start >= 0
+        if not good.any():
+            continue
+        start = start[good]
+
+        # the basis depends only on time and window, shared by the SVs queried at a time
+        us, isec = np.unique(sec[good], return_inverse=True)
+        key, inv = np.unique(isec * Nw + start, return_inverse=True)
+        iu, su = np.divmod(key, Nw)
+        D = us[iu] - nodes[su + np.arange(n + 1)[:, None]]
+        # (basis[, derivative], node, query)
+        B = _basis(D, w["weights"][su].T, velocity)[:, :, inv]
+        # flat index of epoch, SV
+        i = (start + np.arange(n + 1)[:, None]) * w["sv"].size + j[good]
+
+        v = w[name]
+        acc = np.zeros((B.shape[0], v.shape[0], start.size))
+        for c, vc in enumerate(v):
+            for k in range(n + 1):
+                acc[:, c] += B[:, k] * vc.take(i[k])
+
+        out[name][q[good]] = acc[0].T if name == "position" else acc[0, 0]
+        if velocity:
+            out[rate][q[good]] = (acc[1].T if name == "position" else acc[1, 0]) * scale
+
+
+def _start(ok: np.ndarray, p: np.ndarray, j: np.ndarray, n: int, Nw: int) -> np.ndarray:
+    """
+    first epoch of the window of each query, -1 if none:
+    nearest to centered of the usable windows still covering epochs p-1, p
+    """
+    center = p - (n + 1) // 2
+    lo = np.maximum(p - n, 0)
+    hi = np.minimum(p - 1, Nw - 1)
+
+    start = np.full(p.size, -1)
+    todo = np.ones(p.size, dtype=bool)
+    for off in [0] + [d * k for k in range(1, n + 1) for d in (-1, 1)]:
+        c = np.clip(center + off, lo, hi)
+        hit = todo & (c == center + off) & ok.take(c * ok.shape[1] + j)
+        start[hit] = c[hit]
+        todo &= ~hit
+        if not todo.any():
+            break
+
+    return start
+
+
+def _basis(D: np.ndarray, weights: np.ndarray, derivative: bool) -> np.ndarray:
+    """
+    Lagrange basis L_j = w_j prod_{k != j} D_k and its derivative, of D = t - t_k (node, query),
+    from prefix and suffix products so times on a node are exact.
+    Stacked as (L[, dL], node, query).
+    """
+    N = D.shape[0]
+    pre = np.ones_like(D)
+    suf = np.ones_like(D)
+    for k in range(1, N):
+        pre[k] = pre[k - 1] * D[k - 1]
+        suf[N - 1 - k] = suf[N - k] * D[N - k]
+
+    L = weights * pre * suf
+    if not derivative:
+        return L[None]
+
+    dpre = np.zeros_like(D)
+    dsuf = np.zeros_like(D)
+    for k in range(1, N):
+        dpre[k] = dpre[k - 1] * D[k - 1] + pre[k - 1]
+        dsuf[N - 1 - k] = dsuf[N - k] * D[N - k] + suf[N - k]
+
+    return np.stack((L, weights * (dpre * suf + pre * dsuf)))
+
+
+def _complete(bad: np.ndarray, N: int) -> np.ndarray:
+    """(window, sv) True where no epoch of the window is bad, by cumulative sum"""
+    c = np.zeros((bad.shape[0] + 1,) + bad.shape[1:], dtype=int)
+    np.cumsum(bad, axis=0, out=c[1:])
+
+    return (c[N:] - c[:-N]) == 0
@@ -2,12 +2,25 @@ from __future__ import annotations
 import typing as T
 from pathlib import Path
 from datetime import datetime
-import xarray
 import numpy as np
 import logging
 
+if T.TYPE_CHECKING:
+    import xarray
+
 from .rio import opener, rinexinfo
-from .common import rinex_string_to_float
+from .common import (
+    rinex_string_to_float,
+    decode_fields,
+    decode_array,
+    check_layout,
+    nav_records,
+    NAV_LAYOUTS,
+    scan_lines,
+    head_fields,
+    skip_records,
+    fields_datetime64,
+)
 
 #
 STARTCOL2 = 3  # column where numerical data starts for RINEX 2
@@ -16,18 +29,27 @@ Nl = {"G": 7, "R": 3, "E": 7}  # number of additional SV lines
 __all__ = ["rinexnav2", "navheader2", "navtime2"]
 
 
-def rinexnav2(fn: T.TextIO | Path, tlim: tuple[datetime, datetime] | None = None):
+def rinexnav2(
+    fn: T.TextIO | Path,
+    tlim: tuple[datetime, datetime] | None = None,
+    *,
+    layout: str = "dense",
+):
     """
     Reads RINEX 2.x NAV files
     Michael Hirsch, Ph.D.
     SciVision, Inc.
 
+    layout: "dense" (time, sv) arrays or "records" one per ephemeris, see common.nav_records()
+
     http://gage14.upc.es/gLAB/HTML/GPS_Navigation_Rinex_v2.11.html
     ftp://igs.org/pub/data/format/rinex211.txt
     """
     if isinstance(fn, (str, Path)):
         fn = Path(fn).expanduser()
 
+    check_layout(layout, NAV_LAYOUTS)
+
     Lf = 19  # string length per field
 
     svs = []
@@ -148,45 +170,28 @@ def rinexnav2(fn: T.TextIO | Path, tlim: tuple[datetime, datetime] | None = None
             # one line per SV
             # Sebastijan also added .replace('  ', ' ').replace(' -', '-') here,
             # I didn't add that yet because I don't know if it's generally needed.
-            raws.append(raw.replace("D", "E").replace("\n", ""))
+            raws.append(raw.replace("\n", ""))
 
     # %% parse collected data lines per SV
     svs = [s.replace(" ", "0") for s in svs]
-    svu = sorted(set(svs))
-
-    atimes = np.asarray(times)
-    timesu = np.unique(atimes)
-    data = np.empty((len(fields), timesu.size, len(svu)))
-    data.fill(np.nan)
-
-    for j, sv in enumerate(svu):  # for each SV, across all values and times...
-        svi = [i for i, s in enumerate(svs) if s == sv]  # these rows are for this SV
-
-        tu = np.unique(atimes[svi])  # this SV was seen at these times
-        if tu.size != atimes[svi].size:
-            logging.warning(f"duplicate times detected, skipping SV {sv}")
-            continue
-
-        for i in svi:
-            it = np.nonzero(timesu == times[i])[0][0]  # int by defn
-            """
-            some files sometimes drop the last measurement, this fixes that.
-            It assumes the blank is always in the last measurement for now.
-            """
-            dvec = [
-                float(raws[i][k * Lf : (k + 1) * Lf])
-                for k in range(min(len(fields), len(raws[i]) // Lf))
-            ]
-            data[: len(dvec), it, j] = dvec
-
-    # %% assemble output
-    # NOTE: time must be datetime64[ns] or .to_netcdf will fail
-    nav = xarray.Dataset(coords={"time": timesu.astype("datetime64[ns]"), "sv": svu})
-
-    for i, k in enumerate(fields):
-        if k is None:
-            continue
-        nav[k] = (("time", "sv"), data[i, :, :])
+    """
+    some files sometimes drop the last measurement, this fixes that.
+    It assumes the blank is always in the last measurement for now.
+    """
+    nfields = np.minimum(len(fields), [len(r) // Lf for r in raws]) if raws else 0
+    dvec = decode_fields(raws, Lf, nfields)
+
+    if layout == "records":
+        nav = nav_records(
+            svs,
+            times,
+            {
+                k: dvec[:, i] if i < dvec.shape[1] else np.full(len(raws), np.nan)
+                for i, k in enumerate(fields)
+            },
+        )
+    else:
+        nav = _assemble(svs, times, fields, dvec)
 
     # GLONASS uses kilometers to report its ephemeris.
     # Convert to meters here to be consistent with NAV3 implementation.
@@ -211,6 +216,33 @@ def rinexnav2(fn: T.TextIO | Path, tlim: tuple[datetime, datetime] | None = None
     return nav
 
 
+def _assemble(
+    svs: list[str], times: list[datetime], fields: list[str], dvec: np.ndarray
+) -> xarray.Dataset:
+    """
+    (time, sv) dataset, filled in one assignment. SVs with repeated times are left blank.
+    """
+    import xarray
+
+    svu, isv = np.unique(np.asarray(svs, dtype=str), return_inverse=True)
+    # NOTE: time must be datetime64[ns] or .to_netcdf will fail
+    timesu, it = np.unique(np.asarray(times, dtype="datetime64[ns]"), return_inverse=True)
+
+    keep = np.ones(len(svs), dtype=bool)
+    key, count = np.unique(isv * timesu.size + it, return_counts=True)
+    for j in np.unique(key[count > 1] // timesu.size):
+        logging.warning(f"duplicate times detected, skipping SV {svu[j]}")
+        keep[isv == j] = False
+
+    data = np.full((len(fields), timesu.size, svu.size), np.nan)
+    data[: dvec.shape[1], it[keep], isv[keep]] = dvec[keep].T
+
+    return xarray.Dataset(
+        {k: (("time", "sv"), data[i, :, :]) for i, k in enumerate(fields)},
+        coords={"time": timesu, "sv": svu},
+    )
+
+
 def navheader2(f: T.TextIO) -> dict[T.Hashable, T.Any]:
     """
     For RINEX NAV version 2 only. End users should use rinexheader()
@@ -257,24 +289,17 @@ def _skip(f: T.TextIO, Nl: int):
 
 def navtime2(fn: T.TextIO | Path):
     """
-    read all times in RINEX 2 NAV file
+    read all times in RINEX 2 NAV file, from the first line of each record,
+    found in large blocks of text by its blank separated date fields
     """
-    times = []
     with opener(fn) as f:
         hdr = navheader2(f)
+        line, heads = scan_lines(f, 22, {2: b" ", 5: b" ", 8: b" ", 11: b" ", 14: b" "})
 
-        while True:
-            ln = f.readline()
-            if not ln:
-                break
-
-            try:
-                time = _timenav(ln)
-            except ValueError:
-                continue
-
-            times.append(time)
+    v = decode_array(head_fields(heads, [(3, 5), (5, 8), (8, 11), (11, 14), (14, 17), (17, 22)]))
+    v[:, 0] += np.where(v[:, 0] < 80, 2000, 1900)
+    times = fields_datetime64(v)
 
-            _skip(f, Nl[hdr["systems"]])
+    span = np.where(np.isnat(times), 0, 1 + Nl[hdr["systems"]])
 
-    return np.unique(np.asarray(times, dtype="datetime64[ms]"))
+    return np.unique(times[skip_records(line, span)])
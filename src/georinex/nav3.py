@@ -1,34 +1,56 @@
 from __future__ import annotations
 import typing as T
 from pathlib import Path
-import xarray
-import logging
 import numpy as np
 import math
 from datetime import datetime
 
+if T.TYPE_CHECKING:
+    import xarray
+
 from .rio import opener, rinexinfo
-from .common import rinex_string_to_float
+from .common import (
+    rinex_string_to_float,
+    decode_fields,
+    check_layout,
+    nav_records,
+    NAV_LAYOUTS,
+    decode_array,
+    scan_lines,
+    head_fields,
+    skip_records,
+    fields_datetime64,
+)
 
 # constants
 STARTCOL3 = 4  # column where numerical data starts for RINEX 3
 Nl = {"C": 7, "E": 7, "G": 7, "J": 7, "R": 3, "S": 3, "I": 7}  # number of additional SV lines
 LF = 19  # string length per field
+# GLONASS and SBAS broadcast position, velocity, acceleration in km
+KM = {"X", "dX", "dX2", "Y", "dY", "dY2", "Z", "dZ", "dZ2"}
 
 __all__ = ["rinexnav3", "navheader3", "navtime3"]
 
 
 def rinexnav3(
-    fn: T.TextIO | Path, use: set[str] | None = None, tlim: tuple[datetime, datetime] | None = None
+    fn: T.TextIO | Path,
+    use: set[str] | None = None,
+    tlim: tuple[datetime, datetime] | None = None,
+    *,
+    layout: str = "dense",
 ):
     """
     Read RINEX 3.x NAV files
 
+    layout: "dense" (time, sv) arrays or "records" one per ephemeris, see common.nav_records()
+
     The "eof" stuff is over detection of files that may or may not have a trailing newline at EOF.
     """
     if isinstance(fn, (str, Path)):
         fn = Path(fn).expanduser()
 
+    check_layout(layout, NAV_LAYOUTS)
+
     svs = []
     raws = []
     svtypes: list[str] = []
@@ -77,68 +99,13 @@ def rinexnav3(
             for _, ln in zip(range(Nl[sv[0]]), f):
                 raw += ln[STARTCOL3:80]
             # one line per SV
-            raws.append(raw.replace("D", "E").replace("\n", ""))
+            raws.append(raw.replace("\n", ""))
 
-    # %% parse collected data per SV
-    # NOTE: must be 'ns' or .to_netcdf will fail!
-    t = np.array([np.datetime64(t, "ns") for t in times])
-    nav = xarray.Dataset({}, coords={"time": [], "sv": []})
-
-    for sv in set(svs):
-        svi = np.array([i for i, s in enumerate(svs) if s == sv])
-
-        check = np.array([True] * t[svi].size)
-        duplicate = True
-        sv_copies = 0
-        while duplicate:  # process until there are no more duplicate times
-            tu, iu = np.unique(t[svi][check], return_index=True)
-            duplicate = tu.size != t[svi][check].size
-
-            full_fields = fields[sv[0]]
-            compact_fields = _sparefields(full_fields, sys=sv[0], N=_num_fields(raws[svi[0]]))
-            compact_index = [i for i, c in enumerate(full_fields) if c in compact_fields]
-
-            darr = np.empty((svi.size, len(full_fields)))
-            darr.fill(np.nan)
-
-            for j, i in enumerate(svi):
-                try:
-                    darr[j, compact_index] = [
-                        float(raws[i][LF * k : LF * (k + 1)].strip() or 0)
-                        for k in range(len(compact_index))
-                    ]
-                except ValueError:
-                    logging.info(f"malformed line for {sv}")
-
-            # %% discard duplicated times
-            darr = darr[check, :][iu, :]
-
-            dsf = {}
-            for i, field in enumerate(full_fields):
-                if sv[0] in {"R", "S"} and field in {
-                    "X",
-                    "dX",
-                    "dX2",
-                    "Y",
-                    "dY",
-                    "dY2",
-                    "Z",
-                    "dZ",
-                    "dZ2",
-                }:
-                    darr[:, i] *= 1000  # km => m
-
-                dsf[field] = (("time", "sv"), darr[:, i][:, None])
-
-            svv = sv if not sv_copies else sv + f"_{sv_copies}"
-
-            if len(nav) == 0:
-                nav = xarray.Dataset(dsf, coords={"time": tu, "sv": [svv]})
-            else:
-                nav = xarray.merge((nav, xarray.Dataset(dsf, coords={"time": tu, "sv": [svv]})))
-
-            sv_copies += 1
-            check[np.arange(check.size)[check][iu]] = False
+    names, darr = _decode(svs, raws, fields)
+    if layout == "records":
+        nav = nav_records(svs, times, {k: darr[:, j] for j, k in enumerate(names)})
+    else:
+        nav = _assemble(svs, times, names, darr)
 
     # %% ionospheric correction coefficients
     if "IONOSPHERIC CORR" in header:
@@ -163,6 +130,82 @@ def rinexnav3(
     return nav
 
 
+def _decode(
+    svs: list[str], raws: list[str], fields: dict[str, list[str]]
+) -> tuple[list[str], np.ndarray]:
+    """
+    decode all records at once to a record x field array, with the fields of all systems
+    """
+    names = list(dict.fromkeys(k for s in sorted(fields) for k in fields[s]))
+    if not raws:
+        return names, np.empty((0, len(names)))
+
+    svu, isv = np.unique(svs, return_inverse=True)
+    first = np.unique(isv, return_index=True)[1]
+
+    # %% layout of each SV from its first record, as some receivers omit spare fields
+    layouts: dict[tuple[str, ...], int] = {}
+    sv_layout = np.empty(svu.size, dtype=int)
+    for j, (sv, i) in enumerate(zip(svu, first)):
+        compact = _sparefields(fields[sv[0]], sys=sv[0], N=_num_fields(raws[i]))
+        sv_layout[j] = layouts.setdefault(tuple(compact), len(layouts))
+
+    layout = sv_layout[isv]
+    ncompact = np.array([len(c) for c in layouts])[layout]
+    v = decode_fields(raws, LF, ncompact, blank=0)
+
+    darr = np.full((len(raws), len(names)), np.nan)
+    for compact, k in layouts.items():
+        i = np.flatnonzero(layout == k)
+        cols = np.array([names.index(c) for c in compact], dtype=int)
+        darr[np.ix_(i, cols)] = v[i, : len(compact)]
+
+    km = np.isin([s[0] for s in svs], ["R", "S"])
+    kmcols = np.array([j for j, c in enumerate(names) if c in KM], dtype=int)
+    darr[np.ix_(km, kmcols)] *= 1000  # km => m
+
+    return names, darr
+
+
+def _assemble(
+    svs: list[str], times: list[datetime], names: list[str], darr: np.ndarray
+) -> xarray.Dataset:
+    """
+    build the (time, sv) dataset in one pass.
+
+    Repeated times of an SV go to SV copies: the n-th record of an SV at a given time
+    is output as SV "_n", e.g. "E04_1", in file order.
+    """
+    import xarray
+
+    if not svs:
+        return xarray.Dataset({}, coords={"time": [], "sv": []})
+
+    # NOTE: must be 'ns' or .to_netcdf will fail!
+    t = np.array(times, dtype="datetime64[ns]")
+    isv = np.unique(svs, return_inverse=True)[1]
+
+    # %% n-th repeat of a time for an SV, in file order
+    order = np.lexsort((np.arange(t.size), t, isv))
+    new = np.ones(t.size, dtype=bool)
+    new[1:] = (isv[order][1:] != isv[order][:-1]) | (t[order][1:] != t[order][:-1])
+    start = np.flatnonzero(new)
+    copy = np.empty(t.size, dtype=int)
+    copy[order] = np.arange(t.size) - start[np.cumsum(new) - 1]
+
+    labels = [svs[i] if c == 0 else f"{svs[i]}_{c}" for i, c in enumerate(copy)]
+    sv_out, isv_out = np.unique(labels, return_inverse=True)
+    tu, it = np.unique(t, return_inverse=True)
+
+    cube = np.full((len(names), tu.size, sv_out.size), np.nan)
+    cube[:, it, isv_out] = darr.T
+
+    return xarray.Dataset(
+        {k: (("time", "sv"), cube[j]) for j, k in enumerate(names)},
+        coords={"time": tu, "sv": sv_out},
+    )
+
+
 def _num_fields(raw: str) -> int:
     """
     Return the number of fields in a raw string.
@@ -515,20 +558,21 @@ def navheader3(f: T.TextIO) -> dict[T.Hashable, T.Any]:
 
 def navtime3(fn: T.TextIO | Path):
     """
-    return all times in RINEX file
+    return all times in RINEX file, from the first line of each record,
+    found in large blocks of text by its system letter and blank separated date fields
     """
-    times = []
-
     with opener(fn) as f:
         navheader3(f)  # skip header
+        pattern = {0: "".join(Nl).encode(), 3: b" ", 8: b" ", 11: b" ", 14: b" ", 17: b" "}
+        line, heads = scan_lines(f, 23, pattern)
 
-        for line in f:
-            try:
-                time = _time(line)
-            except ValueError:
-                continue
+    v = decode_array(head_fields(heads, [(4, 8), (8, 11), (11, 14), (14, 17), (17, 20), (20, 23)]))
+    times = fields_datetime64(v)
 
-            times.append(time)
-            _skip(f, Nl[line[0]])  # different system types skip different line counts
+    # different system types span different line counts
+    lines = np.zeros(256, dtype=int)
+    for k, n in Nl.items():
+        lines[ord(k)] = 1 + n
+    span = np.where(np.isnat(times), 0, lines[heads[:, 0]])
 
-    return np.unique(np.asarray(times, dtype="datetime64[ms]"))
+    return np.unique(times[skip_records(line, span)])
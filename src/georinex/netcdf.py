@@ -0,0 +1,210 @@
+"""
+lazy reading of RINEX data previously converted to NetCDF4, or written to a Zarr store
+with the same OBS / NAV groups
+
+Selection by system, measurement, time window and decimation is applied as
+index slicing on the lazily opened file, so only the selected data are read from disk.
+"""
+
+from __future__ import annotations
+import typing as T
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import numpy as np
+import xarray
+
+from .common import check_time_interval, is_indicator, records_index
+from .rio import store_engine
+
+__all__ = ["open_nc", "open_obs", "select"]
+
+
+def open_nc(
+    fn: Path,
+    group: str,
+    use: set[str] | None = None,
+    tlim: tuple[datetime, datetime] | None = None,
+    meas: list[str] | None = None,
+    interval: float | int | timedelta | None = None,
+    *,
+    chunks: dict[str, int] | None = None,
+) -> xarray.Dataset:
+    """
+    open one group of a converted NetCDF4 file or Zarr store, without reading data
+
+    chunks: optional Dask chunk sizes e.g. {"time": 3600}
+    """
+    try:
+        ds = xarray.open_dataset(fn, group=group, chunks=chunks, engine=store_engine(fn))
+    except (OSError, KeyError) as e:
+        raise LookupError(f"Group {group} not found in {fn}   {e}")
+
+    return select(ds, use=use, tlim=tlim, meas=meas, interval=interval)
+
+
+def open_obs(
+    fn: Path,
+    group: str,
+    use: set[str] | None = None,
+    tlim: tuple[datetime, datetime] | None = None,
+    meas: list[str] | None = None,
+    interval: float | int | timedelta | None = None,
+    *,
+    chunks: dict[str, int] | None = None,
+) -> xarray.Dataset | dict[str, xarray.Dataset]:
+    """
+    like open_nc(), but the output of rinexobs(split_systems=True), with one subgroup
+    per system e.g. OBS/G, is opened as a dict of Dataset by system
+    """
+    ds = open_nc(fn, group, use, tlim, meas, interval, chunks=chunks)
+    if ds.data_vars:
+        return ds
+
+    prefix = f"/{group.strip('/')}/"
+    groups = xarray.open_groups(fn, chunks=chunks, engine=store_engine(fn))
+    systems = {
+        k[len(prefix) :]: v
+        for k, v in groups.items()
+        if k.startswith(prefix) and "/" not in k[len(prefix) :]
+    }
+    if not systems:
+        return ds
+
+    return {
+        sk: select(v, use=use, tlim=tlim, meas=meas, interval=interval)
+        for sk, v in sorted(systems.items())
+        if not use or sk in use
+    }
+
+
+def select(
+    ds: xarray.Dataset,
+    use: set[str] | None = None,
+    tlim: tuple[datetime, datetime] | None = None,
+    meas: list[str] | None = None,
+    interval: float | int | timedelta | None = None,
+) -> xarray.Dataset:
+    """
+    select like the RINEX readers do, by index slicing.
+    Works for dense (time, sv) OBS / NAV, OBS in layout="long" and NAV in layout="records".
+    """
+    interval = check_time_interval(interval)
+
+    if isinstance(meas, str):
+        meas = [meas]
+    if not meas or not meas[0].strip():
+        meas = None
+
+    if ds.attrs.get("layout") == "records":
+        return _select_records(ds, use, tlim)
+
+    ind: dict[str, T.Any] = {}
+    if "time" in ds.dims and (tlim is not None or interval is not None):
+        ind["time"] = _time_index(ds.time.values, tlim, interval)
+    if use and "sv" in ds.dims:
+        ind["sv"] = _contiguous(np.flatnonzero(_use_mask(ds.sv.values, use)))
+
+    if "record" in ds.dims:
+        if meas is not None:
+            ind["meas"] = _contiguous(
+                np.flatnonzero([_meas_match(m, meas) for m in ds.meas.values])
+            )
+        return _select_long(ds, ind)
+
+    if meas is not None:
+        ds = ds[[k for k in ds.data_vars if _meas_match(k, meas)]]
+
+    return ds.isel(ind)
+
+
+def _time_index(
+    times: np.ndarray, tlim: tuple[datetime, datetime] | None, interval: timedelta | None
+) -> slice | np.ndarray:
+    keep = np.ones(times.size, dtype=bool)
+    if tlim is not None:
+        keep &= (times >= np.datetime64(tlim[0])) & (times <= np.datetime64(tlim[1]))
+
+    if interval is not None:
+        step = np.timedelta64(interval)
+        last = None
+        for i in np.flatnonzero(keep):
+            if last is None:
+                last = times[i]
+            elif times[i] - last < step:
+                keep[i] = False
+            else:
+                last += step
+
+    return _contiguous(np.flatnonzero(keep))
+
+
+def _use_mask(svs: np.ndarray, use: set[str]) -> np.ndarray:
+    return np.isin([str(s)[0] for s in svs], list(use))
+
+
+def _meas_match(k: T.Hashable, meas: list[str]) -> bool:
+    name = str(k)
+    if is_indicator(name):
+        name = name[:-3]
+
+    return name.startswith(tuple(meas))
+
+
+def _contiguous(i: np.ndarray) -> slice | np.ndarray:
+    """a slice reads contiguous chunks from disk"""
+    if i.size and i[-1] - i[0] + 1 == i.size:
+        return slice(int(i[0]), int(i[-1]) + 1)
+
+    return i
+
+
+def _select_long(ds: xarray.Dataset, ind: dict[str, T.Any]) -> xarray.Dataset:
+    """
+    records of long layout refer to the time, sv, meas coordinates by index,
+    so only the (small) index columns are read to find the selected records.
+    """
+    if not ind:
+        return ds
+
+    keep = np.ones(ds.record.size, dtype=bool)
+    remap = {}
+    for dim, i in ind.items():
+        mask = np.zeros(ds[dim].size, dtype=bool)
+        mask[i] = True
+        index = ds[f"{dim}_index"].values
+        keep &= mask[index]
+        remap[dim] = np.cumsum(mask) - 1
+
+    ds = ds.isel(record=_contiguous(np.flatnonzero(keep)), **ind)
+    for dim, r in remap.items():
+        k = f"{dim}_index"
+        ds[k] = ds[k].copy(data=r[ds[k].values].astype(ds[k].dtype))
+
+    return ds
+
+
+def _select_records(
+    ds: xarray.Dataset, use: set[str] | None, tlim: tuple[datetime, datetime] | None
+) -> xarray.Dataset:
+    """
+    NAV records, selected by reading only the time and sv_index columns
+    """
+    if not use and tlim is None:
+        return ds
+
+    keep = np.ones(ds.record.size, dtype=bool)
+    if tlim is not None:
+        times = ds.time.values
+        keep &= (times >= np.datetime64(tlim[0])) & (times <= np.datetime64(tlim[1]))
+
+    sv = np.ones(ds.sv.size, dtype=bool)
+    if use:
+        sv = _use_mask(ds.sv.values, use)
+        keep &= sv[ds.sv_index.values]
+
+    ds = ds.isel(record=_contiguous(np.flatnonzero(keep)), sv=_contiguous(np.flatnonzero(sv)))
+    remap = np.cumsum(sv) - 1
+    ds["sv_index"] = ds.sv_index.copy(data=remap[ds.sv_index.values].astype(ds.sv_index.dtype))
+
+    return records_index(ds)
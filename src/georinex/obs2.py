@@ -4,10 +4,13 @@ from pathlib import Path
 import numpy as np
 import logging
 import io
+import shutil
+import tempfile
 from math import ceil
 from datetime import datetime, timedelta
-import xarray
 
+if T.TYPE_CHECKING:
+    import xarray
 
 try:
     from pymap3d import ecef2geodetic
@@ -15,10 +18,33 @@ except ImportError:
     ecef2geodetic = None
 
 from .rio import opener, rinexinfo
-from .common import determine_time_system, check_ram, check_time_interval, check_unique_times
+from .common import (
+    determine_time_system,
+    check_ram,
+    check_time_interval,
+    check_unique_times,
+    obs_dtype,
+    fill_attrs,
+    INDICATOR_FILL,
+    check_layout,
+    long_append,
+    long_buffer,
+    long_dataset,
+    spill_array,
+    SPILL_ROWS,
+    scan_lines,
+    head_fields,
+    decode_array,
+    skip_records,
+    fields_datetime64,
+)
 
 __all__ = ["rinexobs2", "rinexsystem2", "obsheader2", "obstime2"]
 
+# epoch line: blank separated date fields and an epoch flag of 0, 1, 5 or 6
+EPOCH2 = {0: b" ", 3: b" ", 6: b" ", 9: b" ", 12: b" ", 15: b" ", 28: b"0156"}
+TIME2 = [(1, 3), (4, 6), (7, 9), (10, 12), (13, 15), (16, 18)]
+
 
 def rinexobs2(
     fn: T.TextIO | Path,
@@ -30,18 +56,53 @@ def rinexobs2(
     *,
     fast: bool = True,
     interval: float | int | timedelta | None = None,
+    dtype_policy: str | None = None,
+    layout: str = "dense",
+    split_systems: bool = False,
+    scratch: Path | None = None,
 ):
+    """
+    process RINEX 2 OBS data, reading each system with rinexsystem2()
+
+    layout: "dense" (time, sv) variables or "long" record table, see rinexlong2()
+    split_systems: return a dict of Dataset by system instead of one Dataset over all SVs
+    scratch: directory for np.memmap data buffers, for files larger than available RAM.
+             The output variables are np.memmap files left in scratch, delete them when done.
+    """
+    import xarray
+
     if isinstance(use, str):
         use = {use}
 
     if not use:
         use = {"C", "E", "G", "J", "R", "S"}
 
+    if check_layout(layout) == "long":
+        if split_systems:
+            raise ValueError("split_systems is for the dense layout")
+        return rinexlong2(fn, use, tlim=tlim, meas=meas, verbose=verbose, interval=interval)
+
+    if scratch is not None:
+        return _rinexspill2(
+            fn,
+            use,
+            Path(scratch).expanduser(),
+            tlim=tlim,
+            useindicators=useindicators,
+            meas=meas,
+            verbose=verbose,
+            fast=fast,
+            interval=interval,
+            dtype_policy=dtype_policy,
+            split_systems=split_systems,
+        )
+
     obs = xarray.Dataset(
         {}, coords={"time": np.array([], dtype="datetime64[ns]"), "sv": np.array([], dtype="<U3")}
     )
     attrs: dict[T.Hashable, T.Any] = {}
-    for u in use:
+    systems: dict[str, xarray.Dataset] = {}
+    for u in sorted(use):
         o = rinexsystem2(
             fn,
             system=u,
@@ -51,17 +112,242 @@ def rinexobs2(
             verbose=verbose,
             fast=fast,
             interval=interval,
+            dtype_policy=dtype_policy,
         )
 
         if len(o.variables) > 0:
+            if split_systems:
+                if o.sv.size > 0:
+                    systems[u] = o
+                continue
+
             attrs = o.attrs
-            obs = xarray.merge((obs, o))
+            if any(v.dtype.kind == "i" for v in o.data_vars.values()):
+                obs = _merge_int(obs, o)
+            else:
+                obs = xarray.merge((obs, o))
+
+    if split_systems:
+        return systems
 
     obs.attrs = attrs
 
     return obs
 
 
+def _rinexspill2(
+    fn: T.TextIO | Path,
+    use: T.Iterable[str],
+    scratch: Path,
+    tlim: tuple[datetime, datetime] | None,
+    useindicators: bool,
+    meas: list[str] | None,
+    verbose: bool,
+    *,
+    fast: bool,
+    interval: float | int | timedelta | None,
+    dtype_policy: str | None,
+    split_systems: bool,
+):
+    """
+    like rinexobs2(), with np.memmap page buffers in a scratch directory.
+    RAM use is bounded by blocks of SPILL_ROWS epochs.
+    """
+    import xarray
+
+    scratch.mkdir(parents=True, exist_ok=True)
+    pages = Path(tempfile.mkdtemp(prefix="georinex_pages_", dir=scratch))
+
+    systems: dict[str, xarray.Dataset] = {}
+    for u in sorted(use):
+        o = rinexsystem2(
+            fn,
+            system=u,
+            tlim=tlim,
+            useindicators=useindicators,
+            meas=meas,
+            verbose=verbose,
+            fast=fast,
+            interval=interval,
+            dtype_policy=dtype_policy,
+            scratch=pages,
+        )
+        if len(o.variables) > 0:
+            systems[u] = o
+
+    hdr = obsheader2(fn, useindicators, meas)
+
+    out: dict[str, xarray.Dataset] | xarray.Dataset
+    if split_systems:
+        out = {}
+        for u, o in systems.items():
+            dat = _spill_combine([o], scratch)
+            if dat.sv.size > 0:
+                dat.attrs = _attrs(hdr, fn, dat, bool(o.fast_processing))
+                out[u] = dat
+    elif systems:
+        out = _spill_combine(list(systems.values()), scratch)
+        # like rinexobs2(), attributes of the last system
+        out.attrs = _attrs(hdr, fn, out, bool(systems[max(systems)].fast_processing))
+    else:
+        out = xarray.Dataset(
+            {}, coords={"time": np.array([], dtype="datetime64[ns]"), "sv": np.array([], dtype="<U3")}
+        )
+
+    # the page buffers were copied to the output arrays
+    systems.clear()
+    shutil.rmtree(pages, ignore_errors=True)
+
+    return out
+
+
+def _spill_combine(systems: list[xarray.Dataset], scratch: Path) -> xarray.Dataset:
+    """
+    drop SVs and times without data, and concatenate systems along sv,
+    copying block by block from the page buffers into one np.memmap per variable.
+    """
+    import xarray
+
+    times = systems[0].time.values
+
+    tkeep = np.zeros(times.size, dtype=bool)
+    svkeep = []
+    for o in systems:
+        m = np.zeros(o.sv.size, dtype=bool)
+        # integer indicators have no NaN, so only floating point variables decide what is empty
+        for k in (k for k in o.data_vars if o[k].dtype.kind == "f"):
+            v = o[k].values
+            for r in range(0, times.size, SPILL_ROWS):
+                present = ~np.isnan(v[r : r + SPILL_ROWS])
+                m |= present.any(axis=0)
+                tkeep[r : r + SPILL_ROWS] |= present.any(axis=1)
+        svkeep.append(m)
+
+    it = np.flatnonzero(tkeep)
+    svs = np.concatenate([o.sv.values[m] for o, m in zip(systems, svkeep)])
+
+    variables: dict[T.Hashable, xarray.DataArray] = {}
+    for o in systems:
+        for k in o.data_vars:
+            variables.setdefault(k, o[k])
+
+    obs = xarray.Dataset(coords={"time": times[it], "sv": svs})
+    for k, var in variables.items():
+        arr = spill_array(scratch, (it.size, svs.size), var.dtype, var.attrs.get("_FillValue", np.nan))
+        c = 0
+        for o, m in zip(systems, svkeep):
+            n = np.count_nonzero(m)
+            if k in o:
+                v = o[k].values
+                for r in range(0, it.size, SPILL_ROWS):
+                    arr[r : r + SPILL_ROWS, c : c + n] = v[it[r : r + SPILL_ROWS]][:, m]
+            c += n
+
+        obs[k] = (("time", "sv"), arr, var.attrs)
+
+    return obs
+
+
+def rinexlong2(
+    fn: T.TextIO | Path,
+    use: T.Container[str],
+    tlim: tuple[datetime, datetime] | None = None,
+    meas: list[str] | None = None,
+    verbose: bool = False,
+    *,
+    interval: float | int | timedelta | None = None,
+) -> xarray.Dataset:
+    """
+    RINEX 2 OBS data as a long-format table with one record per observation present:
+    time index, SV index, measurement index, value, LLI, SSI.
+    See common.long_dataset()
+
+    All systems are read in one pass, and memory scales with the number of observations
+    actually in the file rather than (time, sv) over all satellites.
+    """
+    if tlim is not None and not isinstance(tlim[0], datetime):
+        raise TypeError("time bounds are specified as datetime.datetime")
+
+    interval = check_time_interval(interval)
+
+    hdr = obsheader2(fn, meas=meas)
+
+    imeas = np.arange(len(hdr["fields"]))
+    cols = np.ravel([(k * 3, k * 3 + 1, k * 3 + 2) for k in hdr["fields_ind"]]).astype(int)
+
+    buf = long_buffer()
+    times: list[datetime] = []
+    svs: dict[str, int] = {}
+
+    with opener(fn) as f:
+        _skip_header(f)
+
+        last_epoch = None
+        for ln in f:
+            try:
+                time_epoch = _timeobs(ln)
+            except ValueError:
+                continue
+
+            if tlim is not None:
+                if time_epoch < tlim[0]:
+                    _skip(f, ln, hdr["Nl_sv"])
+                    continue
+                elif time_epoch > tlim[1]:
+                    break
+
+            if interval is not None:
+                if last_epoch is None:
+                    last_epoch = time_epoch
+                else:
+                    if time_epoch - last_epoch < interval:
+                        _skip(f, ln, hdr["Nl_sv"])
+                        continue
+                    else:
+                        last_epoch += interval
+
+            try:
+                sv = _getsvind(f, ln)
+            except ValueError as e:
+                logging.debug(e)
+                continue
+
+            if verbose:
+                print(time_epoch, end="\r")
+
+            gsv = [s for s in sv if s[0] in use]
+            raws = _read_raws(f, sv, use, hdr["Nl_sv"])
+
+            isv = np.array([svs.setdefault(s.replace(" ", "0"), len(svs)) for s in gsv], dtype=int)
+            darr = _epoch_array(raws, hdr["Nobs"], True)
+
+            if long_append(buf, len(times), isv, imeas, darr[:, cols]):
+                times.append(time_epoch)
+
+    obs = long_dataset(buf, times, list(svs), hdr["fields"])
+    obs.attrs = _attrs(hdr, fn, obs, False)
+    obs.attrs["layout"] = "long"
+
+    return obs
+
+
+def _merge_int(obs: xarray.Dataset, o: xarray.Dataset) -> xarray.Dataset:
+    """
+    systems have disjoint SVs, so integer indicators are stacked along "sv" with their
+    missing-data filler, as xarray.merge() would see the filler as conflicting data.
+    """
+    import xarray
+
+    if len(obs.data_vars) == 0:
+        return o
+
+    fill = {k: v.dtype.type(v.attrs["_FillValue"]) for k, v in o.items() if v.dtype.kind == "i"}
+
+    return xarray.concat(
+        (obs, o), dim="sv", join="outer", fill_value=fill, data_vars="all", coords="minimal"
+    ).sortby("sv")
+
+
 def rinexsystem2(
     fn: T.TextIO | Path,
     system: str,
@@ -72,6 +358,8 @@ def rinexsystem2(
     *,
     fast: bool = True,
     interval: float | int | timedelta | None = None,
+    dtype_policy: str | None = None,
+    scratch: Path | None = None,
 ) -> xarray.Dataset:
     """
     process RINEX OBS data
@@ -90,8 +378,14 @@ def rinexsystem2(
 
     t_interval: allows decimating file read by time e.g. every 5 seconds.
                 Useful to speed up reading of very large RINEX files
+
+    dtype_policy: "compact" stores LLI/SSI as int8 and S*, D* as float32, see common.obs_dtype()
+
+    scratch: directory for np.memmap page buffers instead of RAM. The pages are returned with
+             all SVs and times, empty ones are dropped when rinexobs2() combines the systems.
     """
-    Lf = 14
+    import xarray
+
     if not isinstance(system, str):
         raise TypeError("System type() must be str")
 
@@ -126,12 +420,22 @@ def rinexsystem2(
     times = _num_times(fn, Nextra, tlim, verbose)
     Nt = times.size
 
-    Npages = hdr["Nobsused"] * 3 if useindicators else hdr["Nobsused"]
-
-    memneed = Npages * Nt * Nsvsys * 8  # 8 bytes => 64-bit float
-    check_ram(memneed, fn)
-    data = np.empty((Npages, Nt, Nsvsys))
-    data.fill(np.nan)
+    fields = _fields(hdr, useindicators)
+    # one (time, sv) page per output variable, unused indicator pages are not allocated
+    dtypes = [obs_dtype(k, dtype_policy) for k in fields]
+
+    if scratch is None:
+        memneed = sum(Nt * Nsvsys * dt.itemsize for k, (dt, _) in zip(fields, dtypes) if k)
+        check_ram(memneed, fn)
+        data = [
+            np.full((Nt, Nsvsys), fill, dtype=dt) if k else None
+            for k, (dt, fill) in zip(fields, dtypes)
+        ]
+    else:
+        data = [
+            spill_array(scratch, (Nt, Nsvsys), dt, fill) if k else None
+            for k, (dt, fill) in zip(fields, dtypes)
+        ]
     # %% start reading
     with opener(fn) as f:
         _skip_header(f)
@@ -195,44 +499,8 @@ def rinexsystem2(
 
             gsv = np.array(sv)[iuse]
             # %% assign data for each time step
-            raws = []
-            for s in sv:
-                # don't process discarded satellites
-                if s[0] != system:
-                    for _ in range(hdr["Nl_sv"]):
-                        f.readline()
-                    continue
-                # .rstrip() necessary to handle variety of files and Windows vs. Unix
-                # NOT readline(80), but readline()[:80] is needed!
-                raw = [
-                    f"{f.readline()[:80]:80s}" for _ in range(hdr["Nl_sv"])
-                ]  # .rstrip() adds no significant process time
-
-                raws.append("".join(raw))
-            """
-            it is about 5x faster to call np.genfromtxt() for all sats and then index,
-            vs. calling np.genfromtxt() for each sat.
-            """
-            # can't use "usecols" with "delimiter"
-            # FIXME: only read requested meas=
-            darr = np.empty((len(raws), hdr["Nobsused"]))
-            darr.fill(np.nan)
-            for i, r in enumerate(raws):
-                for k in range(hdr["Nobs"]):
-                    v = r[k * (Lf + 2) : (k + 1) * (Lf + 2)]
-
-                    if useindicators:
-                        if v[:-2].strip():
-                            darr[i, k * 3] = float(v[:-2])
-
-                        if v[-2].strip():
-                            darr[i, k * 3 + 1] = float(v[-2])
-
-                        if v[-1].strip():
-                            darr[i, k * 3 + 2] = float(v[-1])
-                    else:
-                        if v[:-2].strip():
-                            darr[i, k] = float(v[:-2])
+            raws = _read_raws(f, sv, {system}, hdr["Nl_sv"])
+            darr = _epoch_array(raws, hdr["Nobs"], useindicators)
 
             assert darr.shape[0] == gsv.size
 
@@ -241,75 +509,159 @@ def rinexsystem2(
 
             for i, k in enumerate(hdr["fields_ind"]):
                 if useindicators:
-                    data[i * 3, j, isv] = darr[:, k * 3]
+                    _assign(data[i * 3], j, isv, darr[:, k * 3])
                     # FIXME which other should be excluded?
                     ind = i if meas is not None else k
                     if not hdr["fields"][ind].startswith("S"):
                         if hdr["fields"][ind].startswith("L"):
-                            data[i * 3 + 1, j, isv] = darr[:, k * 3 + 1]
+                            _assign(data[i * 3 + 1], j, isv, darr[:, k * 3 + 1])
 
-                        data[i * 3 + 2, j, isv] = darr[:, k * 3 + 2]
+                        _assign(data[i * 3 + 2], j, isv, darr[:, k * 3 + 2])
                 else:
-                    data[i, j, isv] = darr[:, k]
+                    _assign(data[i], j, isv, darr[:, k])
     # %% output gathering
-    data = data[:, : times.size, :]  # trims down for unneeded preallocated
-
-    fields = []
-    for field in hdr["fields"]:
-        fields.append(field)
-        if useindicators:
-            if field not in {"S1", "S2", "S5"}:
-                if field in {"L1", "L2", "L5"}:
-                    fields.append(f"{field}lli")
-                else:
-                    fields.append(None)
-                fields.append(f"{field}ssi")
-            else:
-                fields.extend([None, None])
-
     obs = xarray.Dataset(
         coords={"time": times, "sv": [f"{system}{i:02d}" for i in range(1, Nsvsys + 1)]}
     )
 
-    for i, k in enumerate(fields):
+    for k, d, dt in zip(fields, data, dtypes):
         # FIXME: for limited time span reads, this drops unused data variables
         # if np.isnan(data[i, ...]).all():
         #     continue
-        if k is None:
+        if k is None or d is None:
             continue
-        obs[k] = (("time", "sv"), data[i, :, :])
+        # trims down for unneeded preallocated
+        obs[k] = (("time", "sv"), d[: times.size, :], fill_attrs(*dt))
+
+    if scratch is not None:
+        obs.attrs = _attrs(hdr, fn, obs, fast)
+        return obs
 
-    obs = obs.dropna(dim="sv", how="all")
-    obs = obs.dropna(dim="time", how="all")  # when tlim specified
+    # integer indicators have no NaN, so only floating point variables decide what is empty
+    subset = [k for k in obs.data_vars if obs[k].dtype.kind == "f"]
+    obs = obs.dropna(dim="sv", how="all", subset=subset)
+    obs = obs.dropna(dim="time", how="all", subset=subset)  # when tlim specified
     # %% attributes
-    obs.attrs["version"] = hdr["version"]
+    obs.attrs = _attrs(hdr, fn, obs, fast)
+
+    return obs
+
+
+def _attrs(
+    hdr: dict[T.Hashable, T.Any], fn: T.TextIO | Path, obs: xarray.Dataset, fast: bool
+) -> dict[T.Hashable, T.Any]:
+    attrs: dict[T.Hashable, T.Any] = {}
+    attrs["version"] = hdr["version"]
 
     # Get interval from header or derive it from the data
     if "interval" in hdr.keys():
-        obs.attrs["interval"] = hdr["interval"]
+        attrs["interval"] = hdr["interval"]
     elif "time" in obs.coords.keys():
         # median is robust against gaps
         try:
-            obs.attrs["interval"] = np.median(np.diff(obs.time) / np.timedelta64(1, "s"))
+            attrs["interval"] = np.median(np.diff(obs.time) / np.timedelta64(1, "s"))
         except TypeError:
             pass
     else:
-        obs.attrs["interval"] = np.nan
+        attrs["interval"] = np.nan
 
-    obs.attrs["rinextype"] = "obs"
-    obs.attrs["fast_processing"] = int(fast)  # bool is not allowed in NetCDF4
-    obs.attrs["time_system"] = determine_time_system(hdr)
+    attrs["rinextype"] = "obs"
+    attrs["fast_processing"] = int(fast)  # bool is not allowed in NetCDF4
+    attrs["time_system"] = determine_time_system(hdr)
     if isinstance(fn, Path):
-        obs.attrs["filename"] = fn.name
+        attrs["filename"] = fn.name
     if "rxmodel" in hdr.keys():
-        obs.attrs["rxmodel"] = hdr["rxmodel"]
+        attrs["rxmodel"] = hdr["rxmodel"]
     if "position" in hdr.keys():
-        obs.attrs["position"] = hdr["position"]
+        attrs["position"] = hdr["position"]
 
     if "position_geodetic" in hdr.keys():
-        obs.attrs["position_geodetic"] = hdr["position_geodetic"]
+        attrs["position_geodetic"] = hdr["position_geodetic"]
+
+    return attrs
+
+
+def _read_raws(f: T.TextIO, sv: list[str], systems: T.Container[str], Nl_sv: int) -> list[str]:
+    """
+    read the data lines of one epoch, one string per satellite of the wanted systems
+    """
+    raws = []
+    for s in sv:
+        # don't process discarded satellites
+        if s[0] not in systems:
+            for _ in range(Nl_sv):
+                f.readline()
+            continue
+        # .rstrip() necessary to handle variety of files and Windows vs. Unix
+        # NOT readline(80), but readline()[:80] is needed!
+        raw = [f"{f.readline()[:80]:80s}" for _ in range(Nl_sv)]  # .rstrip() adds no significant process time
+
+        raws.append("".join(raw))
+
+    return raws
 
-    return obs
+
+def _epoch_array(raws: list[str], Nobs: int, useindicators: bool) -> np.ndarray:
+    """
+    (satellite, observation) data of one epoch, with LLI, SSI following each observation
+    if useindicators
+    """
+    Lf = 14
+    # can't use "usecols" with "delimiter"
+    # FIXME: only read requested meas=
+    darr = np.empty((len(raws), Nobs * 3 if useindicators else Nobs))
+    darr.fill(np.nan)
+    for i, r in enumerate(raws):
+        for k in range(Nobs):
+            v = r[k * (Lf + 2) : (k + 1) * (Lf + 2)]
+
+            if useindicators:
+                if v[:-2].strip():
+                    darr[i, k * 3] = float(v[:-2])
+
+                if v[-2].strip():
+                    darr[i, k * 3 + 1] = float(v[-2])
+
+                if v[-1].strip():
+                    darr[i, k * 3 + 2] = float(v[-1])
+            else:
+                if v[:-2].strip():
+                    darr[i, k] = float(v[:-2])
+
+    return darr
+
+
+def _fields(hdr: dict[T.Hashable, T.Any], useindicators: bool) -> list[str | None]:
+    """
+    output variable name for each data page, None for pages that are not output
+    """
+    fields: list[str | None] = []
+    for field in hdr["fields"]:
+        fields.append(field)
+        if useindicators:
+            if field not in {"S1", "S2", "S5"}:
+                if field in {"L1", "L2", "L5"}:
+                    fields.append(f"{field}lli")
+                else:
+                    fields.append(None)
+                fields.append(f"{field}ssi")
+            else:
+                fields.extend([None, None])
+
+    return fields
+
+
+def _assign(page: np.ndarray | None, j: int, isv: list[int], v: np.ndarray):
+    """
+    put one epoch of data into a page, integer pages get INDICATOR_FILL for missing data
+    """
+    if page is None:
+        return
+
+    if page.dtype.kind == "i":
+        v = np.where(np.isnan(v), INDICATOR_FILL, v)
+
+    page[j, isv] = v
 
 
 def _num_times(
@@ -499,25 +851,30 @@ def _getSVlist(ln: str, N: int, sv: list[str]) -> list[str]:
 
 def obstime2(fn: T.TextIO | Path, verbose: bool = False):
     """
-    read all times in RINEX2 OBS file
+    read all times in RINEX2 OBS file.
+
+    Epoch lines are found by their blank separator and flag columns in large blocks of text,
+    then each epoch skips its SV list and observation lines, counted from its number of SVs.
     """
 
-    times = []
     with opener(fn) as f:
         # Capture header info
         hdr = obsheader2(f)
+        line, heads = scan_lines(f, 32, EPOCH2)
 
-        for ln in f:
-            try:
-                time_epoch = _timeobs(ln)
-            except ValueError:
-                continue
-
-            times.append(time_epoch)
+    # year, month, day, hour, minute, second, flag, number of SVs
+    v = decode_array(head_fields(heads, TIME2 + [(28, 29), (29, 32)]))
+    v[:, 0] += np.where(v[:, 0] < 80, 2000, 1900)
+    # as _timeobs(), non-conforming files may not line up the decimal point
+    frac = decode_array(head_fields(heads, [(16, 26)]))[:, 0] % 1
+    v[:, 5] += np.nan_to_num(frac)
+    times = fields_datetime64(v[:, :6])
 
-            _skip(f, ln, hdr["Nl_sv"])
+    Nsv = np.nan_to_num(v[:, 7]).astype(int)
+    epoch = ~np.isnat(times) & np.isfinite(v[:, 7])
+    span = np.where(epoch, np.maximum(-(-Nsv // 12), 1) + Nsv * hdr["Nl_sv"], 0)
 
-    times = np.asarray(times, dtype="datetime64[ms]")
+    times = times[skip_records(line, span)]
 
     check_unique_times(times)
 
@@ -4,16 +4,32 @@ import numpy as np
 import logging
 from datetime import datetime, timedelta
 import io
-import xarray
 import typing as T
 
+if T.TYPE_CHECKING:
+    import xarray
+
 try:
     from pymap3d import ecef2geodetic
 except ImportError:
     ecef2geodetic = None
 #
 from .rio import opener, rinexinfo
-from .common import determine_time_system, check_time_interval, check_unique_times
+from .common import (
+    determine_time_system,
+    check_time_interval,
+    check_unique_times,
+    apply_dtype_policy,
+    obs_dtype,
+    check_layout,
+    long_append,
+    long_buffer,
+    long_dataset,
+    scan_lines,
+    head_fields,
+    decode_array,
+    fields_datetime64,
+)
 
 """https://github.com/mvglasow/satstat/wiki/NMEA-IDs"""
 
@@ -35,6 +51,9 @@ def rinexobs3(
     *,
     fast: bool = False,
     interval: float | int | timedelta | None = None,
+    dtype_policy: str | None = None,
+    layout: str = "dense",
+    split_systems: bool = False,
 ):
     """
     process RINEX 3 OBS data
@@ -55,9 +74,22 @@ def rinexobs3(
 
     interval: allows decimating file read by time e.g. every 5 seconds.
                 Useful to speed up reading of very large RINEX files
+
+    dtype_policy: "compact" stores LLI/SSI as int8 and S*, D* as float32, see common.obs_dtype()
+
+    layout: "dense" (time, sv) variables for each measurement, or
+            "long" one record per observation present, see common.long_dataset()
+
+    split_systems: return a dict of Dataset by system, each with only that system's
+                   measurements and satellites, avoiding alignment onto a shared sv axis.
     """
+    import xarray
 
     interval = check_time_interval(interval)
+    obs_dtype(None, dtype_policy)  # validate before reading
+    long = check_layout(layout) == "long"
+    if long and split_systems:
+        raise ValueError("split_systems is for the dense layout")
 
     if isinstance(use, str):
         use = {use}
@@ -70,6 +102,7 @@ def rinexobs3(
     # %% allocate
     # times = obstime3(fn)
     data = xarray.Dataset({}, coords={"time": [], "sv": []})
+    epochs: dict[str, list[tuple[datetime, np.ndarray, np.ndarray]]] = {}
     if tlim is not None and not isinstance(tlim[0], datetime):
         raise TypeError("time bounds are specified as datetime.datetime")
 
@@ -78,6 +111,11 @@ def rinexobs3(
     with opener(fn) as f:
         hdr = obsheader3(f, use, meas)
 
+        if long:
+            buf = long_buffer()
+            times: list[datetime] = []
+            svs: dict[str, int] = {}
+            meas_table, imeas = _meas_index(hdr["fields"])
         # %% process OBS file
         time_offset = []
         for ln in f:
@@ -122,46 +160,80 @@ def rinexobs3(
                 print(time, end="\r")
 
             # this time epoch is complete, assemble the data.
-            data = _epoch(data, raw, hdr, time, sv, useindicators, verbose)
+            if long:
+                if _epoch_long(buf, len(times), raw, hdr, sv, svs, imeas):
+                    times.append(time)
+            elif split_systems:
+                _epoch_split(epochs, raw, hdr, time, sv)
+            else:
+                data = _epoch(data, raw, hdr, time, sv, useindicators, verbose)
+
+    if long:
+        data = long_dataset(buf, times, list(svs), meas_table)
+        data.attrs["layout"] = "long"
+    elif split_systems:
+        systems = {}
+        for sk, e in epochs.items():
+            d = _finish(_split_dataset(e, hdr["fields"][sk], useindicators), dtype_policy)
+            d.attrs = _attrs(d, hdr, fn, time_offset)
+            systems[sk] = d
+        return systems
+    else:
+        data = _finish(data, dtype_policy)
+
+    data.attrs.update(_attrs(data, hdr, fn, time_offset))
 
+    return data
+
+
+def _finish(data: xarray.Dataset, dtype_policy: str | None) -> xarray.Dataset:
     # %% patch SV names in case of "G 7" => "G07"
     data = data.assign_coords(sv=[s.replace(" ", "0") for s in data.sv.values.tolist()])
-    # %% other attributes
-    data.attrs["version"] = hdr["version"]
+    return apply_dtype_policy(data, dtype_policy)
+
+
+def _attrs(
+    data: xarray.Dataset,
+    hdr: dict[T.Hashable, T.Any],
+    fn: T.TextIO | Path,
+    time_offset: list[float],
+) -> dict[T.Hashable, T.Any]:
+    attrs: dict[T.Hashable, T.Any] = {}
+    attrs["version"] = hdr["version"]
 
     # Get interval from header or derive it from the data
     if "interval" in hdr.keys():
-        data.attrs["interval"] = hdr["interval"]
+        attrs["interval"] = hdr["interval"]
     elif "time" in data.coords.keys():
         # median is robust against gaps
         try:
-            data.attrs["interval"] = np.median(np.diff(data.time) / np.timedelta64(1, "s"))
+            attrs["interval"] = np.median(np.diff(data.time) / np.timedelta64(1, "s"))
         except TypeError:
             pass
     else:
-        data.attrs["interval"] = np.nan
+        attrs["interval"] = np.nan
 
-    data.attrs["rinextype"] = "obs"
-    data.attrs["fast_processing"] = 0  # bool is not allowed in NetCDF4
-    data.attrs["time_system"] = determine_time_system(hdr)
+    attrs["rinextype"] = "obs"
+    attrs["fast_processing"] = 0  # bool is not allowed in NetCDF4
+    attrs["time_system"] = determine_time_system(hdr)
     if isinstance(fn, Path):
-        data.attrs["filename"] = fn.name
+        attrs["filename"] = fn.name
 
     if "position" in hdr.keys():
-        data.attrs["position"] = hdr["position"]
+        attrs["position"] = hdr["position"]
         if ecef2geodetic is not None:
-            data.attrs["position_geodetic"] = hdr["position_geodetic"]
+            attrs["position_geodetic"] = hdr["position_geodetic"]
 
     if time_offset:
-        data.attrs["time_offset"] = time_offset
+        attrs["time_offset"] = time_offset
 
     if "RCV CLOCK OFFS APPL" in hdr.keys():
         try:
-            data.attrs["receiver_clock_offset_applied"] = int(hdr["RCV CLOCK OFFS APPL"])
+            attrs["receiver_clock_offset_applied"] = int(hdr["RCV CLOCK OFFS APPL"])
         except ValueError:
             pass
 
-    return data
+    return attrs
 
 
 def _timeobs(ln: str) -> datetime:
@@ -185,21 +257,18 @@ def _timeobs(ln: str) -> datetime:
 
 def obstime3(fn: T.TextIO | Path, verbose: bool = False):
     """
-    return all times in RINEX file
+    return all times in RINEX file, from the lines beginning "> " found in large blocks of text
     """
 
-    times = []
-
     with opener(fn) as f:
-        for ln in f:
-            if ln.startswith("> "):
-                try:
-                    times.append(_timeobs(ln))
-                except (ValueError, IndexError):
-                    logging.debug(f"was not a time:\n{ln}")
-                    continue
+        _, heads = scan_lines(f, 29, {0: b">", 1: b" "})
+
+    v = decode_array(head_fields(heads, [(2, 6), (6, 9), (9, 12), (12, 15), (15, 18), (18, 29)]))
+    times = fields_datetime64(v)
+    if np.isnat(times).any():
+        logging.debug(f"{np.isnat(times).sum()} lines beginning > were not a time")
 
-    times = np.asarray(times, dtype="datetime64[ms]")
+    times = times[~np.isnat(times)]
 
     check_unique_times(times)
 
@@ -218,34 +287,18 @@ def _epoch(
     """
     block processing of each epoch (time step)
     """
-    darr = np.atleast_2d(
-        np.genfromtxt(io.BytesIO(raw.encode("ascii")), delimiter=(14, 1, 1) * hdr["Fmax"])
-    )
+    import xarray
+
+    darr = _epoch_array(raw, hdr)
     # %% assign data for each time step
     for sk in hdr["fields"]:  # for each satellite system type (G,R,S, etc.)
-        # satellite indices "si" to extract from this time's measurements
-        si = [i for i, s in enumerate(sv) if s[0] in sk]
-        if len(si) == 0:  # no SV of this system "sk" at this time
+        epoch_data = _epoch_system(darr, hdr, sk, time, sv, useindicators)
+        if epoch_data is None:
             continue
 
-        # measurement indices "di" to extract at this time step
-        di = hdr["fields_ind"][sk]
-        garr = darr[si, :]
-        garr = garr[:, di]
-
-        gsv = np.array(sv)[si]
-
-        dsf: dict[str, tuple] = {}
-        for i, k in enumerate(hdr["fields"][sk]):
-            dsf[k] = (("time", "sv"), np.atleast_2d(garr[:, i * 3]))
-
-            if useindicators:
-                dsf = _indicators(dsf, k, garr[:, i * 3 + 1 : i * 3 + 3])
-
         if verbose:
             print(time, "\r", end="")
 
-        epoch_data = xarray.Dataset(dsf, coords={"time": [time], "sv": gsv})
         if len(data) == 0:
             data = epoch_data
         elif len(hdr["fields"]) == 1:  # one satellite system selected, faster to process
@@ -256,20 +309,150 @@ def _epoch(
     return data
 
 
+def _epoch_split(
+    data: dict[str, list[tuple[datetime, np.ndarray, np.ndarray]]],
+    raw: str,
+    hdr: dict[T.Hashable, T.Any],
+    time: datetime,
+    sv: list[str],
+):
+    """
+    block processing of each epoch (time step): the (SV, measurement * 3) array of each system
+    is kept, the Datasets are built once from them by _split_dataset()
+    """
+    darr = _epoch_array(raw, hdr)
+    svs = np.array(sv)
+
+    for sk in hdr["fields"]:
+        si = [i for i, s in enumerate(sv) if s[0] in sk]
+        if len(si) == 0:  # no SV of this system "sk" at this time
+            continue
+
+        data.setdefault(sk, []).append((time, svs[si], darr[si][:, hdr["fields_ind"][sk]]))
+
+
+def _split_dataset(
+    epochs: list[tuple[datetime, np.ndarray, np.ndarray]],
+    fields: list[str],
+    useindicators: bool,
+) -> xarray.Dataset:
+    """
+    one system's (time, sv) Dataset from its epochs, on the sorted SVs seen in any epoch
+    """
+    import xarray
+
+    svu = np.unique(np.concatenate([s for _, s, _ in epochs]))
+    garr = np.full((len(epochs), svu.size, epochs[0][2].shape[1]), np.nan)
+    for i, (_, s, a) in enumerate(epochs):
+        garr[i, np.searchsorted(svu, s)] = a
+
+    dsf: dict[str, tuple] = {}
+    for i, k in enumerate(fields):
+        dsf[k] = (("time", "sv"), garr[:, :, i * 3])
+
+        if useindicators:
+            dsf = _indicators(dsf, k, garr[:, :, i * 3 + 1 : i * 3 + 3])
+
+    return xarray.Dataset(dsf, coords={"time": [t for t, _, _ in epochs], "sv": svu})
+
+
+def _epoch_array(raw: str, hdr: dict[T.Hashable, T.Any]) -> np.ndarray:
+    """
+    (satellite, measurement * 3) data of one epoch, each measurement followed by LLI, SSI
+    """
+    return np.atleast_2d(
+        np.genfromtxt(io.BytesIO(raw.encode("ascii")), delimiter=(14, 1, 1) * hdr["Fmax"])
+    )
+
+
+def _epoch_system(
+    darr: np.ndarray,
+    hdr: dict[T.Hashable, T.Any],
+    sk: str,
+    time: datetime,
+    sv: list[str],
+    useindicators: bool,
+) -> xarray.Dataset | None:
+    """
+    one system of one epoch as Dataset, None if no SV of this system at this time
+    """
+    import xarray
+
+    # satellite indices "si" to extract from this time's measurements
+    si = [i for i, s in enumerate(sv) if s[0] in sk]
+    if len(si) == 0:  # no SV of this system "sk" at this time
+        return None
+
+    # measurement indices "di" to extract at this time step
+    di = hdr["fields_ind"][sk]
+    garr = darr[si, :]
+    garr = garr[:, di]
+
+    gsv = np.array(sv)[si]
+
+    dsf: dict[str, tuple] = {}
+    for i, k in enumerate(hdr["fields"][sk]):
+        dsf[k] = (("time", "sv"), np.atleast_2d(garr[:, i * 3]))
+
+        if useindicators:
+            dsf = _indicators(dsf, k, garr[:, i * 3 + 1 : i * 3 + 3])
+
+    return xarray.Dataset(dsf, coords={"time": [time], "sv": gsv})
+
+
+def _meas_index(fields: dict[str, list[str]]) -> tuple[list[str], dict[str, np.ndarray]]:
+    """
+    table of all measurement codes in the file, and the index of each system's
+    measurements into that table
+    """
+    table = list(dict.fromkeys(k for f in fields.values() for k in f))
+
+    return table, {sk: np.array([table.index(k) for k in f], dtype=int) for sk, f in fields.items()}
+
+
+def _epoch_long(
+    buf: dict[str, list[np.ndarray]],
+    j: int,
+    raw: str,
+    hdr: dict[T.Hashable, T.Any],
+    sv: list[str],
+    svs: dict[str, int],
+    imeas: dict[str, np.ndarray],
+) -> int:
+    """
+    append one epoch (time step) to the long-format record buffers.
+    svs is the SV table, grown as new satellites appear.
+    """
+    darr = _epoch_array(raw, hdr)
+
+    N = 0
+    for sk in hdr["fields"]:
+        si = [i for i, s in enumerate(sv) if s[0] in sk]
+        if len(si) == 0:
+            continue
+
+        garr = darr[si, :][:, hdr["fields_ind"][sk]][:, : imeas[sk].size * 3]
+        isv = np.array([svs.setdefault(sv[i].replace(" ", "0"), len(svs)) for i in si], dtype=int)
+
+        N += long_append(buf, j, isv, imeas[sk], garr)
+
+    return N
+
+
 def _indicators(d: dict, k: str, arr: np.ndarray) -> dict[str, tuple]:
     """
-    handle LLI (loss of lock) and SSI (signal strength)
+    handle LLI (loss of lock) and SSI (signal strength), arr is (..., sv, 2)
     """
     if k.startswith(("L1", "L2")):
-        d[k + "lli"] = (("time", "sv"), np.atleast_2d(arr[:, 0]))
+        d[k + "lli"] = (("time", "sv"), np.atleast_2d(arr[..., 0]))
 
-    d[k + "ssi"] = (("time", "sv"), np.atleast_2d(arr[:, 1]))
+    d[k + "ssi"] = (("time", "sv"), np.atleast_2d(arr[..., 1]))
 
     return d
 
 
 def obsheader3(
-    f: T.TextIO, use: set[str] | None = None, meas: list[str] | None = None
+    f: T.TextIO | Path, use: set[str] | None = None, meas: list[str] | None = None
 ) -> dict[T.Hashable, T.Any]:
     """
     get RINEX 3 OBS types, for each system type
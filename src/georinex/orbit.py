@@ -0,0 +1,139 @@
+"""
+satellite ECEF position and velocity at any times, from broadcast ephemerides
+
+Keplerian ephemerides (GPS, Galileo, BeiDou, QZSS, IRNSS) are evaluated analytically.
+GLONASS state vectors are integrated by 4th order Runge-Kutta with the PZ-90 J2 field and
+the broadcast luni-solar acceleration, per GLONASS ICD A.3.1.2.
+SBAS state vectors have constant acceleration, for which RK4 is exact, so the polynomial is used.
+"""
+
+from __future__ import annotations
+import typing as T
+
+import numpy as np
+import xarray
+
+from .common import to_records
+from .ephemeris import ephemeris_index, select_ephemeris
+from . import keplerian
+from .keplerian import XYZ
+
+__all__ = ["propagate"]
+
+# PZ-90 constants, GLONASS ICD 2008 3.1.1
+GM_GLO = 398600.4418e9  # [m^3 s^-2]
+AE_GLO = 6378136.0  # [m] semi-major axis of Earth
+J2_GLO = 1082625.75e-9
+OMEGA_GLO = 7.292115e-5  # [rad s^-1]
+STEP = 60.0  # [s] maximum RK4 step
+
+
+def propagate(
+    nav: xarray.Dataset,
+    times: T.Any,
+    *,
+    healthy: bool = True,
+    fit_interval: bool = True,
+    tgd: bool = True,
+) -> xarray.Dataset:
+    """
+    ECEF position X, Y, Z [m], velocity dX, dY, dZ [m/s], clock bias ClockBias [s]
+    and drift ClockDrift [s/s] of all satellites of NAV at times.
+
+    Each (time, sv) uses the ephemeris picked by ephemeris.select_ephemeris(), NaN if none.
+    Times are in the time scale of each system's ephemerides, e.g. UTC for GLONASS.
+    Clock terms are as keplerian.keplerian2state(), tgd as there.
+
+    nav: NAV dataset, (time, sv) or layout="records"
+    times: 1-D array of datetime64 or datetime
+    """
+    rec = to_records(nav)
+    times = np.atleast_1d(np.asarray(times, dtype="datetime64[ns]"))
+    svs = rec.sv.values
+
+    i = select_ephemeris(
+        ephemeris_index(rec, healthy=healthy), times[:, None], svs, fit_interval=fit_interval
+    )
+    out = {k: np.full(i.shape, np.nan) for k in XYZ + ["ClockBias", "ClockDrift"]}
+
+    found = i >= 0
+    r = i[found]
+    t = np.broadcast_to(times[:, None], i.shape)[found]
+
+    sys = np.asarray([s[0] for s in svs], dtype="<U1")[rec.sv_index.values[r]]
+    prn = np.asarray([int(s[1:3]) for s in svs], dtype=int)[rec.sv_index.values[r]]
+    d = {
+        str(k): rec[k].values[r].astype(float)
+        for k in rec.data_vars
+        if rec[k].dims == ("record",) and k != "sv_index"
+    }
+
+    toc = rec.time.values[r]
+    ecef = keplerian._orbit(d, sys, prn, t, velocity=True, toc=toc, tgd=tgd)
+
+    # %% state vector ephemerides, from ToC
+    for s, f in (("R", _glonass), ("S", _sbas)):
+        j = sys == s
+        if not j.any():
+            continue
+        dt = (t[j] - toc[j]) / np.timedelta64(1, "s")
+        state = np.vstack([d[k][j] for k in XYZ])
+        acc = np.vstack([d[f"{k}2"][j] for k in XYZ[3:]])
+        for k, v in zip(XYZ, f(state, acc, dt)):
+            ecef[k][j] = v
+
+    for k, v in out.items():
+        v[found] = ecef[k]
+
+    return xarray.Dataset(
+        {k: (("time", "sv"), v) for k, v in out.items()},
+        coords={"time": times, "sv": svs},
+        attrs={"rinextype": "orbit"},
+    )
+
+
+def _glonass(state: np.ndarray, acc: np.ndarray, dt: np.ndarray) -> np.ndarray:
+    """
+    RK4 of all state vectors together, each over dt [s] in the same number of steps <= STEP
+
+    state: (6, N) X, Y, Z, dX, dY, dZ
+    acc: (3, N) broadcast luni-solar acceleration, constant over the fit interval
+    """
+    Nstep = max(1, int(np.ceil(np.abs(dt).max() / STEP)))
+    h = dt / Nstep
+
+    y = state.copy()
+    for _ in range(Nstep):
+        k1 = _glonass_rate(y, acc)
+        k2 = _glonass_rate(y + h / 2 * k1, acc)
+        k3 = _glonass_rate(y + h / 2 * k2, acc)
+        k4 = _glonass_rate(y + h * k3, acc)
+        y += h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+    return y
+
+
+def _glonass_rate(y: np.ndarray, acc: np.ndarray) -> np.ndarray:
+    """equations of motion in the rotating PZ-90 frame"""
+    x, yy, z, vx, vy, vz = y
+
+    r2 = x**2 + yy**2 + z**2
+    r = np.sqrt(r2)
+    mu = GM_GLO / (r2 * r)
+    j2 = 1.5 * J2_GLO * GM_GLO * AE_GLO**2 / (r2**2 * r)
+    z5 = 5 * z**2 / r2
+    w2 = OMEGA_GLO**2
+
+    ax = -mu * x - j2 * x * (1 - z5) + w2 * x + 2 * OMEGA_GLO * vy + acc[0]
+    ay = -mu * yy - j2 * yy * (1 - z5) + w2 * yy - 2 * OMEGA_GLO * vx + acc[1]
+    az = -mu * z - j2 * z * (3 - z5) + acc[2]
+
+    return np.stack((vx, vy, vz, ax, ay, az))
+
+
+def _sbas(state: np.ndarray, acc: np.ndarray, dt: np.ndarray) -> np.ndarray:
+    """SBAS: constant acceleration over dt [s]"""
+    pos = state[:3] + state[3:] * dt + acc * dt**2 / 2
+    vel = state[3:] + acc * dt
+
+    return np.vstack((pos, vel))
@@ -48,6 +48,15 @@ p.add_argument(
     help="do not use speculative preallocation (slow) let us know if this is needed",
     action="store_false",
 )
+p.add_argument(
+    "-fixed_point",
+    help="store observables losslessly as integer milli-units (smaller files)",
+    action="store_true",
+)
+p.add_argument(
+    "-scratch",
+    help="directory for temporary disk buffers, to convert RINEX 2 OBS files larger than RAM",
+)
 P = p.parse_args()
 
 gr.batch_convert(
@@ -60,4 +69,6 @@ gr.batch_convert(
     meas=P.meas,
     verbose=P.verbose,
     fast=P.strict,
+    fixed_point=P.fixed_point,
+    scratch=P.scratch,
 )
@@ -7,20 +7,41 @@ from pathlib import Path
 from contextlib import contextmanager
 import io
 import logging
+import importlib.util
 
-import xarray
+# previously converted data, opened lazily with Xarray
+STORES = (".nc", ".zarr")
 
-try:
-    from hatanaka import crx2rnx
-except ImportError:
-    logging.info("hatanaka crx2rnx not available")
-    crx2rnx = None
 
-try:
-    from ncompress import decompress as unlzw
-except ImportError:
-    logging.info("ncompress unlzw not available")
-    unlzw = None
+def store_engine(fn: Path) -> str | None:
+    """Xarray engine of a NetCDF4 file or Zarr store, checking Zarr is installed"""
+    if fn.suffix != ".zarr":
+        return None
+
+    if importlib.util.find_spec("zarr") is None:
+        raise ImportError(f"zarr is needed to read {fn}")
+
+    return "zarr"
+
+
+def crx2rnx(f: T.Any) -> str:
+    """Hatanaka decompression, importing hatanaka on first use"""
+    try:
+        from hatanaka import crx2rnx as _crx2rnx
+    except ImportError:
+        raise ImportError("hatanaka crx2rnx not available")
+
+    return _crx2rnx(f)
+
+
+def unlzw(b: bytes) -> bytes:
+    """LZW .Z decompression, importing ncompress on first use"""
+    try:
+        from ncompress import decompress
+    except ImportError:
+        raise ImportError("ncompress unlzw not available")
+
+    return decompress(b)
 
 
 @contextmanager
@@ -86,9 +107,6 @@ def opener(fn: T.TextIO | Path, header: bool = False) -> T.Iterator[T.TextIO]:
                         )
                         yield f
         elif suffix == ".z" or magic.startswith(b"\x1f\x9d"):
-            if unlzw is None:
-                raise ImportError("ncompress unlzw not available")
-
             with fn.open("rb") as zu:
                 with io.StringIO(unlzw(zu.read()).decode("ascii")) as f:
                     _, is_crinex = rinex_version(first_nonblank_line(f))
@@ -144,15 +162,22 @@ def rinexinfo(f: T.TextIO | Path) -> dict[T.Hashable, T.Any]:
     if isinstance(f, (str, Path)):
         fn = Path(f).expanduser()
 
-        if fn.suffix == ".nc":
-            attrs: dict[T.Hashable, T.Any] = {"rinextype": []}
+        if fn.suffix in STORES:
+            import xarray
+
+            engine = store_engine(fn)
+            attrs: dict[T.Hashable, T.Any] = {}
+            rinextype = []
             for g in ("OBS", "NAV"):
+                # only attributes are needed, don't decode coordinates
                 try:
-                    dat = xarray.open_dataset(fn, group=g)
-                    attrs["rinextype"].append(g.lower())
-                except OSError:
+                    dat = xarray.open_dataset(fn, group=g, decode_cf=False, engine=engine)
+                except (OSError, KeyError):
                     continue
                 attrs.update(dat.attrs)
+                rinextype.append(g.lower())
+            # all groups present
+            attrs["rinextype"] = rinextype
             return attrs
 
         with opener(fn, header=True) as f:
@@ -167,6 +192,10 @@ def rinexinfo(f: T.TextIO | Path) -> dict[T.Hashable, T.Any]:
             return {"version": line[1], "rinextype": "sp3"}
 
         version = rinex_version(line)[0]
+        # RINEX clock 3.04 moved the file type one column
+        if line[60:80] == "RINEX VERSION / TYPE" and line[20:22].strip() == "C":
+            return {"version": version, "filetype": "C", "rinextype": "clk"}
+
         file_type = line[20]
         if int(version) == 2:
             if file_type == "N":
@@ -10,8 +10,11 @@ import numpy as np
 import logging
 from pathlib import Path
 from datetime import datetime, timedelta
+import itertools
 
 from .rio import first_nonblank_line, opener
+from .common import decode_fields
+from .utils import _tlim
 
 # for NetCDF compression. too high slows down with little space savings.
 ENC = {"zlib": True, "complevel": 1, "fletcher32": True}
@@ -19,14 +22,95 @@ ENC = {"zlib": True, "complevel": 1, "fletcher32": True}
 __all__ = ["load_sp3"]
 
 
-def load_sp3(fn: Path, outfn: Path | None) -> xarray.Dataset:
+def load_sp3(
+    fn: Path | T.Sequence[Path],
+    outfn: Path | None,
+    use: set[str] | None = None,
+    tlim: tuple[datetime, datetime] | None = None,
+) -> xarray.Dataset:
     """
     The basic format is a position and clock record;
     a second, optional, record contains velocities and clock rates-of-change.
 
+    fn: SP3 file, or consecutive SP3 files stitched into one time-continuous dataset.
+        Files outside tlim by their header are not parsed, so to interpolate across midnight
+        give the neighbouring days with tlim e.g. an hour beyond the day.
+    use: systems and/or SVs e.g. {"E"} or {"G05", "G13"}. SP3-a satellite numbers are GPS.
+    tlim: epochs within [start, stop]; reading stops after stop
+
     http://epncb.oma.be/ftp/data/format/sp3_docu.txt  (sp3a)
     """
+    if isinstance(use, str):
+        use = {use}
+    tlim = _tlim(tlim)
+
+    if isinstance(fn, (str, Path)):
+        ds = _load(Path(fn).expanduser(), use, tlim)
+    else:
+        ds = _stitch(fn, use, tlim)
+
+    if outfn:
+        outfn = Path(outfn).expanduser()
+        enc = {k: ENC for k in ds.data_vars}
+        ds.to_netcdf(outfn, mode="w", encoding=enc, format="NETCDF4")
+
+    return ds
+
+
+def _stitch(
+    fns: T.Sequence[Path], use: set[str] | None, tlim: tuple[datetime, datetime] | None
+) -> xarray.Dataset:
+    """
+    one dataset of consecutive SP3 files on the union of their epochs and SVs.
+    Each file is read only until the first epoch of the next, which wins the shared epoch
+    unless its value is absent. Header Nepoch isn't reliable, so files are ordered by header start.
+    """
+    starts = []
+    for fn in fns:
+        fn = Path(fn).expanduser()
+        with opener(fn) as f:
+            ln = first_nonblank_line(f)
+        if ln[0] != "#":
+            raise ValueError(f"failed to read {fn} line 1")
+        starts.append((sp3dt(ln), fn))
+    starts.sort(key=lambda x: x[0])
+
+    dats = []
+    for i, (t0, fn) in enumerate(starts):
+        stop = starts[i + 1][0] if i + 1 < len(starts) else datetime.max
+        lim = (datetime.min, stop) if tlim is None else (tlim[0], min(tlim[1], stop))
+        if t0 > lim[1] or stop < lim[0]:
+            logging.info(f"{fn.name}: outside time limits, skipped")
+            continue
+        dats.append(_load(fn, use, lim))
+
+    if not dats:
+        raise ValueError("no SP3 data found in time limits")
+
+    times = np.unique(np.concatenate([d.time.values for d in dats]))
+    svs = list(dict.fromkeys(s for d in dats for s in d.sv.values))
+    isv = {s: i for i, s in enumerate(svs)}
+
+    ds = xarray.Dataset(coords={"time": times, "sv": svs, "ECEF": ["x", "y", "z"]})
+    for k, v in dats[0].data_vars.items():
+        if "sv" not in v.dims:
+            continue
+        a = np.full((times.size, len(svs)) + v.shape[2:], np.nan)
+        for d in dats:
+            it = np.searchsorted(times, d.time.values)[:, None]
+            js = np.array([isv[s] for s in d.sv.values], dtype=int)[None, :]
+            new = d[k].values
+            a[it, js] = np.where(np.isnan(new), a[it, js], new)
+        ds[k] = (v.dims, a)
+
+    ds["t0"] = dats[0]["t0"]
+    ds.attrs = dats[0].attrs
 
+    return ds
+
+
+def _load(fn: Path, use: set[str] | None, tlim: tuple[datetime, datetime] | None):
+    """one SP3 file"""
     dat: dict[T.Hashable, T.Any] = {}
 
     with opener(fn) as f:
@@ -60,78 +144,101 @@ def load_sp3(fn: Path, outfn: Path | None) -> xarray.Dataset:
         if not ln.startswith("*"):  # EOF
             raise ValueError(f"{fn} appears to be badly malformed")
         # the rest of the file is data, punctuated by epoch lines
-        ecefs = []
-        clocks = []
-        vels = []
-        ecef = np.empty((Nsv, 3))
-        clock = np.empty((Nsv, 2))
-        vel = np.empty((Nsv, 3))
-        i = 0
-
-        times = [sp3dt(ln)]
-
-        for ln in f:
-            if ln[0] == "*":
-                times.append(sp3dt(ln))
-                ecefs.append(ecef)
-                clocks.append(clock)
-                vels.append(vel)
-
-                ecef = np.empty((Nsv, 3))
-                clock = np.empty((Nsv, 2))  # clock and clock rate-of-change
-
-                vel = np.empty((Nsv, 3))
-                vel.fill(np.nan)  # may not always have velocity
-
-                i = 0
-                continue
-
-            if ln[0] == "P":
-                ecef[i, :] = (float(ln[4:18]), float(ln[18:32]), float(ln[32:46]))
-                clock[i, 0] = float(ln[46:60])
-                i += 1
-            elif ln[0] == "V":
-                vel[i - 1, :] = (float(ln[4:18]), float(ln[18:32]), float(ln[32:46]))
-                clock[i - 1, 1] = float(ln[46:60])
-            elif ln.startswith(("EP", "EV")):
-                # let us know if you want these data types
-                pass
-            elif len(ln) == 0:  # blank line
-                pass
-            elif len(ln) >= 4 and ln[3] == "*":  # sp3a no data
-                continue
-            elif ln.startswith("EOF"):
-                break
-            else:
-                logging.info(f"unknown data {ln}")
-
-    # assemble the last time step
-    ecefs.append(ecef)
-    clocks.append(clock)
-    vels.append(vel)
+        lines = _read_body(f, ln, tlim)
 
-    aclock = np.asarray(clocks)
+    if use:
+        keep = [s for s in svs if s in use or _system(s) in use]
+    else:
+        keep = svs
+    times, ecef, clock, vel, dclock = _body(lines, keep, svs)
 
     # assemble into final xarray.Dataset
-    ds = xarray.Dataset(coords={"time": times, "sv": svs, "ECEF": ["x", "y", "z"]})
-    ds["position"] = (("time", "sv", "ECEF"), ecefs)
-    ds["clock"] = (("time", "sv"), aclock[:, :, 0])
+    ds = xarray.Dataset(coords={"time": times, "sv": keep, "ECEF": ["x", "y", "z"]})
+    ds["position"] = (("time", "sv", "ECEF"), ecef)
+    ds["clock"] = (("time", "sv"), clock)
 
-    ds["velocity"] = (("time", "sv", "ECEF"), vels)
-    ds["dclock"] = (("time", "sv"), aclock[:, :, 1])
+    ds["velocity"] = (("time", "sv", "ECEF"), vel)
+    ds["dclock"] = (("time", "sv"), dclock)
 
     ds["t0"] = t0
 
     ds.attrs = dat
 
-    if outfn:
-        outfn = Path(outfn).expanduser()
-        enc = {k: ENC for k in ds.data_vars}
-        ds.to_netcdf(outfn, mode="w", encoding=enc, format="NETCDF4")
-
     return ds
 
 
+def _read_body(f: T.TextIO, ln: str, tlim: tuple[datetime, datetime] | None) -> list[str]:
+    """data lines from the first epoch line ln, only of epochs within tlim"""
+    if tlim is None:
+        return [ln] + f.read().splitlines()
+
+    lines = []
+    keep = False
+    for line in itertools.chain([ln], f):
+        if line.startswith("*"):
+            t = sp3dt(line)
+            if t > tlim[1]:
+                break
+            keep = t >= tlim[0]
+        if keep:
+            lines.append(line)
+
+    return lines
+
+
+def _body(
+    lines: list[str], svs: list[str], header_svs: list[str]
+) -> tuple[list[datetime], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    decode SP3 data lines in bulk, classified by their first character.
+    Records go to the epoch of the last preceding "*" line and the SV named in the record;
+    those never given, or without velocity, are NaN.
+    Records of header SVs not in svs are skipped undecoded.
+    """
+    kind = np.fromiter((ln[:1] for ln in lines), dtype="<U1", count=len(lines))
+
+    for i in np.flatnonzero(kind == "E"):
+        if lines[i].startswith("EOF"):
+            kind = kind[:i]
+            break
+    # EP, EV: let us know if you want these data types
+    # "   *" : sp3a no data
+    other = ~np.isin(kind, ["*", "P", "V", "E", "", " "])
+    for i in np.flatnonzero(other):
+        logging.info(f"unknown data {lines[i]}")
+
+    iepoch = np.flatnonzero(kind == "*")
+    times = [sp3dt(lines[i]) for i in iepoch]
+    epoch = np.cumsum(kind == "*") - 1
+
+    Nt = len(times)
+    ecef = np.full((Nt, len(svs), 3), np.nan)
+    clock = np.full((Nt, len(svs)), np.nan)
+    vel = np.full((Nt, len(svs), 3), np.nan)
+    dclock = np.full((Nt, len(svs)), np.nan)
+
+    table = np.asarray(svs, dtype=str)
+    order = np.argsort(table)
+    for k, xyz, c in (("P", ecef, clock), ("V", vel, dclock)):
+        i = np.flatnonzero(kind == k)
+        if i.size == 0:
+            continue
+
+        ids = np.char.replace(np.asarray([lines[n][1:4] for n in i], dtype=str), " ", "")
+        j = np.clip(np.searchsorted(table[order], ids), 0, table.size - 1)
+        known = table[order][j] == ids
+        for sv in np.setdiff1d(ids[~known], header_svs):
+            logging.info(f"{sv} is not in the SP3 header satellite list")
+
+        # X, Y, Z, clock: 4 fields of 14 characters from column 4
+        v = decode_fields([lines[n][4:60] for n in i[known]], 14, 4)
+        col = order[j[known]]
+        xyz[epoch[i[known]], col] = v[:, :3]
+        c[epoch[i[known]], col] = v[:, 3]
+
+    return times, ecef, clock, vel, dclock
+
+
 def sp3dt(ln: str) -> datetime:
     """
     some receivers such as ESA Swarm return seconds=60, so let's patch this.
@@ -171,6 +278,11 @@ def sp3dt(ln: str) -> datetime:
     return time
 
 
+def _system(sv: str) -> str:
+    """GNSS system letter of an SP3 satellite ID"""
+    return sv[0] if sv[:1].isalpha() else "G"
+
+
 def get_sv(ln: str, Nsv: int) -> list[str]:
     if ln[0] != "+":
         return []
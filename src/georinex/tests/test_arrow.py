@@ -0,0 +1,70 @@
+import pytest
+from pathlib import Path
+import numpy as np
+
+import georinex as gr
+
+R = Path(__file__).parent / "data"
+
+
+@pytest.mark.parametrize("fn", ["demo.10o", "demo3.10o"])
+def test_obs(fn):
+    pytest.importorskip("pyarrow")
+
+    obs = gr.load(R / fn, useindicators=True)
+    long = gr.load(R / fn, layout="long")
+
+    dense = gr.to_arrow(obs)
+    table = gr.to_arrow(long)
+
+    assert table.num_rows == long.record.size
+    assert dense.num_rows == table.num_rows
+    assert table.column("value").to_numpy() == pytest.approx(long.value.values)
+
+    assert table.column("sv").type.value_type == "string"
+    svs = table.column("sv").to_numpy()
+    systems = table.column("system").to_numpy()
+    assert all(s.startswith(y) for s, y in zip(svs, systems))
+
+    df = dense.to_pandas()
+    C1 = "C1C" if fn.startswith("demo3") else "C1"
+    G07 = df[(df.sv == "G07") & (df.meas == C1)]
+    assert G07.value.values == pytest.approx(obs[C1].sel(sv="G07").dropna("time").values)
+
+
+def test_nav():
+    pytest.importorskip("pyarrow")
+
+    nav = gr.load(R / "demo_nav3.17n")
+    table = gr.to_arrow(nav)
+
+    assert table.num_rows == nav["SVclockBias"].count().item()
+    assert set(nav.data_vars).issubset(table.column_names)
+
+
+def test_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    outdir = tmp_path / "demo.parquet"
+    obs = gr.load(R / "demo3.10o", out=outdir, layout="long")
+
+    assert (outdir / "station=demo" / "day=2010-03-05").is_dir()
+    systems = {d.name for d in (outdir / "station=demo" / "day=2010-03-05").iterdir()}
+    assert systems == {f"system={s}" for s in np.unique([s[0] for s in obs.sv.values])}
+
+    table = pq.read_table(outdir)
+    assert table.num_rows == obs.record.size
+
+
+def test_nav_records():
+    pytest.importorskip("pyarrow")
+
+    fn = R / "ELKO00USA_R_20182100000_01D_MN.rnx.gz"
+    rec = gr.load(fn, layout="records")
+    table = gr.to_arrow(rec)
+
+    assert table.num_rows == rec.record.size
+    assert "sv_index" not in table.column_names
+    assert table.column("M0").to_numpy() == pytest.approx(rec["M0"].values, nan_ok=True)
+    # dense NAV has SV copies for repeated times, records don't
+    assert set(table.column("sv").to_pylist()) == set(rec.sv.values)
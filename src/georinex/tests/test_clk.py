@@ -0,0 +1,50 @@
+from pytest import approx
+from pathlib import Path
+import numpy as np
+
+import georinex as gr
+
+R = Path(__file__).parent / "data"
+fn = R / "igs19362.clk"
+
+
+def test_clk():
+    assert gr.rinexinfo(fn)["rinextype"] == "clk"
+
+    dat = gr.load(fn)
+    assert dat.time.size == 4
+    assert dat.sv.values.tolist() == ["ALGO", "BRUX", "G01", "G02", "G03", "G04", "G05", "ZIMM"]
+
+    G03 = dat.sel(sv="G03")
+    assert G03["bias"].values == approx(-1.07415449e-4 + np.arange(4) * 9e-11)
+    assert G03["sigma"].values == approx([1.8e-11, 3.1e-11, 1.8e-11, 1.8e-11])
+    # ALGO is the reference clock, with no sigma
+    assert dat["sigma"].sel(sv="ALGO").isnull().all()
+    # ZIMM missing at one epoch
+    assert dat["bias"].sel(sv="ZIMM").isnull().sum() == 1
+
+
+def test_use_tlim(tmp_path):
+    tlim = ("2017-02-14T00:00:30", "2017-02-14T00:01:00")
+    dat = gr.load(fn, use={"G", "ALGO"}, tlim=tlim, out=tmp_path / "clk.nc")
+
+    assert dat.time.size == 2
+    assert dat.sv.values.tolist() == ["ALGO", "G01", "G02", "G03", "G04", "G05"]
+    ref = gr.load(fn).sel(time=slice(*tlim), sv=dat.sv)
+    assert dat["bias"].values == approx(ref["bias"].values)
+
+    assert (tmp_path / "clk.nc").is_file()
+
+
+def test_clk304(tmp_path):
+    """9 character station names"""
+    lines = fn.read_text().splitlines()
+    i = lines.index(next(ln for ln in lines if "END OF HEADER" in ln))
+    hdr = ["3.04" + " " * 17 + "C" + lines[0][22:]] + lines[1 : i + 1]
+    recs = [ln if ln[:1] == " " else ln[:7] + " " * 5 + ln[7:] for ln in lines[i + 1 :]]
+    f304 = tmp_path / "igs.clk"
+    f304.write_text("\n".join(hdr + recs) + "\n")
+
+    dat = gr.load(f304)
+    assert dat.attrs["version"] == approx(3.04)
+    assert dat["bias"].values == approx(gr.load(fn)["bias"].values, nan_ok=True)
@@ -3,7 +3,11 @@ Self-test file, registration case
 for OBS RINEX reader
 """
 
+import gc
+import pickle
+import tempfile
 import pytest
+import numpy as np
 import xarray
 from datetime import datetime
 from pytest import approx
@@ -109,3 +113,278 @@ def test_nc_load(dtype):
 
     obs = gr.load(R / f"demo.10{dtype[0].lower()}")
     assert obs.equals(truth)
+
+
+@pytest.mark.parametrize("fn", ["demo.10o", "demo3.10o"])
+def test_fixed_point(tmp_path, fn):
+    pytest.importorskip("netCDF4")
+
+    obs = gr.load(R / fn)
+
+    outfn = tmp_path / "fixed.nc"
+    fixed = gr.load(R / fn, out=outfn, fixed_point=True)
+
+    for k in obs.data_vars:
+        assert fixed[k].dtype == np.int64
+        good = obs[k].notnull().values
+        assert (fixed[k].values[good] == np.rint(obs[k].values[good] * 1000)).all()
+        assert (fixed[k].values[~good] == fixed[k].attrs["_FillValue"]).all()
+
+    raw = xarray.open_dataset(outfn, group="OBS", mask_and_scale=False)
+    for k in obs.data_vars:
+        assert (raw[k].values == fixed[k].values).all()
+
+    # exact by division, within 1 ulp by NetCDF4 scale_factor decoding
+    exact = gr.from_fixed_point(raw)
+    wobs = gr.load(outfn)
+    for k in obs.data_vars:
+        assert exact[k].dtype == np.float64
+        assert exact[k].equals(obs[k])
+        good = obs[k].notnull().values
+        assert np.isnan(wobs[k].values[~good]).all()
+        np.testing.assert_array_max_ulp(wobs[k].values[good], obs[k].values[good], maxulp=1)
+
+    # the input Dataset is left as is
+    from georinex.common import to_fixed_point
+
+    assert all(v.dtype == np.int64 for v in to_fixed_point(obs).data_vars.values())
+    assert all(v.dtype == np.float64 for v in obs.data_vars.values())
+
+
+@pytest.mark.parametrize(
+    "sel",
+    [
+        {"tlim": ("2018-01-14T00:01", "2018-01-14T00:03")},
+        {"interval": 35},
+        {"use": "R", "meas": ["C", "S1"]},
+        {"use": {"G", "E"}, "tlim": ("2018-01-14T00:01", "2018-01-14T00:05"), "interval": 30},
+    ],
+)
+def test_nc_select(tmp_path, sel):
+    pytest.importorskip("netCDF4")
+
+    fn = R / "ab430140.18o.zip"
+    outfn = tmp_path / "ab43.nc"
+    gr.load(fn, out=outfn, useindicators=True)
+
+    obs = gr.load(fn, useindicators=True, **sel)
+    nc = gr.load(outfn, **sel)
+
+    assert set(nc.data_vars) == set(obs.data_vars)
+    assert (nc.time == obs.time).all()
+    for k in obs.data_vars:
+        assert nc[k].dropna("sv", how="all").equals(obs[k].dropna("sv", how="all"))
+
+    long = gr.load(fn, layout="long", **sel)
+    outfn = tmp_path / "ab43long.nc"
+    gr.load(fn, out=outfn, layout="long")
+    nclong = gr.load(outfn, **sel)
+
+    assert nclong.record.size == long.record.size
+    for k in ("time", "sv", "meas"):
+        assert (nclong[k].values[nclong[f"{k}_index"].values] == long[k].values[long[f"{k}_index"].values]).all()
+    assert nclong.value.equals(long.value)
+
+
+def test_nc_chunks(tmp_path):
+    pytest.importorskip("netCDF4")
+    pytest.importorskip("dask")
+
+    outfn = tmp_path / "ab43.nc"
+    obs = gr.load(R / "ab430140.18o.zip", out=outfn)
+
+    nc = gr.load(outfn, chunks={"time": 2}, tlim=("2018-01-14T00:01", "2018-01-14T00:03"))
+    assert nc["L1"].chunks is not None
+
+    assert nc.load().equals(obs.sel(time=slice("2018-01-14T00:01", "2018-01-14T00:03")))
+
+
+def test_load_many(tmp_path):
+    pytest.importorskip("netCDF4")
+
+    fn = R / "ab430140.18o.zip"
+    obs = gr.load(fn)
+
+    t = obs.time.values
+    fa = tmp_path / "a.nc"
+    fb = tmp_path / "b.nc"
+    gr.load(fn, out=fa, tlim=(str(t[0]), str(t[4])))
+    gr.load(fn, out=fb, tlim=(str(t[4]), str(t[-1])))
+
+    many = gr.load_many([fb, fa])
+    assert many.load().equals(obs)
+
+    many = gr.load_many([fb, fa], tlim=(str(t[2]), str(t[6])), use="G")
+    assert many.load().equals(obs.sel(time=slice(t[2], t[6]), sv=obs.sv.str.startswith("G")))
+
+    # RINEX parsed in parallel, duplicate epochs are dropped
+    many = gr.load_many([fn, R / "demo.10o", fn], max_workers=2, use="G")
+    assert many.time.size == obs.time.size + 2
+    assert (np.diff(many.time.values) > np.timedelta64(0)).all()
+
+    many = gr.load_many([fn, R / "demo.10o"], tlim=("2010-03-05", "2010-03-06"))
+    assert many.equals(gr.load(R / "demo.10o"))
+
+
+def test_zarr(tmp_path):
+    pytest.importorskip("zarr")
+
+    fn = R / "ab430140.18o.zip"
+    obs = gr.load(fn)
+
+    t = obs.time.values
+    fa = tmp_path / "a.zarr"
+    fb = tmp_path / "b.zarr"
+    obs.sel(time=slice(t[0], t[4])).to_zarr(fa, group="OBS")
+    obs.sel(time=slice(t[4], t[-1])).to_zarr(fb, group="OBS")
+
+    assert gr.load(fa).load().equals(obs.sel(time=slice(t[0], t[4])))
+
+    many = gr.load_many([fb, fa], tlim=(str(t[2]), str(t[6])), use="G")
+    assert many.load().equals(obs.sel(time=slice(t[2], t[6]), sv=obs.sv.str.startswith("G")))
+
+
+def test_zarr_missing(tmp_path, monkeypatch):
+    monkeypatch.setattr("georinex.rio.importlib.util.find_spec", lambda name: None)
+
+    with pytest.raises(ImportError, match="zarr"):
+        gr.load(tmp_path / "a.zarr")
+
+
+@pytest.mark.parametrize(
+    "fn, sel",
+    [
+        ("ab430140.18o.zip", {"useindicators": True}),
+        ("ab430140.18o.zip", {"use": "R", "meas": ["C", "S1"], "interval": 35}),
+        ("P43300USA_R_20190012056_17M_15S_MO.crx", {"tlim": ("2019-01-01T21", "2019-01-01T21:05")}),
+        ("P43300USA_R_20190012056_17M_15S_MO.crx.bz2", {"use": "G"}),
+        ("demo3.10o", {"useindicators": True, "dtype_policy": "compact"}),
+    ],
+)
+def test_chunks(fn, sel):
+    pytest.importorskip("dask")
+
+    obs = gr.load(R / fn, **sel)
+    lazy = gr.load(R / fn, chunks={"time": 3}, **sel)
+
+    assert lazy.time.equals(obs.time)
+    assert lazy.sv.equals(obs.sv)
+    assert lazy.attrs["filename"] == obs.attrs["filename"]
+    assert set(obs.data_vars).issubset(lazy.data_vars)
+    assert lazy[next(iter(obs.data_vars))].data.numblocks[0] == -(-obs.time.size // 3)
+
+    lazy = lazy.compute()
+    for k in obs.data_vars:
+        assert lazy[k].dtype == obs[k].dtype
+        assert lazy[k].equals(obs[k])
+
+
+def test_chunks_text(tmp_path, monkeypatch):
+    """
+    chunks read their own epochs: a compressed file from a copy decompressed once, removed with
+    the last chunk referring to it. The task graph holds no RINEX text.
+    """
+    pytest.importorskip("dask.array")
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    fn = R / "ab430140.18o.zip"
+    lazy = gr.load(fn, chunks={"time": 3})
+    assert len(list(tmp_path.iterdir())) == 1
+    assert b"END OF HEADER" not in pickle.dumps(dict(lazy.__dask_graph__()))
+
+    L1 = lazy["L1"]
+    del lazy
+    gc.collect()
+    assert L1.compute().equals(gr.load(fn)["L1"])
+    del L1
+    gc.collect()
+    assert not list(tmp_path.iterdir())
+
+    # plain text is read from the file itself
+    lazy = gr.load(R / "demo.10o", chunks={"time": 1})
+    assert not list(tmp_path.iterdir())
+    assert lazy.compute().equals(gr.load(R / "demo.10o"))
+
+
+@pytest.mark.parametrize("fn", ["demo.10o", "demo3.10o"])
+def test_compact_dtype(fn):
+    obs = gr.load(R / fn, useindicators=True)
+    compact = gr.load(R / fn, useindicators=True, dtype_policy="compact")
+
+    assert set(obs.data_vars) == set(compact.data_vars)
+    assert (obs.sv == compact.sv).all()
+    assert (obs.time == compact.time).all()
+
+    for k in obs.data_vars:
+        if k.endswith(("lli", "ssi")):
+            assert compact[k].dtype == np.int8
+            good = obs[k].notnull().values
+            assert (compact[k].values[good] == obs[k].values[good]).all()
+            assert (compact[k].values[~good] == -1).all()
+        elif k.startswith(("S", "D")):
+            assert compact[k].dtype == np.float32
+            assert compact[k].values == approx(obs[k].values, nan_ok=True)
+        else:
+            assert compact[k].dtype == np.float64
+            assert compact[k].equals(obs[k])
+
+    with pytest.raises(ValueError):
+        gr.load(R / fn, dtype_policy="nonsense")
+
+
+@pytest.mark.parametrize("fn", ["demo.10o", "demo3.10o"])
+def test_split_systems(tmp_path, fn):
+    pytest.importorskip("netCDF4")
+
+    obs = gr.load(R / fn)
+    hdr = gr.rinexheader(R / fn)
+    outfn = tmp_path / "split.nc"
+    systems = gr.load(R / fn, out=outfn, split_systems=True)
+
+    assert isinstance(systems, dict)
+    assert set(systems) == {s[0] for s in obs.sv.values}
+
+    for sk, dat in systems.items():
+        assert all(s.startswith(sk) for s in dat.sv.values)
+
+        fields = hdr["fields"][sk] if isinstance(hdr["fields"], dict) else hdr["fields"]
+        assert set(dat.data_vars) == set(fields)
+        for k in dat.data_vars:
+            assert dat[k].equals(obs[k].sel(time=dat.time, sv=dat.sv))
+
+        assert dat.equals(xarray.open_dataset(outfn, group=f"OBS/{sk}"))
+
+    back = gr.load(outfn)
+    assert isinstance(back, dict)
+    assert back.keys() == systems.keys()
+    for sk, dat in systems.items():
+        assert back[sk].equals(dat)
+
+    assert list(gr.load(outfn, use={"G"})) == ["G"]
+
+
+@pytest.mark.parametrize("meas", [None, ["L1", "S1"]])
+@pytest.mark.parametrize("fn", ["demo.10o", "demo3.10o"])
+def test_long_layout(fn, meas):
+    obs = gr.load(R / fn, meas=meas, useindicators=True)
+    long = gr.load(R / fn, meas=meas, layout="long")
+
+    assert long.attrs["layout"] == "long"
+    assert (long.time == obs.time).all()
+
+    values = [k for k in obs.data_vars if not k.endswith(("lli", "ssi"))]
+    assert set(long.meas.values) == set(values)
+    assert long.record.size == sum(obs[k].count().item() for k in values)
+
+    t = long.time.values[long.time_index.values]
+    sv = long.sv.values[long.sv_index.values]
+    meas = long.meas.values[long.meas_index.values]
+    for k in values:
+        i = meas == k
+        dense = obs[k].sel(time=xarray.DataArray(t[i]), sv=xarray.DataArray(sv[i]))
+        assert (dense.values == long.value.values[i]).all()
+
+        if k + "ssi" in obs:
+            ssi = obs[k + "ssi"].sel(time=xarray.DataArray(t[i]), sv=xarray.DataArray(sv[i]))
+            good = ssi.notnull().values
+            assert (ssi.values[good] == long.ssi.values[i][good]).all()
@@ -0,0 +1,102 @@
+import pytest
+from pathlib import Path
+import numpy as np
+
+import georinex as gr
+
+R = Path(__file__).parent / "data"
+
+
+@pytest.fixture(scope="module")
+def nav():
+    return gr.load(R / "ELKO00USA_R_20182100000_01D_MN.rnx.gz", layout="records")
+
+
+def test_own_toe(nav):
+    G = [s for s in nav.sv.values if s[0] == "G"]
+    G13 = gr.nav_sv(nav, "G13")
+    i = gr.select_ephemeris(nav, G13.time.values, "G13")
+
+    assert (i >= 0).all()
+    assert nav["Toe"].values[i] == pytest.approx(G13["Toe"].values)
+
+    index = gr.ephemeris_index(nav)
+    t = np.datetime64("2018-07-29T12:10")
+    i = gr.select_ephemeris(index, [[t], [t + np.timedelta64(1, "h")]], G)
+    assert i.shape == (2, len(G))
+    found = i >= 0
+    assert found.any()
+    svs = nav.sv.values[nav.sv_index.values[i[found]]]
+    assert (svs == np.broadcast_to(G, i.shape)[found]).all()
+
+
+def test_nearest(nav):
+    G13 = gr.nav_sv(nav, "G13")
+    toc = G13.time.values
+    # just before the midpoint of two ephemerides
+    t = toc[0] + (toc[1] - toc[0]) // 2 - np.timedelta64(1, "s")
+    i = gr.select_ephemeris(nav, t, "G13")
+    assert nav.time.values[i] == toc[0]
+
+    i = gr.select_ephemeris(nav, t + np.timedelta64(2, "s"), "G13")
+    assert nav.time.values[i] == toc[1]
+
+
+def test_fit_interval(nav):
+    late = nav.time.values.max() + np.timedelta64(1, "D")
+
+    assert gr.select_ephemeris(nav, late, "G13") == -1
+    i = gr.select_ephemeris(nav, late, "G13", fit_interval=False)
+    assert nav.time.values[i] == gr.nav_sv(nav, "G13").time.values.max()
+
+    assert gr.select_ephemeris(nav, late, "G99") == -1
+    assert gr.select_ephemeris(nav, np.datetime64("NaT"), "G13") == -1
+
+
+def test_health(nav):
+    nav = nav.copy(deep=True)
+    G13 = gr.nav_sv(nav, "G13")
+    t = G13.time.values[1]
+    i = gr.select_ephemeris(nav, t, "G13")
+
+    nav["health"][i] = 1
+    j = gr.select_ephemeris(nav, t, "G13")
+    assert j not in (i, -1)
+    assert gr.select_ephemeris(gr.ephemeris_index(nav, healthy=False), t, "G13") == i
+
+
+def test_same_toe(nav):
+    """Galileo I/NAV and F/NAV with the same Toe: one is picked, the latest issue of data"""
+    E04 = gr.nav_sv(nav, "E04")
+    t = E04.time.values[0]
+    i = gr.select_ephemeris(nav, t, "E04")
+
+    same = E04.time.values == t
+    assert same.sum() == 2
+    assert nav["IODnav"].values[i] == E04["IODnav"].values[same].max()
+    assert i == int(nav.sv_offset.sel(sv="E04")) + np.flatnonzero(same)[-1]
+
+
+def test_glonass(nav):
+    R01 = gr.nav_sv(nav, "R01")
+    t = R01.time.values[2] + np.timedelta64(5, "m")
+    i = gr.select_ephemeris(nav, t, "R01")
+    assert nav.time.values[i] == R01.time.values[2]
+
+    # outside the 30 minute GLONASS fit interval
+    assert gr.select_ephemeris(nav, R01.time.values[-1] + np.timedelta64(20, "m"), "R01") == -1
+
+
+def test_dense():
+    """dense NAV is indexed as its records"""
+    dense = gr.load(R / "demo_nav3.17n")
+    rec = gr.load(R / "demo_nav3.17n", layout="records")
+
+    index = gr.ephemeris_index(dense)
+    assert index["record"].size > 0
+    for k, v in gr.ephemeris_index(rec).items():
+        assert (index[k] == v).all()
+
+    svs = rec.sv.values
+    times = rec.time.values[:, None]
+    assert (gr.select_ephemeris(dense, times, svs) == gr.select_ephemeris(rec, times, svs)).all()
@@ -0,0 +1,66 @@
+"""
+"import georinex" must stay light, submodules are loaded on first use
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import georinex as gr
+
+HEAVY = ("xarray", "pandas", "numpy", "dateutil", "hatanaka", "ncompress")
+OPTIONAL = ("dask", "georinex.arrow", "georinex.chunked", "georinex.dryrun", "georinex.netcdf")
+
+
+def test_lazy_import():
+    code = (
+        "import sys, georinex; "
+        f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    )
+    ret = subprocess.check_output([sys.executable, "-c", code], text=True)
+
+    assert ret.strip() == "", f"import georinex pulled in {ret}"
+
+
+def test_load_import():
+    """
+    readers load only what the file needs: Parquet, Dask, NetCDF4 and the dry run on use.
+    Xarray itself may import Dask once data are combined, so that is checked before reading.
+    """
+    code = (
+        "import sys, georinex; georinex.load; "
+        f"print(','.join(m for m in {OPTIONAL!r} if m in sys.modules)); "
+        "georinex.load(sys.argv[1]); "
+        f"print(','.join(m for m in {OPTIONAL[1:]!r} if m in sys.modules))"
+    )
+    fn = str(Path(__file__).parent / "data/demo.10o")
+    ret = subprocess.check_output([sys.executable, "-c", code, fn], text=True)
+
+    assert ret.split() == [], f"georinex.load pulled in {ret}"
+
+
+def test_gettime_import():
+    """scanning times of a file doesn't need Xarray or Pandas"""
+    code = (
+        "import sys, georinex; georinex.gettime(sys.argv[1]); "
+        f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    )
+    fn = str(Path(__file__).parent / "data/demo3.10o")
+    ret = subprocess.check_output([sys.executable, "-c", code, fn], text=True)
+
+    assert not {"xarray", "pandas"} & set(ret.strip().split(",")), f"gettime pulled in {ret}"
+
+
+def test_api():
+    assert set(gr.__all__) == set(gr._API)
+
+    for name in gr.__all__:
+        assert callable(getattr(gr, name))
+        assert name in dir(gr)
+
+    assert gr.plan.__module__ == "georinex.dryrun"
+
+    with pytest.raises(AttributeError):
+        gr.nonexistent_function
@@ -8,6 +8,10 @@ from pytest import approx
 import georinex as gr
 from datetime import datetime, timedelta
 import numpy as np
+import timeit
+from pathlib import Path
+
+R = Path(__file__).parent / "data"
 
 
 @pytest.fixture()
@@ -60,4 +64,119 @@ def test_kepler(kep_data):
     assert z == approx(zref, rel=1e-4)
 
     magerr = np.sqrt((x - xref) ** 2 + (y - yref) ** 2 + (z - zref) ** 2)
-    print("error magnitude [meters]", magerr)
+    # Newton-Raphson solution of Kepler's equation, was 160 m with a single fixed-point step
+    assert magerr < 10
+
+
+def test_all_systems():
+    """one call for the whole multi-GNSS (time, sv) dataset and for records"""
+    fn = R / "VILL00ESP_R_20181700000_01D_MN.rnx.gz"
+    nav = gr.load(fn)
+
+    X, Y, Z = gr.keplerian2ecef(nav)
+    assert X.shape == (nav.time.size, nav.sv.size)
+    r = np.sqrt(X**2 + Y**2 + Z**2)
+
+    sys = np.array([s[0] for s in nav.sv.values])
+    # orbit radius [Mm], Galileo E14, E18 are in eccentric orbits
+    for s, lo, hi in (("G", 25.5, 27.5), ("E", 23, 32), ("C", 27.5, 42.5), ("R", 25, 26)):
+        v = r[:, sys == s]
+        ok = ~np.isnan(v)
+        assert ok.sum() == nav["SVclockBias"][:, sys == s].count()
+        assert (v[ok] > lo * 1e6).all() and (v[ok] < hi * 1e6).all()
+
+    # BeiDou GEO C05 is over 58.75E
+    C05 = list(nav.sv.values).index("C05")
+    ok = ~np.isnan(X[:, C05])
+    assert np.degrees(np.arctan2(Y[ok, C05], X[ok, C05])) == approx(58.75, abs=0.5)
+    assert np.degrees(np.arcsin(Z[ok, C05] / r[ok, C05])) == approx(0, abs=3)
+
+    rec = gr.load(fn, layout="records")
+    x, y, z = gr.keplerian2ecef(rec)
+    i = int(rec.sv_offset.sel(sv="G13"))
+    G13 = list(nav.sv.values).index("G13")
+    assert x[i : i + int(rec.sv_count.sel(sv="G13"))] == approx(X[~np.isnan(X[:, G13]), G13])
+
+
+def test_state():
+    """position, velocity and clock in one pass"""
+    nav = gr.load(R / "VILL00ESP_R_20181700000_01D_MN.rnx.gz", layout="records")
+
+    state = gr.keplerian2state(nav)
+    assert np.vstack([state[k] for k in "XYZ"]) == approx(np.vstack(gr.keplerian2ecef(nav)))
+    assert set(state) == {"X", "Y", "Z", "dX", "dY", "dZ", "ClockBias", "ClockDrift"}
+
+    # at ToC: a0 + F e sqrt(A) sin(Ek) - TGD
+    G05 = gr.nav_sv(nav, "G05")
+    G = gr.keplerian2state(G05)
+    A = G05["sqrtA"].values ** 2
+    n = np.sqrt(3.986004418e14 / A**3) + G05["DeltaN"].values
+    sow = (G05.time.values - np.datetime64("1980-01-06")) / np.timedelta64(1, "s") % 604800
+    e = G05["Eccentricity"].values
+    Ek = gr.solve_kepler(G05["M0"].values + n * (sow - G05["Toe"].values), e)
+    dtr = -4.442807633e-10 * e * G05["sqrtA"].values * np.sin(Ek)
+    assert G["ClockBias"] == approx(G05["SVclockBias"].values + dtr - G05["TGD"].values)
+    no_tgd = gr.keplerian2state(G05, tgd=False)["ClockBias"]
+    assert no_tgd == approx(G05["SVclockBias"].values + dtr)
+
+    # GLONASS -TauN, GammaN
+    R01 = gr.nav_sv(nav, "R01")
+    G = gr.keplerian2state(R01)
+    assert G["ClockBias"] == approx(R01["SVclockBias"].values)
+    assert G["ClockDrift"] == approx(R01["SVrelFreqBias"].values)
+    assert G["dX"] == approx(R01["dX"].values)
+
+
+def test_galileo_week():
+    """Galileo week of RINEX NAV is aligned with GPS week"""
+    nav = gr.load(R / "galileo3.15n")
+    E = nav.sel(sv=nav.sv.values[0]).dropna(dim="time", how="all").drop_vars("sv")
+    G = E.rename({"GALWeek": "GPSWeek"})
+    E.attrs["svtype"] = ["E"]
+    G.attrs["svtype"] = ["G"]
+
+    assert np.vstack(gr.keplerian2ecef(E)) == approx(np.vstack(gr.keplerian2ecef(G)))
+
+
+def test_solve_kepler():
+    rng = np.random.default_rng(0)
+    M = rng.uniform(-np.pi, np.pi, 10000)
+    e = rng.uniform(0, 0.9, M.size)
+
+    E = gr.solve_kepler(M, e)
+    assert E - e * np.sin(E) - M == approx(0, abs=1e-12)
+
+    # single fixed-point step is off by about e**2 for GPS-like orbits
+    e = 0.02
+    one = M + e * np.sin(M)
+    E = gr.solve_kepler(M, e)
+    assert np.abs(one - E).max() > 1e-4
+    assert np.abs(E - e * np.sin(E) - M).max() < 1e-14
+
+    E = gr.solve_kepler([np.nan, 1.0], 0.01)
+    assert np.isnan(E[0]) and not np.isnan(E[1])
+
+
+def test_solve_kepler_many():
+    """10**6 ephemeris evaluations in one vectorized call"""
+    rng = np.random.default_rng(1)
+    M = rng.uniform(-np.pi, np.pi, 10**6)
+    e = rng.uniform(0, 0.03, M.size)
+
+    E = gr.solve_kepler(M, e)
+
+    assert E - e * np.sin(E) - M == approx(0, abs=1e-12)
+
+
+def test_solve_kepler_benchmark(capsys, record_property):
+    """report throughput of 10**6 Kepler solves; timing varies by machine, so no assert"""
+    rng = np.random.default_rng(2)
+    M = rng.uniform(-np.pi, np.pi, 10**6)
+    e = rng.uniform(0, 0.03, M.size)
+
+    gr.solve_kepler(M[:1000], e[:1000])
+    best = min(timeit.repeat(lambda: gr.solve_kepler(M, e), number=1, repeat=3))
+
+    record_property("solve_kepler_per_second", M.size / best)
+    with capsys.disabled():
+        print(f"\nsolve_kepler: {M.size / best:.3g} solves/s ({best * 1e3:.1f} ms for {M.size})")
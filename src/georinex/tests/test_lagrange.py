@@ -0,0 +1,72 @@
+import pytest
+from pathlib import Path
+import numpy as np
+
+import georinex as gr
+
+R = Path(__file__).parent / "data"
+S = np.timedelta64(1, "s")
+
+
+@pytest.fixture(scope="module")
+def sp3():
+    return gr.load(R / "igs19362.sp3c")
+
+
+def test_nodes(sp3):
+    orb = gr.interpolate_sp3(sp3, sp3.time.values[:, None], sp3.sv.values)
+
+    assert orb["position"].shape == sp3["position"].shape
+    assert orb["position"] == pytest.approx(sp3["position"].values, abs=1e-9)
+    ok = sp3["clock"].values < 999999
+    assert orb["clock"][ok] == pytest.approx(sp3["clock"].values[ok], abs=1e-9)
+    assert np.isnan(orb["clock"][~ok]).all()
+
+
+def test_interpolate(sp3):
+    """every other epoch, at the epochs left out"""
+    half = sp3.isel(time=slice(0, None, 2))
+    t = sp3.time.values[1:-1:2]
+    orb = gr.interpolate_sp3(half, t[:, None], sp3.sv.values)
+
+    err = np.linalg.norm(orb["position"] - sp3["position"].values[1:-1:2], axis=-1)
+    # [km] at 30 minute spacing
+    assert np.median(err) < 1e-4
+    assert err[5:-5].max() < 1e-3
+
+
+def test_velocity(sp3):
+    w = gr.lagrange_windows(sp3, order=8)
+    t = sp3.time.values[20] + np.array([-1, 0, 1]) * S
+    orb = gr.interpolate_sp3(w, t[:, None], sp3.sv.values, velocity=True)
+
+    # [dm/s]
+    fd = (orb["position"][2] - orb["position"][0]) / 2 * 1e4
+    assert fd == pytest.approx(orb["velocity"][1], abs=1e-3)
+    fd = (orb["clock"][2] - orb["clock"][0]) / 2 * 1e4
+    assert fd == pytest.approx(orb["dclock"][1], abs=1e-2, nan_ok=True)
+
+
+def test_gap(sp3):
+    gap = sp3.copy(deep=True)
+    gap["position"][48, 0] = np.nan
+    t = sp3.time.values[46] + 60 * S
+    G01 = gap.sv.values[0]
+
+    orb = gr.interpolate_sp3(gap, [t, t + 60 * S], [[G01], ["G02"]])
+    ref = gr.interpolate_sp3(sp3, [t, t + 60 * S], [[G01], ["G02"]])
+    # window shifted away from the gap
+    assert orb["position"][0] == pytest.approx(ref["position"][0], abs=1e-3)
+    assert orb["position"][1] == pytest.approx(ref["position"][1], abs=1e-12)
+
+
+def test_outside(sp3):
+    t = sp3.time.values
+    orb = gr.interpolate_sp3(sp3, [t[0] - S, t[-1], t[-1] + S], "G05")
+    assert np.isnan(orb["position"][[0, 2]]).all()
+    assert np.isfinite(orb["position"][1]).all()
+
+    assert np.isnan(gr.interpolate_sp3(sp3, t[10], "X01")["position"]).all()
+
+    with pytest.raises(ValueError):
+        gr.lagrange_windows(sp3.isel(time=slice(0, 5)))
@@ -1,3 +1,4 @@
+import io
 import pytest
 from pytest import approx
 import xarray
@@ -207,3 +208,46 @@ def test_ionospheric_correction():
             -0.5243e06,
         ]
     )
+
+
+def test_duplicate_time(caplog):
+    """an SV with repeated times is skipped, other SVs are kept"""
+    txt = (R / "minimal2.10n").read_text()
+    hdr, rec = txt.split("END OF HEADER\n")
+    rec = rec.rstrip("\n") + "\n"
+    txt = hdr + "END OF HEADER\n" + rec + rec + rec.replace(" 6 99", " 7 99", 1)
+
+    nav = gr.load(io.StringIO(txt))
+
+    assert list(nav.sv.values) == ["G06", "G07"]
+    assert np.isnan(nav["SVclockBias"].sel(sv="G06")).all()
+    assert nav["SVclockBias"].sel(sv="G07").item() == approx(-0.839701388031e-03)
+    assert "skipping SV G06" in caplog.text
+
+
+def test_malformed(caplog):
+    """a record with a malformed number is NaN, with a warning"""
+    txt = (R / "minimal2.10n").read_text()
+    hdr, rec = txt.split("END OF HEADER\n")
+    rec = rec.rstrip("\n") + "\n"
+    bad = rec.replace(" 6 99", " 7 99", 1).replace("D+02", "Q+02", 1)
+    txt = hdr + "END OF HEADER\n" + rec + bad
+
+    nav = gr.load(io.StringIO(txt))
+
+    assert nav["SVclockBias"].sel(sv="G06").item() == approx(-0.839701388031e-03)
+    assert np.isnan(nav["SVclockBias"].sel(sv="G07")).all()
+    assert any(r.levelname == "WARNING" and "malformed" in r.message for r in caplog.records)
+
+
+def test_records():
+    fn = R / "ab422100.18n"
+    nav = gr.load(fn)
+    rec = gr.load(fn, layout="records")
+
+    assert rec.record.size == nav["SVclockBias"].count().item()
+    G13 = gr.nav_sv(rec, "G13")
+    assert G13["M0"].values == approx(nav["M0"].sel(sv="G13").dropna(dim="time").values)
+
+    with pytest.raises(ValueError):
+        gr.load(fn, layout="long")
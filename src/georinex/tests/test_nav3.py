@@ -2,6 +2,7 @@ from pathlib import Path
 import pytest
 from pytest import approx
 import xarray
+import numpy as np
 from datetime import datetime
 import georinex as gr
 
@@ -278,3 +279,51 @@ def test_missing_fields_end_of_line():
     """
     nav = gr.load(R / "BRDM00DLR_R_20130010000_01D_MN.rnx", use='J', verbose=True)
     assert nav.to_dataframe()["FitIntvl"].to_list() == [0.,0.]
+
+
+def test_decode_fields():
+    from georinex.common import decode_fields
+
+    raws = [
+        " 1.000000000000D+00-2.500000000000D-01" + " " * 19,
+        "             bad   " + " 3.000000000000E+00",
+        "",
+    ]
+    v = decode_fields(raws, 19, [3, 2, 1], blank=0)
+
+    assert v[0] == approx([1.0, -0.25, 0.0])
+    assert np.isnan(v[1]).all()
+    assert v[2, 0] == 0
+    assert np.isnan(v[2, 1:]).all()
+
+
+def test_records(tmp_path):
+    fn = R / "ELKO00USA_R_20182100000_01D_MN.rnx.gz"
+    nav = gr.load(fn)
+    rec = gr.load(fn, layout="records")
+
+    assert rec.attrs["layout"] == "records"
+    assert rec.record.size == nav["SVclockBias"].count().item()
+    assert rec.nbytes * 10 < nav.nbytes
+    # no SV copies, repeated times are separate records
+    assert set(rec.sv.values) == {s for s in nav.sv.values if "_" not in s}
+
+    E04 = gr.nav_sv(rec, "E04")
+    assert (E04.sv_index == list(rec.sv.values).index("E04")).all()
+    dense = [nav.sel(sv=s).dropna(dim="time", how="all") for s in ("E04", "E04_1")]
+    assert sorted(E04["TransTime"].values) == approx(
+        sorted(np.hstack([d["TransTime"].values for d in dense]))
+    )
+    R01 = gr.nav_sv(rec, "R01")
+    assert R01["X"].values == approx(nav["X"].sel(sv="R01").dropna(dim="time").values)
+
+    pytest.importorskip("netCDF4")
+    outfn = tmp_path / "records.nc"
+    rec.to_netcdf(outfn, group="NAV")
+    sel = gr.load(outfn, use={"E"}, tlim=(datetime(2018, 7, 29, 1), datetime(2018, 7, 29, 3)))
+    assert set(sel.sv.values) == {s for s in rec.sv.values if s[0] == "E"}
+    assert sel.record.size == 98
+    assert sel.sv_count.sum() == sel.record.size
+    E03 = gr.nav_sv(sel, "E03")
+    assert (E03.sv_index == list(sel.sv.values).index("E03")).all()
+    assert (E03.time >= np.datetime64("2018-07-29T01")).all()
@@ -1,4 +1,6 @@
 import pytest
+import io
+import numpy as np
 import xarray
 from pytest import approx
 from pathlib import Path
@@ -190,6 +192,16 @@ def test_one_sv():
     assert obs.fast_processing
 
 
+def test_time_skip():
+    """observation lines are skipped by count, even if they look like an epoch line"""
+    txt = (R / "rinex2onesat.10o").read_text()
+    txt = txt.replace("        42.000          40.000", " 10  3  5  0  0 15.0000000  0  1G13")
+
+    times = gr.to_datetime(gr.gettime(io.StringIO(txt)))
+
+    assert (times == [datetime(2010, 3, 5, 0, 0), datetime(2010, 3, 5, 0, 0, 30)]).all()
+
+
 @pytest.mark.parametrize("use", (None, {"G", "R", "S"}))
 def test_all_systems(tmp_path, use):
     """
@@ -292,3 +304,24 @@ def test_wrong_header_count():
     S2 = obs["S2"].dropna(dim="sv", how="all")
 
     assert S2.sel(sv="G31").item() == approx(63.0)
+
+
+@pytest.mark.parametrize("fn", ["demo.10o", "ab430140.18o.zip"])
+@pytest.mark.parametrize("sel", [{}, {"useindicators": True, "dtype_policy": "compact"}])
+def test_scratch(tmp_path, fn, sel):
+    obs = gr.load(R / fn, **sel)
+    spill = gr.load(R / fn, scratch=tmp_path, **sel)
+
+    assert spill.equals(obs)
+    for k in spill.data_vars:
+        assert isinstance(spill[k].values.base, np.memmap)
+
+    # only the output buffers are left in scratch
+    assert {f.suffix for f in tmp_path.iterdir()} == {".dat"}
+    assert len(list(tmp_path.iterdir())) == len(spill.data_vars)
+
+    systems = gr.load(R / fn, scratch=tmp_path, split_systems=True, **sel)
+    truth = gr.load(R / fn, split_systems=True, **sel)
+    assert systems.keys() == truth.keys()
+    for sk in truth:
+        assert systems[sk].equals(truth[sk])
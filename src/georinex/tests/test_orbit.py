@@ -0,0 +1,77 @@
+import pytest
+from pathlib import Path
+import numpy as np
+
+import georinex as gr
+from georinex import orbit
+
+R = Path(__file__).parent / "data"
+S = np.timedelta64(1, "s")
+
+
+@pytest.fixture(scope="module")
+def nav():
+    return gr.load(R / "VILL00ESP_R_20181700000_01D_MN.rnx.gz", layout="records")
+
+
+def test_keplerian(nav):
+    E11 = gr.nav_sv(nav, "E11")
+    o = gr.propagate(nav, E11.time.values)
+
+    assert o.X.dims == ("time", "sv")
+    assert o.X.sel(sv="E11").values == pytest.approx(gr.keplerian2ecef(E11)[0])
+
+
+@pytest.mark.parametrize("sv", ["E11", "C06", "R01"])
+def test_velocity(nav, sv):
+    t = gr.nav_sv(nav, sv).time.values[0] + np.array([59, 60, 61]) * S
+    o = gr.propagate(nav, t).sel(sv=sv)
+
+    for k in "XYZ":
+        assert (o[k][2] - o[k][0]).item() / 2 == pytest.approx(o[f"d{k}"][1].item(), abs=1e-4)
+
+    drift = (o.ClockBias[2] - o.ClockBias[0]).item() / 2
+    assert drift == pytest.approx(o.ClockDrift[1].item(), rel=1e-6, abs=1e-18)
+
+
+def test_glonass(nav):
+    """integrating consecutive ephemerides forward and back to their midpoint"""
+    R01 = gr.nav_sv(nav, "R01")
+    state = np.vstack([R01[k].values for k in orbit.XYZ])
+    acc = np.vstack([R01[f"{k}2"].values for k in orbit.XYZ[3:]])
+    ok = np.diff(R01.time.values) == 1800 * S
+    assert ok.any()
+
+    fw = orbit._glonass(state[:, :-1], acc[:, :-1], np.full(ok.size, 900.0))
+    bw = orbit._glonass(state[:, 1:], acc[:, 1:], np.full(ok.size, -900.0))
+
+    assert np.abs(fw[:3] - bw[:3])[:, ok].max() < 10
+    assert np.abs(fw[3:] - bw[3:])[:, ok].max() < 0.01
+
+
+def test_sbas(nav):
+    S20 = gr.nav_sv(nav, "S20")
+    t = S20.time.values[:2] + 10 * S
+    # S20 broadcasts health 63
+    assert np.isnan(gr.propagate(nav, t).X.sel(sv="S20")).all()
+
+    o = gr.propagate(nav, t, healthy=False).sel(sv="S20")
+    assert o.X.values == pytest.approx(S20.X.values[:2] + 10 * S20.dX.values[:2])
+
+
+def test_no_ephemeris(nav):
+    o = gr.propagate(nav, np.datetime64("2000-01-01"))
+
+    assert o.X.shape == (1, nav.sv.size)
+    assert np.isnan(o.X).all()
+
+
+def test_dense():
+    fn = R / "ELKO00USA_R_20182100000_01D_MN.rnx.gz"
+    t = np.datetime64("2018-07-29T12:00") + np.arange(0, 3600, 600) * S
+
+    rec = gr.propagate(gr.load(fn, layout="records"), t)
+    dense = gr.propagate(gr.load(fn), t)
+
+    assert np.isfinite(rec.X).any()
+    assert rec.X.values == pytest.approx(dense.X.values, nan_ok=True)
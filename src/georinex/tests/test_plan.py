@@ -0,0 +1,93 @@
+import gc
+import tempfile
+import pytest
+from pathlib import Path
+import xarray
+
+import georinex as gr
+from georinex import dryrun
+
+R = Path(__file__).parent / "data"
+
+
+@pytest.mark.parametrize("fn", ["demo.10o", "demo3.10o", "ab430140.18o.zip"])
+def test_plan(fn):
+    obs = gr.load(R / fn)
+    p = gr.plan(R / fn, max_memory="1 GB")
+
+    assert p["max_memory"] == 1_000_000_000
+    assert p["strategy"] == "dense"
+    assert p["epochs"] == obs.time.size
+    assert p["satellites"] == obs.sv.size
+    assert set(obs.data_vars).issubset(p["observables"])
+    assert sum(p["systems"].values()) == p["satellites"]
+    assert p["bytes"]["dense"] >= obs.nbytes - obs.time.nbytes - obs.sv.nbytes
+    assert p["parse_seconds"] > 0
+    # ZIP is decompressed in RAM
+    assert (p["resident_bytes"] > 0) == fn.endswith(".zip")
+
+    p = gr.plan(R / fn, use="G", tlim=("2010-03-05T00:00:30", "2019-01-01"))
+    assert set(p["systems"]) == {"G"}
+    assert p["epochs"] == obs.time.sel(time=slice("2010-03-05T00:00:30", "2019-01-01")).size
+
+
+def test_max_memory(monkeypatch):
+    fn = R / "ab430140.18o.zip"
+    p = gr.plan(fn)
+
+    split = p["peak_bytes"]["split_systems"]
+    assert split < p["peak_bytes"]["dense"]
+
+    # splitting by system would change the return type, so it is only suggested
+    monkeypatch.setattr(dryrun.importlib.util, "find_spec", lambda name: None)
+    assert gr.plan(fn, max_memory=split)["strategy"] is None
+    with pytest.raises(RuntimeError, match="split_systems=True"):
+        gr.load(fn, max_memory=split)
+
+    with pytest.raises(RuntimeError):
+        gr.load(fn, max_memory=16)
+
+    with pytest.raises(ValueError):
+        gr.plan(fn, max_memory="4 parsecs")
+
+
+def test_max_memory_scratch(monkeypatch, tmp_path):
+    fn = R / "ab430140.18o.zip"
+    obs = gr.load(fn)
+    p = gr.plan(fn)
+    budget = p["peak_bytes"]["dense"] // 2
+
+    monkeypatch.setattr(dryrun.importlib.util, "find_spec", lambda name: None)
+    # as for a file of many more epochs than one block of page buffers
+    monkeypatch.setattr(dryrun, "SPILL_ROWS", 1)
+    assert gr.plan(fn, max_memory=budget)["strategy"] == "scratch"
+
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    spill = gr.load(fn, max_memory=budget)
+    assert isinstance(spill, xarray.Dataset)
+    assert spill["L1"].equals(obs["L1"])
+
+    # the np.memmap buffers are removed with the Dataset
+    assert list(tmp_path.iterdir())
+    del spill
+    gc.collect()
+    assert not list(tmp_path.iterdir())
+
+
+def test_max_memory_chunks():
+    pytest.importorskip("dask")
+
+    fn = R / "ab430140.18o.zip"
+    obs = gr.load(fn)
+    p = gr.plan(fn)
+    budget = p["peak_bytes"]["dense"] // 2
+
+    q = gr.plan(fn, max_memory=budget)
+    assert q["strategy"] == "chunks"
+    assert 1 <= q["chunks"]["time"] < p["epochs"]
+    # the scan holds the decompressed text, then each chunk its text and data
+    assert p["resident_bytes"] <= q["peak_bytes"]["chunks"] <= budget
+
+    lazy = gr.load(fn, max_memory=budget)
+    assert lazy["L1"].chunks is not None
+    assert lazy.compute()["L1"].equals(obs["L1"])
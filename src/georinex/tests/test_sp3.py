@@ -82,3 +82,74 @@ def test_minimal_sp3d():
 #     G20 = d0.sel(sv="G20")
 
 #     assert np.isnan(G20.clock.item())
+
+
+def test_sp3a_missing():
+    """records go to the SV they name, SVs without a record are NaN"""
+    dat = gr.load(R / "example2.sp3a")
+    d0 = dat.isel(time=0)
+
+    assert d0["position"].sel(sv="31").data == approx([6265.2558, -25687.98695, -753.359])
+    assert d0["position"].sel(sv="6").isnull().all()
+    assert d0["dclock"].sel(sv="1").item() == approx(-0.024236)
+
+    dat = gr.load(R / "igs19362.sp3c")
+    assert dat["velocity"].isnull().all()
+    assert dat["dclock"].isnull().all()
+
+
+def test_use_tlim():
+    fn = R / "minimal.sp3d"
+    dat = gr.load(fn, use={"E", "C05"})
+    assert dat.sv.values[0] == "C05"
+    assert all(s[0] == "E" for s in dat.sv.values[1:])
+    assert dat["position"].notnull().all()
+
+    dat = gr.load(R / "example2.sp3a", use="G")
+    assert dat.sv.size == 25
+
+    fn = R / "igs19362.sp3c"
+    tlim = ("2017-02-14T01:00", "2017-02-14T02:00")
+    dat = gr.load(fn, use={"G20"}, tlim=tlim)
+    assert dat.time.size == 5
+    assert dat.sv.values.tolist() == ["G20"]
+
+    ref = gr.load(fn).sel(time=slice(*tlim), sv=["G20"])
+    assert dat["position"].values == approx(ref["position"].values)
+
+
+def _split(fn: Path, path: Path, hour: int) -> list[Path]:
+    """SP3 file split at hour into two files sharing that epoch"""
+    lines = fn.read_text().splitlines(keepends=True)
+    head = [i for i, ln in enumerate(lines) if ln.startswith("*")]
+    h = [i for i, ln in enumerate(lines) if ln.startswith("#")][0]
+    cut = head[hour * 4]
+    first = lines[: head[hour * 4 + 1]] + ["EOF\n"]
+    second = [lines[h][:3] + lines[cut][3:31] + lines[h][31:]]
+    second += lines[h + 1 : head[0]] + lines[cut:]
+
+    fns = [path / "a.sp3", path / "b.sp3"]
+    fns[0].write_text("".join(first))
+    fns[1].write_text("".join(second))
+
+    return fns
+
+
+def test_stitch(tmp_path):
+    fn = R / "igs19362.sp3c"
+    ref = gr.load(fn)
+    fns = _split(fn, tmp_path, 12)
+
+    dat = gr.load_sp3(fns[::-1], None)
+    assert dat.time.size == ref.time.size
+    assert dat["position"].values == approx(ref["position"].values)
+    assert dat["t0"].values == ref["t0"].values
+
+    # only the first file is needed
+    tlim = ("2017-02-14T10:00", "2017-02-14T11:45")
+    dat = gr.load_sp3(fns, None, use="G", tlim=tlim)
+    assert dat.time.size == 8
+    assert dat["clock"].values == approx(ref["clock"].sel(time=slice(*tlim)).values)
+
+    dat = gr.load_many(fns, tlim=("2017-02-14T11:00", "2017-02-14T13:00"))
+    assert dat.time.size == 9
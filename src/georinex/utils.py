@@ -4,13 +4,11 @@ from pathlib import Path
 from datetime import datetime
 from dateutil.parser import parse
 import io
-import xarray
 
-from .rio import rinexinfo, opener
-from .obs2 import obstime2, obsheader2
-from .obs3 import obstime3, obsheader3
-from .nav2 import navtime2, navheader2
-from .nav3 import navtime3, navheader3
+from .rio import rinexinfo, opener, STORES
+
+if T.TYPE_CHECKING:
+    import xarray
 
 
 def globber(path: Path, glob: list[str]) -> list[Path]:
@@ -54,18 +52,26 @@ def gettime(fn: T.TextIO | Path):
     vers = int(version)
     rtype = info["rinextype"]
 
-    # %% select function
+    # %% select function, importing only the reader of this file
     if rtype == "obs":
         if vers in {1, 2}:
+            from .obs2 import obstime2
+
             times = obstime2(fn)
         elif vers == 3:
+            from .obs3 import obstime3
+
             times = obstime3(fn)
         else:
             raise ValueError(f"Unknown RINEX version {version} {fn}")
     elif rtype == "nav":
         if vers in {1, 2}:
+            from .nav2 import navtime2
+
             times = navtime2(fn)
         elif vers == 3:
+            from .nav3 import navtime3
+
             times = navtime3(fn)
         else:
             raise ValueError(f"Unknown RINEX version {version} {fn}")
@@ -82,7 +88,7 @@ def rinexheader(fn: T.TextIO | Path) -> dict[T.Hashable, T.Any]:
     if isinstance(fn, (str, Path)):
         fn = Path(fn).expanduser()
 
-    if isinstance(fn, Path) and fn.suffix == ".nc":
+    if isinstance(fn, Path) and fn.suffix in STORES:
         return rinexinfo(fn)
     elif isinstance(fn, Path):
         with opener(fn, header=True) as f:
@@ -99,15 +105,23 @@ def rinexheader(fn: T.TextIO | Path) -> dict[T.Hashable, T.Any]:
     hdr: dict[T.Hashable, T.Any]
     if int(info["version"]) in {1, 2}:
         if info["rinextype"] == "obs":
+            from .obs2 import obsheader2
+
             hdr = obsheader2(fn)
         elif info["rinextype"] == "nav":
+            from .nav2 import navheader2
+
             hdr = navheader2(fn)
         else:
             raise ValueError(f"Unknown rinex type {info} in {fn}")
     elif int(info["version"]) == 3:
         if info["rinextype"] == "obs":
+            from .obs3 import obsheader3
+
             hdr = obsheader3(fn)
         elif info["rinextype"] == "nav":
+            from .nav3 import navheader3
+
             hdr = navheader3(fn)
         else:
             raise ValueError(f"Unknown rinex type {info} in {fn}")
@@ -132,6 +146,8 @@ def _tlim(tlim: tuple[datetime, datetime] | None = None) -> tuple[datetime, date
 
 def to_datetime(times: xarray.DataArray):
     """convert to datetime.dattime"""
+    import xarray
+
     if not isinstance(times, xarray.DataArray):
         return times
 